@@ -1,4 +1,5 @@
 from django.contrib import admin
+from django.utils.html import escape
 from .models import (
     Order,
     OrderItem,
@@ -7,6 +8,12 @@ from .models import (
     Restaurant,
     Category,
     Branch,
+    PhoneNumber,
+    TurnMetrics,
+    TurnSpan,
+    ScheduledJob,
+    JobStatus,
+    OutboundCall,
 )
 from unfold.admin import ModelAdmin, mark_safe, TabularInline
 
@@ -14,6 +21,19 @@ from import_export import resources
 from import_export.admin import ImportExportModelAdmin
 
 
+# UsageRollup fields, filled in by the turns.
+USAGE_FIELDS = [
+    "input_tokens",
+    "cache_read_tokens",
+    "output_tokens",
+    "llm_requests",
+    "tool_calls",
+    "llm_cost",
+    "summary_cost",
+    "speculative_cost",
+]
+
+
 class OrderItemInline(TabularInline):
     model = OrderItem
     extra = 0  # Number of blank forms
@@ -23,19 +43,20 @@ class OrderItemInline(TabularInline):
 @admin.register(Order)
 class OrderAdmin(ModelAdmin):
     inlines = [OrderItemInline]
-    list_display = ("name_display", "status", "created_at")
-    readonly_fields = ["readable_json"]
-    exclude = ["conversation"]
+    list_display = ("name_display", "status", "created_at", "llm_requests", "llm_cost")
+    readonly_fields = ["readable_json", *USAGE_FIELDS]
+    exclude = ["conversation", "conversation_length"]
 
     @admin.display(description="Conversation")
     def readable_json(self, obj):
-        if obj.conversation:
+        entries = obj.conversation_entries()
+        if entries:
             emoji_map = {"user": "👤", "agent": "🤖", "system": "⚙️"}
             conversation_html_list = []
-            for message in obj.conversation:
+            for message in entries:
                 role = message.get("role", "unknown")
                 emoji = emoji_map.get(role, "")
-                text = message["text"]
+                text = escape(message["text"])
 
                 conversation_html_list.append(
                     mark_safe(
@@ -84,8 +105,17 @@ class OrderAdmin(ModelAdmin):
     name_display.short_description = "Name"
 
 
+class PhoneNumberInline(TabularInline):
+    model = PhoneNumber
+    extra = 0
+
+
 @admin.register(Restaurant)
 class RestaurantAdmin(ModelAdmin):
+    inlines = [PhoneNumberInline]
+    list_display = ("name", "phone_number", "llm_requests", "input_tokens", "output_tokens", "llm_cost")
+    readonly_fields = USAGE_FIELDS
+
     class Meta:
         model = Restaurant
         fields = ("id", "name", "phone_number")
@@ -113,7 +143,8 @@ class MenuItemAdmin(ImportExportModelAdmin, ModelAdmin):
 
 @admin.register(AdminSetting)
 class AdminSettingAdmin(ModelAdmin):
-    list_display = ("key", "value")
+    list_display = ("key", "restaurant", "value")
+    list_filter = ("restaurant",)
     search_fields = ("key",)
 
 
@@ -122,3 +153,95 @@ class BranchAdmin(ModelAdmin):
     pass
     # list_display = ("key", "value")
     # search_fields = ("key",)
+
+
+class TurnSpanInline(TabularInline):
+    model = TurnSpan
+    extra = 0
+    can_delete = False
+    fields = ("kind", "name", "start_ms", "duration_ms")
+    readonly_fields = fields
+    ordering = ("start_ms",)
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(TurnMetrics)
+class TurnMetricsAdmin(ModelAdmin):
+    inlines = [TurnSpanInline]
+    list_display = (
+        "created_at",
+        "restaurant",
+        "order",
+        "mode",
+        "total_ms",
+        "model_ms",
+        "tools_ms",
+        "db_ms",
+        "model_requests",
+        "input_tokens",
+        "output_tokens",
+        "llm_cost",
+    )
+    list_filter = ("restaurant", "mode", "created_at")
+    ordering = ("-created_at",)
+    readonly_fields = [field.name for field in TurnMetrics._meta.fields]
+
+    def get_queryset(self, request):
+        qs = super().get_queryset(request).select_related("order", "restaurant")
+        if request.user.is_superuser:
+            return qs
+        return qs.filter(restaurant=request.user.restaurant)
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(ScheduledJob)
+class ScheduledJobAdmin(ModelAdmin):
+    list_display = ("kind", "key", "run_at", "status", "attempts", "restaurant")
+    list_filter = ("status", "kind", "restaurant")
+    ordering = ("-run_at",)
+    readonly_fields = [field.name for field in ScheduledJob._meta.fields]
+    actions = ["cancel_jobs"]
+
+    def get_queryset(self, request):
+        qs = super().get_queryset(request).select_related("restaurant")
+        if request.user.is_superuser:
+            return qs
+        return qs.filter(restaurant=request.user.restaurant)
+
+    @admin.action(description="Cancel selected pending jobs")
+    def cancel_jobs(self, request, queryset):
+        cancelled = queryset.filter(status=JobStatus.PENDING).update(status=JobStatus.CANCELLED)
+        self.message_user(request, f"Cancelled {cancelled} jobs.")
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(OutboundCall)
+class OutboundCallAdmin(ModelAdmin):
+    list_display = (
+        "created_at",
+        "restaurant",
+        "to_number",
+        "from_number",
+        "status",
+        "attempts",
+        "queue_ms",
+        "dial_ms",
+    )
+    list_filter = ("status", "restaurant", "created_at")
+    ordering = ("-created_at",)
+    readonly_fields = [field.name for field in OutboundCall._meta.fields]
+
+    def get_queryset(self, request):
+        qs = super().get_queryset(request).select_related("restaurant")
+        if request.user.is_superuser:
+            return qs
+        return qs.filter(restaurant=request.user.restaurant)
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,265 @@
+"""
+Outbound calls.
+
+Callbacks don't call Twilio from whichever thread fires them: they are
+queued on ``dialer`` and placed by ``DIALER_WORKERS`` threads. A dial waits
+for a token from two buckets: its caller ID's (Twilio accepts about one call
+per second per number, ``DIAL_NUMBER_CPS``) and its restaurant's
+(``DIAL_RESTAURANT_CPS``), so a burst of callbacks coming due at once is
+spread out instead of being refused. The caller ID is whichever of the
+restaurant's numbers has a token soonest. Dials that fail on Twilio's side
+(429, 5xx, no connection) are retried with backoff up to
+``DIAL_MAX_ATTEMPTS`` times; others fail at once.
+
+Each call is recorded as an ``OutboundCall`` with its queue wait (worker and
+rate limits, over all attempts) and Twilio's response time.
+
+Requests go through the shared pooled client (``core.twilio_rest``), so
+workers reuse its connections. ``adial`` lets async code wait for a call
+without blocking its event loop.
+"""
+
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+
+import aiohttp
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from dotenv import load_dotenv
+from requests.exceptions import RequestException
+from twilio.base.exceptions import TwilioRestException
+
+from .logger import get_logger
+from .models import DialStatus, OutboundCall, PhoneNumber, Restaurant
+from .twilio_rest import TwilioRest, twilio_rest
+
+log = get_logger()
+
+load_dotenv()
+
+DIALER_WORKERS = int(os.getenv("DIALER_WORKERS", "4"))
+DIAL_NUMBER_CPS = float(os.getenv("DIAL_NUMBER_CPS", "1"))
+DIAL_RESTAURANT_CPS = float(os.getenv("DIAL_RESTAURANT_CPS", "2"))
+# Calls a bucket lets through at once after being idle.
+DIAL_BURST = float(os.getenv("DIAL_BURST", "1"))
+DIAL_MAX_ATTEMPTS = int(os.getenv("DIAL_MAX_ATTEMPTS", "4"))
+# Doubled after every failed attempt, with jitter.
+DIAL_RETRY_SECONDS = float(os.getenv("DIAL_RETRY_SECONDS", "1"))
+# Caller ID for calls not made for a restaurant.
+DIAL_FROM_NUMBER = os.getenv("DIAL_FROM_NUMBER", "+18888545624")
+SITE_URL = os.getenv("SITE_URL")
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float = DIAL_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def ready_in(self, now: float) -> float:
+        """Seconds until a token is available."""
+        self._refill(now)
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+
+@dataclass
+class Dial:
+    to_number: str
+    restaurant_id: int | None
+    caller_ids: list[str]
+    url: str
+    future: Future = field(default_factory=Future)
+    # When the dial was queued, or its retry became due.
+    due_at: float = field(default_factory=time.monotonic)
+    attempts: int = 0
+    queue_s: float = 0.0
+    dial_s: float = 0.0
+    from_number: str = ""
+
+
+def caller_ids(restaurant_id: int | None) -> list[str]:
+    """The numbers a restaurant's calls can come from: its own, then its extra ones."""
+    if restaurant_id is None:
+        return [DIAL_FROM_NUMBER]
+    own = Restaurant.objects.filter(pk=restaurant_id).values_list("phone_number", flat=True)
+    extra = PhoneNumber.objects.filter(restaurant_id=restaurant_id).values_list(
+        "number", flat=True
+    )
+    return [*own, *extra] or [DIAL_FROM_NUMBER]
+
+
+def retryable(error: Exception) -> bool:
+    if isinstance(error, TwilioRestException):
+        return error.status == 429 or error.status >= 500
+    return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError, RequestException))
+
+
+class Dialer:
+    def __init__(
+        self,
+        rest: TwilioRest = twilio_rest,
+        workers: int = DIALER_WORKERS,
+        number_cps: float = DIAL_NUMBER_CPS,
+        restaurant_cps: float = DIAL_RESTAURANT_CPS,
+    ):
+        self.rest = rest
+        self.workers = workers
+        self.number_cps = number_cps
+        self.restaurant_cps = restaurant_cps
+        # (ready at, tie-break, dial), earliest first
+        self._queue: list[tuple[float, int, Dial]] = []
+        self._seq = itertools.count()
+        self._ready = threading.Condition()
+        self._buckets: dict[str | int, TokenBucket] = {}
+        self._threads: list[threading.Thread] = []
+
+    def submit(
+        self, to_number: str, restaurant_id: int | None = None, url: str | None = None
+    ) -> Future:
+        """Queues a call to ``to_number``. The future resolves to its call SID."""
+        dial = Dial(
+            to_number=to_number,
+            restaurant_id=restaurant_id,
+            caller_ids=caller_ids(restaurant_id),
+            url=url or f"{SITE_URL}/voice/",
+        )
+        self._start()
+        self._push(dial, dial.due_at)
+        return dial.future
+
+    def dial(self, to_number: str, restaurant_id: int | None = None, **kwargs) -> str:
+        """Places the call and waits for Twilio to accept it. Returns the call SID."""
+        return self.submit(to_number, restaurant_id, **kwargs).result()
+
+    async def adial(self, to_number: str, restaurant_id: int | None = None, **kwargs) -> str:
+        """``dial`` for async code: waits without blocking the event loop."""
+        future = await sync_to_async(self.submit)(to_number, restaurant_id, **kwargs)
+        return await asyncio.wrap_future(future)
+
+    def _start(self):
+        with self._ready:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, name="dialer", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _push(self, dial: Dial, ready_at: float):
+        with self._ready:
+            heapq.heappush(self._queue, (ready_at, next(self._seq), dial))
+            self._ready.notify()
+
+    # ------------------ Rate limits ------------------
+    def _bucket(self, key: str | int, rate: float) -> TokenBucket:
+        if key not in self._buckets:
+            self._buckets[key] = TokenBucket(rate)
+        return self._buckets[key]
+
+    def _reserve(self, dial: Dial, now: float) -> float:
+        """
+        Takes a token for the dial and picks its caller ID, or returns how
+        long to wait for one. Locked.
+        """
+        numbers = [self._bucket(number, self.number_cps) for number in dial.caller_ids]
+        wait, number = min(
+            (bucket.ready_in(now), number) for bucket, number in zip(numbers, dial.caller_ids)
+        )
+        if dial.restaurant_id is not None:
+            restaurant = self._bucket(dial.restaurant_id, self.restaurant_cps)
+            wait = max(wait, restaurant.ready_in(now))
+        if wait > 0:
+            return wait
+        self._buckets[number].take(now)
+        if dial.restaurant_id is not None:
+            restaurant.take(now)
+        dial.from_number = number
+        return 0.0
+
+    # ------------------ Workers ------------------
+    def _next(self) -> Dial:
+        """Blocks until a dial is due and within its rate limits."""
+        with self._ready:
+            while True:
+                now = time.monotonic()
+                if not self._queue:
+                    self._ready.wait()
+                    continue
+                ready_at, _, dial = self._queue[0]
+                if ready_at > now:
+                    self._ready.wait(ready_at - now)
+                    continue
+                heapq.heappop(self._queue)
+                wait = self._reserve(dial, now)
+                if wait:
+                    heapq.heappush(self._queue, (now + wait, next(self._seq), dial))
+                    continue
+                dial.queue_s += now - dial.due_at
+                return dial
+
+    def _work(self):
+        while True:
+            dial = self._next()
+            dial.attempts += 1
+            started = time.monotonic()
+            try:
+                call_sid = self.rest.create_call(
+                    url=dial.url, to=dial.to_number, from_=dial.from_number
+                )
+            except Exception as e:
+                dial.dial_s = time.monotonic() - started
+                if retryable(e) and dial.attempts < DIAL_MAX_ATTEMPTS:
+                    delay = DIAL_RETRY_SECONDS * 2 ** (dial.attempts - 1)
+                    delay *= random.uniform(0.8, 1.2)
+                    log.info(
+                        f"[dialer] {dial.to_number} attempt {dial.attempts} failed ({e}), "
+                        f"retrying in {delay:.1f}s"
+                    )
+                    dial.due_at = time.monotonic() + delay
+                    self._push(dial, dial.due_at)
+                    continue
+                log.error(f"[dialer] {dial.to_number} failed after {dial.attempts} attempts: {e}")
+                self._record(dial, DialStatus.FAILED, error=str(e))
+                dial.future.set_exception(e)
+            else:
+                dial.dial_s = time.monotonic() - started
+                log.info(
+                    f"[dialer] {dial.to_number} from {dial.from_number}: {call_sid} "
+                    f"(queued {dial.queue_s * 1000:.0f} ms, dial {dial.dial_s * 1000:.0f} ms)"
+                )
+                self._record(dial, DialStatus.PLACED, call_sid=call_sid)
+                dial.future.set_result(call_sid)
+
+    def _record(self, dial: Dial, status: str, **fields):
+        try:
+            close_old_connections()
+            OutboundCall.objects.create(
+                restaurant_id=dial.restaurant_id,
+                to_number=dial.to_number,
+                from_number=dial.from_number,
+                status=status,
+                attempts=dial.attempts,
+                queue_ms=dial.queue_s * 1000,
+                dial_ms=dial.dial_s * 1000,
+                **fields,
+            )
+        except Exception:
+            # Metrics must never lose the call's outcome.
+            log.exception(f"[dialer] could not record the call to {dial.to_number}")
+
+
+dialer = Dialer()
@@ -0,0 +1,97 @@
+"""
+Filler replies for slow turns.
+
+With ``FILLER_AFTER_SECONDS`` set, ``views.process_speech`` gives the agent
+that long to answer. If it hasn't, the caller hears a short filler ("One
+moment please.") and Twilio is redirected to ``/turn_result/`` while the turn
+keeps running in the background. ``turn_result`` holds each poll for up to
+``FILLER_POLL_SECONDS`` and answers with the real reply once it is ready, or
+with a pause and another redirect. Webhook latency then no longer depends on
+the LLM, and Twilio never times out and retries a slow turn.
+
+Pending turns are kept in memory, so the redirect must reach the worker that
+started the turn (one ASGI worker, or sticky routing by CallSid).
+"""
+
+import asyncio
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable
+
+from dotenv import load_dotenv
+
+from .logger import get_logger
+from .metrics import TurnTimer
+from .models import Order
+
+log = get_logger()
+
+load_dotenv()
+
+# 0 keeps every turn in one webhook.
+FILLER_AFTER_SECONDS = float(os.getenv("FILLER_AFTER_SECONDS", "0"))
+# Stays well under Twilio's 15 s webhook timeout.
+FILLER_POLL_SECONDS = float(os.getenv("FILLER_POLL_SECONDS", "5"))
+# Give up on a turn after this long and ask the caller to repeat.
+FILLER_MAX_SECONDS = float(os.getenv("FILLER_MAX_SECONDS", "60"))
+
+
+@dataclass
+class PendingTurn:
+    task: asyncio.Task
+    timer: TurnTimer | None
+    started_at: float = field(default_factory=time.monotonic)
+
+
+_pending: dict[str, PendingTurn] = {}
+
+
+async def run_or_defer(
+    call_sid: str, turn: Awaitable[tuple[Order, str]], timer: TurnTimer | None
+) -> tuple[Order, str] | None:
+    """
+    Runs the turn, returning its result if it finishes within
+    ``FILLER_AFTER_SECONDS``. Otherwise leaves it running as the call's
+    pending turn and returns None.
+    """
+    task = asyncio.ensure_future(turn)
+    done, _ = await asyncio.wait([task], timeout=FILLER_AFTER_SECONDS)
+    if done:
+        return task.result()
+    # Retrieve the exception of turns nobody polls for any more.
+    task.add_done_callback(lambda task: task.cancelled() or task.exception())
+    _pending[call_sid] = PendingTurn(task=task, timer=timer)
+    log.info(f"[filler] {call_sid} deferred after {FILLER_AFTER_SECONDS}s")
+    return None
+
+
+def get_pending(call_sid: str) -> PendingTurn | None:
+    return _pending.get(call_sid)
+
+
+async def wait_for_turn(pending: PendingTurn, call_sid: str) -> tuple[Order, str] | None:
+    """
+    Waits up to ``FILLER_POLL_SECONDS`` for the call's pending turn.
+
+    Returns its result when done, None if it is still running. Raises the
+    turn's exception if it failed, and ``TimeoutError`` once it has run past
+    ``FILLER_MAX_SECONDS``.
+    """
+    await asyncio.wait([pending.task], timeout=FILLER_POLL_SECONDS)
+    if pending.task.done():
+        _pending.pop(call_sid, None)
+        log.info(
+            f"[filler] {call_sid} done after {time.monotonic() - pending.started_at:.1f}s"
+        )
+        return pending.task.result()
+    if time.monotonic() - pending.started_at > FILLER_MAX_SECONDS:
+        # Let it finish and save, but stop holding the caller.
+        _pending.pop(call_sid, None)
+        raise TimeoutError(f"turn still running after {FILLER_MAX_SECONDS}s")
+    return None
+
+
+def drop_pending(call_sid: str):
+    """Forgets the call's pending turn (e.g. on hangup); it still completes."""
+    _pending.pop(call_sid, None)
@@ -0,0 +1,160 @@
+"""
+Rolling conversation window for long calls.
+
+Replaying the whole message history makes every turn's prompt (and latency)
+grow with the length of the call. With ``HISTORY_WINDOW=N`` only the last N
+exchanges are replayed verbatim; older ones are folded into a short summary
+that is kept on the order (``Order.history_summary``) and updated
+incrementally, so the prompt stays bounded however long the call runs.
+
+An exchange is everything from one caller prompt up to the next one,
+including the tool calls and results in between, so a window never splits a
+tool call from its result.
+
+Folding waits until ``HISTORY_FOLD_EVERY`` exchanges have fallen out of the
+window, so the summariser runs once every few turns rather than on every one.
+Its usage is returned with the window and added to the turn's, and to the
+order's and restaurant's ``summary_cost``.
+"""
+
+import os
+from dataclasses import replace
+
+from dotenv import load_dotenv
+from pydantic_ai import Agent, ModelRequest, SystemPromptPart, UserPromptPart
+from pydantic_ai.messages import (
+    ModelMessage,
+    TextPart,
+    ToolCallPart,
+    ToolReturnPart,
+)
+
+from .logger import get_logger
+from .metrics import Spend, llm_cost, span
+from .myinst import INSTRUCTIONS
+from .models import SpanKind
+
+log = get_logger()
+
+load_dotenv()
+
+# Exchanges kept verbatim. 0 keeps the whole history.
+HISTORY_WINDOW = int(os.getenv("HISTORY_WINDOW", "0"))
+HISTORY_FOLD_EVERY = int(os.getenv("HISTORY_FOLD_EVERY", "4"))
+
+SUMMARY_PREFIX = "Summary of the call so far:\n"
+# Long tool results (e.g. the menu) are cut down before summarising.
+MAX_TOOL_RESULT_CHARS = 300
+
+summary_agent = Agent(
+    "openai:gpt-5-mini",
+    instructions=(
+        "You keep a running summary of a phone call between a restaurant's "
+        "order-taking assistant and a customer. Merge the new part of the "
+        "conversation into the existing summary. Keep every fact needed to "
+        "continue the call: items and quantities with modifications, order "
+        "type, address, branch, times, open questions and the customer's "
+        "preferences. Drop small talk. Answer with the summary only, in at "
+        "most 120 words."
+    ),
+)
+
+
+def user_request(user_speech: str, history: list[ModelMessage]) -> ModelRequest:
+    """
+    The request the agent would start a turn with, for turns answered
+    without it (core.intents, core.response_cache).
+    """
+    parts = [UserPromptPart(content=user_speech)]
+    if not history:
+        parts.insert(0, SystemPromptPart(content=INSTRUCTIONS))
+    return ModelRequest(parts=parts)
+
+
+def split_exchanges(
+    messages: list[ModelMessage],
+) -> tuple[list[SystemPromptPart], list[list[ModelMessage]]]:
+    """
+    Splits a history into its system prompt parts and caller exchanges.
+
+    A previously injected summary part is dropped; it is re-added from
+    ``Order.history_summary``.
+    """
+    system_parts = []
+    exchanges = []
+    for message in messages:
+        if isinstance(message, ModelRequest):
+            parts = []
+            for part in message.parts:
+                if isinstance(part, SystemPromptPart):
+                    if not part.content.startswith(SUMMARY_PREFIX):
+                        system_parts.append(part)
+                else:
+                    parts.append(part)
+            if not parts:
+                continue
+            message = replace(message, parts=parts)
+            if any(isinstance(part, UserPromptPart) for part in parts):
+                exchanges.append([])
+        if not exchanges:
+            exchanges.append([])
+        exchanges[-1].append(message)
+    return system_parts, exchanges
+
+
+def render_exchanges(exchanges: list[list[ModelMessage]]) -> str:
+    """Plain-text transcript of the exchanges for the summariser."""
+    lines = []
+    for exchange in exchanges:
+        for message in exchange:
+            for part in message.parts:
+                if isinstance(part, UserPromptPart):
+                    lines.append(f"Customer: {part.content}")
+                elif isinstance(part, TextPart):
+                    lines.append(f"Assistant: {part.content}")
+                elif isinstance(part, ToolCallPart):
+                    lines.append(f"Tool call {part.tool_name}: {part.args_as_json_str()}")
+                elif isinstance(part, ToolReturnPart):
+                    result = part.model_response_str()[:MAX_TOOL_RESULT_CHARS]
+                    lines.append(f"Tool result {part.tool_name}: {result}")
+    return "\n".join(lines)
+
+
+async def summarise(summary: str, exchanges: list[list[ModelMessage]]) -> tuple[str, Spend]:
+    prompt = (
+        f"Existing summary:\n{summary or '(none)'}\n\n"
+        f"New part of the conversation:\n{render_exchanges(exchanges)}"
+    )
+    result = await summary_agent.run(prompt)
+    return result.output.strip(), Spend(result.usage, llm_cost(result.new_messages()))
+
+
+async def apply_history_policy(
+    messages: list[ModelMessage], summary: str
+) -> tuple[list[ModelMessage], str, Spend]:
+    """
+    Trims the history to the configured window.
+
+    Returns:
+        tuple[list[ModelMessage], str, Spend]: The history to replay, the
+            (possibly updated) summary to keep on the order, and what
+            updating it cost.
+    """
+    if not HISTORY_WINDOW:
+        return messages, summary, Spend()
+
+    system_parts, exchanges = split_exchanges(messages)
+    if len(exchanges) < HISTORY_WINDOW + HISTORY_FOLD_EVERY:
+        # Stored histories are already windowed, with the summary attached.
+        return messages, summary, Spend()
+
+    folded, exchanges = exchanges[:-HISTORY_WINDOW], exchanges[-HISTORY_WINDOW:]
+    with span(SpanKind.MODEL, "summary"):
+        summary, spend = await summarise(summary, folded)
+    log.info(f"[history] folded {len(folded)} exchanges into the summary")
+
+    # Re-attach the system prompt and the summary to the first kept request.
+    system_parts = [*system_parts, SystemPromptPart(content=SUMMARY_PREFIX + summary)]
+    first, *rest = exchanges[0]
+    exchanges[0] = [replace(first, parts=[*system_parts, *first.parts]), *rest]
+    return [message for exchange in exchanges for message in exchange], summary, spend
@@ -0,0 +1,320 @@
+"""
+Fast path for trivial caller turns.
+
+Many turns are a bare "yes", "that's all" or "two burgers". With
+``FAST_INTENTS=true`` these are recognised locally, against the current
+order and the agent's previous question, and handled by calling the tool
+functions directly with a templated reply, without an LLM round trip:
+
+- ``add_items``: "two cheese burgers and a coke", "add one pizza please"
+- ``quantity``: "two" / "two of those" after the agent asked how many of
+  exactly one item
+- ``closing``: "that's all" after "anything else?", when the next step is clear
+- ``confirm``: "yes" after the agent read the order back for confirmation
+
+Anything else, or anything ambiguous (an item already on the order, an
+unknown item, a modification), goes to the LLM as before. The turn is
+recorded in the message history exactly as if the agent had made the same
+tool calls, so the LLM picks the call up seamlessly on the next turn.
+"""
+
+import json
+import os
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import Any
+
+from asgiref.sync import sync_to_async
+from dotenv import load_dotenv
+from pydantic_ai import ModelRequest, ModelResponse, TextPart
+from pydantic_ai.messages import ModelMessage, ToolCallPart, ToolReturnPart
+
+from .history import user_request
+from .logger import get_logger
+from .metrics import span
+from .models import OrderItem, SpanKind
+from .tools import OrderDeps, confirm_order, set_or_modify_items
+
+log = get_logger()
+
+load_dotenv()
+
+FAST_INTENTS = os.getenv("FAST_INTENTS", "false").lower() == "true"
+
+NUMBERS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10,
+}
+QUANTITY = r"(\d+|" + "|".join(NUMBERS) + r")"
+
+AFFIRMATIONS = {
+    "yes", "yeah", "yep", "yup", "sure", "correct", "right", "perfect",
+    "yes please", "yes that's right", "yes that's correct", "that's right",
+    "that's correct", "yes it is", "sounds good", "yes confirm", "confirm",
+}
+CLOSINGS = {
+    "no", "nope", "no thanks", "no thank you", "that's all", "that's it",
+    "nothing else", "no that's all", "no that's it", "i'm done", "that will be all",
+    "that's everything", "no nothing else", "that's all thanks", "that's all thank you",
+}
+ADD_PREFIX = re.compile(
+    r"^(?:(?:can|could) i (?:get|have)|i'?d like|i would like|i want|i'll have|"
+    r"i will have|give me|add|and|also|plus|get me)\s+"
+)
+ITEM = re.compile(rf"^{QUANTITY}\s+(?:more\s+)?(.+)$")
+BARE_QUANTITY = re.compile(rf"^(?:just\s+)?{QUANTITY}(?:\s+of\s+(?:those|them|that|it))?$")
+# The agent's question before the caller's turn.
+ASKED_ANYTHING_ELSE = re.compile(r"anything else|something else|add anything")
+ASKED_TO_CONFIRM = re.compile(r"to confirm|is that (?:all )?correct|is that right")
+ASKED_QUANTITY = re.compile(r"how many|what quantity|how much of")
+
+
+def normalise(text: str) -> str:
+    text = text.lower().replace("’", "'")
+    text = re.sub(r"[^\w\s']", " ", text)
+    return " ".join(text.split())
+
+
+def to_number(word: str) -> int:
+    return int(word) if word.isdigit() else NUMBERS[word]
+
+
+def variants(name: str) -> list[str]:
+    """'burgers' -> ['burgers', 'burger'], 'sandwiches' -> [..., 'sandwiche', 'sandwich']"""
+    names = [name]
+    for suffix, replacement in (("s", ""), ("es", ""), ("ies", "y")):
+        if name.endswith(suffix):
+            names.append(name[: -len(suffix)] + replacement)
+    return names
+
+
+@dataclass
+class IntentStats:
+    turns: int = 0
+    handled: Counter = field(default_factory=Counter)
+    llm_turns: int = 0
+    llm_seconds: float = 0.0
+    fast_seconds: float = 0.0
+
+    @property
+    def handled_total(self) -> int:
+        return sum(self.handled.values())
+
+    @property
+    def saved_seconds(self) -> float:
+        """Average LLM turn time for every handled turn, minus what they took."""
+        if not self.llm_turns:
+            return 0.0
+        return self.handled_total * self.llm_seconds / self.llm_turns - self.fast_seconds
+
+    def __str__(self):
+        share = self.handled_total / self.turns if self.turns else 0.0
+        return (
+            f"handled {self.handled_total}/{self.turns} ({share:.0%}) "
+            f"{dict(self.handled)}, saved ~{self.saved_seconds:.2f}s total"
+        )
+
+
+stats = IntentStats()
+
+
+@dataclass
+class FastReply:
+    intent: str
+    reply: str
+    # The turn as the agent would have recorded it.
+    messages: list[ModelMessage]
+
+
+class Unsure(Exception):
+    """The utterance looks like an intent but can't be handled safely."""
+
+
+class FastPath:
+    def __init__(self, deps: OrderDeps, history: list[ModelMessage]):
+        self.deps = deps
+        self.order = deps.session.order
+        self.history = history
+        self.tool_calls: list[tuple[ToolCallPart, Any]] = []
+
+    # ------------------ State ------------------
+    def last_agent_text(self) -> str:
+        for message in reversed(self.history):
+            if isinstance(message, ModelResponse):
+                text = " ".join(p.content for p in message.parts if isinstance(p, TextPart))
+                if text:
+                    return normalise(text)
+        return ""
+
+    def menu_names(self) -> dict[str, str]:
+        """Normalised item name -> menu item name."""
+        return {
+            normalise(name): name
+            for items in self.deps.session.menu.values()
+            for name in items
+        }
+
+    def ordered_names(self) -> set[str]:
+        return set(
+            OrderItem.objects.filter(order=self.order).values_list("menu_item__name", flat=True)
+        )
+
+    def call(self, tool, **args) -> Any:
+        part = ToolCallPart(tool.__name__, args)
+        with span(SpanKind.TOOL, tool.__name__):
+            result = tool(SimpleNamespace(deps=self.deps), **args)
+        self.tool_calls.append((part, result))
+        if result.get("status") != "success":
+            raise Unsure(f"{tool.__name__}: {result.get('message')}")
+        return result
+
+    # ------------------ Intents ------------------
+    def match(self, text: str) -> tuple[str, str] | None:
+        if text in AFFIRMATIONS and ASKED_TO_CONFIRM.search(self.last_agent_text()):
+            return "confirm", self.confirm()
+        if text in CLOSINGS and ASKED_ANYTHING_ELSE.search(self.last_agent_text()):
+            return "closing", self.closing()
+        if (m := BARE_QUANTITY.match(text)) and ASKED_QUANTITY.search(self.last_agent_text()):
+            return "quantity", self.quantity(to_number(m.group(1)))
+        if items := self.parse_items(text):
+            return "add_items", self.add_items(items)
+        return None
+
+    def parse_items(self, text: str) -> list[tuple[str, int]] | None:
+        text = re.sub(r"\s+please$", "", ADD_PREFIX.sub("", text))
+        names = self.menu_names()
+        items = []
+        for chunk in re.split(r",\s*|\s+and\s+", text):
+            m = ITEM.match(chunk)
+            if not m:
+                return None
+            quantity = to_number(m.group(1))
+            menu_name = next(
+                (names[name] for name in variants(m.group(2)) if name in names), None
+            )
+            if not menu_name:
+                return None
+            items.append((menu_name, quantity))
+        return items
+
+    def add_items(self, items: list[tuple[str, int]]) -> str:
+        lines = list(OrderItem.objects.filter(order=self.order).select_related("menu_item"))
+        # "two burgers" with burgers already on the order: more, or two in total?
+        if {line.menu_item.name for line in lines} & {name for name, _ in items}:
+            raise Unsure("item already on the order")
+        # The tool takes the complete order, so the current lines are repeated.
+        self.call(
+            set_or_modify_items,
+            items=[
+                *({"name": line.menu_item.name, "quantity": line.quantity} for line in lines),
+                *({"name": name, "quantity": quantity} for name, quantity in items),
+            ],
+            modifications=[
+                {"item_name": line.menu_item.name, "details": details}
+                for line in lines
+                if line.modifications
+                for details in json.loads(line.modifications)
+            ],
+        )
+        added = " and ".join(f"{quantity} {name}" for name, quantity in items)
+        return f"Okay, I've added {added} to your order. Anything else?"
+
+    def quantity(self, quantity: int) -> str:
+        last = self.last_agent_text()
+        mentioned = {
+            name for key, name in self.menu_names().items()
+            if re.search(rf"\b{re.escape(key)}(?:e?s)?\b", last)
+        }
+        if len(mentioned) != 1:
+            raise Unsure("no single item to refer to")
+        return self.add_items([(mentioned.pop(), quantity)])
+
+    def closing(self) -> str:
+        order = self.order
+        items = list(
+            OrderItem.objects.filter(order=order).select_related("menu_item")
+        )
+        if not items:
+            raise Unsure("nothing ordered yet")
+        if not order.order_type:
+            return "Would that be for delivery, pickup or a table booking?"
+
+        summary = " and ".join(
+            f"{item.quantity} {item.menu_item.name}"
+            + (f" ({', '.join(json.loads(item.modifications))})" if item.modifications else "")
+            for item in items
+        )
+        if order.order_type == "delivery" and order.address:
+            details = f"We'll deliver this to {order.address}."
+        elif order.order_type == "pickup" and order.pickup_branch and order.pickup_time:
+            details = f"You'll pick it up at our {order.pickup_branch} branch at {order.pickup_time}."
+        elif order.order_type == "table_booking" and order.no_of_people and order.booking_time:
+            details = f"That's a table for {order.no_of_people} at {order.booking_time}."
+        else:
+            raise Unsure("order details incomplete")
+        return f"Alright, so to confirm, your order includes {summary}. {details} Is that all correct?"
+
+    def confirm(self) -> str:
+        if not self.order.order_type or not self.ordered_names():
+            raise Unsure("order not ready to confirm")
+        self.call(confirm_order)
+        return "Great! Your order has been placed."
+
+    # ------------------ Messages ------------------
+    def messages(self, user_speech: str, reply: str) -> list[ModelMessage]:
+        messages: list[ModelMessage] = [user_request(user_speech, self.history)]
+        for part, result in self.tool_calls:
+            messages.append(ModelResponse(parts=[part]))
+            messages.append(
+                ModelRequest(
+                    parts=[
+                        ToolReturnPart(
+                            tool_name=part.tool_name,
+                            content=result,
+                            tool_call_id=part.tool_call_id,
+                        )
+                    ]
+                )
+            )
+        messages.append(ModelResponse(parts=[TextPart(content=reply)]))
+        return messages
+
+
+def _try_fast_path(
+    deps: OrderDeps, history: list[ModelMessage], user_speech: str
+) -> FastReply | None:
+    fast_path = FastPath(deps, history)
+    entries = len(deps.entries)
+    try:
+        matched = fast_path.match(normalise(user_speech))
+    except Unsure as e:
+        # The LLM takes the turn from the start: drop what a failed tool logged.
+        del deps.entries[entries:]
+        log.info(f"[intents] {deps.session_id} unsure ({e}), using the LLM")
+        return None
+    if matched is None:
+        return None
+    intent, reply = matched
+    return FastReply(intent, reply, fast_path.messages(user_speech, reply))
+
+
+async def try_fast_path(
+    deps: OrderDeps, history: list[ModelMessage], user_speech: str
+) -> FastReply | None:
+    """Handles the turn locally if it is a trivial intent, else returns None."""
+    started = time.perf_counter()
+    fast_reply = await sync_to_async(_try_fast_path)(deps, history, user_speech)
+    stats.turns += 1
+    if fast_reply:
+        stats.handled[fast_reply.intent] += 1
+        stats.fast_seconds += time.perf_counter() - started
+        log.info(f"[intents] {deps.session_id} {fast_reply.intent} | {stats}")
+    return fast_reply
+
+
+def record_llm_turn(seconds: float):
+    stats.llm_turns += 1
+    stats.llm_seconds += seconds
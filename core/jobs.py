@@ -0,0 +1,50 @@
+"""
+Scheduled job handlers (see core.scheduler) and the helpers that schedule
+and cancel them.
+"""
+
+from .dialer import dialer
+from .logger import get_logger
+from .models import Order, ScheduledJob
+from .scheduler import acancel, job, schedule
+
+log = get_logger()
+
+
+def callback_key(restaurant_id: int, customer_phone: str) -> str:
+    # One pending callback per customer and restaurant.
+    return f"call_back:{restaurant_id}:{customer_phone}"
+
+
+@job("call_back")
+def call_back(scheduled: ScheduledJob):
+    payload = scheduled.payload
+    if payload.get("call_sid"):
+        # An earlier run placed the call but the job wasn't released.
+        log.info(f"[scheduler] {scheduled.key} already called ({payload['call_sid']})")
+        return
+    # Waits for Twilio to take the call, so a failed dial fails (and retries) the job.
+    call_sid = dialer.dial(payload["to_number"], payload.get("restaurant_id"))
+    # Kept before the job is released, so a re-run doesn't ring the customer again.
+    payload["call_sid"] = call_sid
+    ScheduledJob.objects.filter(pk=scheduled.pk).update(payload=payload)
+
+
+def schedule_callback(order: Order, delay_seconds: float) -> bool:
+    return schedule(
+        "call_back",
+        callback_key(order.restaurant_id, order.customer_phone),
+        delay_seconds,
+        payload={
+            "to_number": order.customer_phone,
+            "restaurant_id": order.restaurant_id,
+            "order_id": order.pk,
+        },
+        restaurant_id=order.restaurant_id,
+    )
+
+
+async def acancel_callbacks(restaurant_id: int, customer_phone: str):
+    """The customer called us first: they don't need calling back."""
+    if await acancel(callback_key(restaurant_id, customer_phone)):
+        log.info(f"[scheduler] callback to {customer_phone} cancelled, they called first")
@@ -1,14 +1,163 @@
+"""
+Logging off the request path.
+
+``get_logger`` loggers only put records on a queue (``QueueHandler``); one
+listener thread per log file formats them and writes them out, so a log call
+costs microseconds instead of a disk write. Lines are JSON objects
+(``LOG_FORMAT=text`` for the old plain lines) carrying the ``call_sid`` of the
+call being served (``bind_call``, set per request by
+``core.middleware.CallContextMiddleware``), so one call's lines can be
+grepped out of a busy log. Messages longer than ``LOG_MAX_CHARS`` are cut
+short, except a ``LOG_LARGE_SAMPLE_RATE`` share kept whole for debugging.
+
+The file rotates at ``LOG_MAX_BYTES`` or every ``LOG_ROTATE_HOURS``,
+keeping ``LOG_BACKUPS`` old files.
+"""
+
+import atexit
+import contextvars
+import json
 import logging
+import os
+import queue
+import random
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LOG_FILE = os.getenv("LOG_FILE", "conversation.log")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+LOG_ROTATE_HOURS = float(os.getenv("LOG_ROTATE_HOURS", "24"))
+LOG_BACKUPS = int(os.getenv("LOG_BACKUPS", "7"))
+LOG_MAX_CHARS = int(os.getenv("LOG_MAX_CHARS", "2000"))
+LOG_LARGE_SAMPLE_RATE = float(os.getenv("LOG_LARGE_SAMPLE_RATE", "0.01"))
+
+# The call the current request or task is serving.
+current_call: contextvars.ContextVar[str] = contextvars.ContextVar("current_call", default="")
+
+# Attributes every LogRecord has; anything else came in through ``extra``.
+RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "call_sid"}
+
+
+def bind_call(call_sid: str | None):
+    """Tags the current context's log lines with ``call_sid``."""
+    current_call.set(call_sid or "")
+
+
+class CallFilter(logging.Filter):
+    """Stamps records with the call they belong to, in the caller's context."""
+
+    def filter(self, record):
+        record.call_sid = current_call.get()
+        return True
+
+
+def shorten(message: str) -> str:
+    if len(message) <= LOG_MAX_CHARS or random.random() < LOG_LARGE_SAMPLE_RATE:
+        return message
+    return f"{message[:LOG_MAX_CHARS]}… (+{len(message) - LOG_MAX_CHARS} chars)"
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        line = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+        }
+        if record.call_sid:
+            line["call_sid"] = record.call_sid
+        line["message"] = shorten(record.getMessage())
+        line.update(
+            (key, value) for key, value in vars(record).items() if key not in RECORD_ATTRS
+        )
+        if record.exc_text:
+            line["exception"] = record.exc_text
+        return json.dumps(line, ensure_ascii=False, default=str)
+
 
-def get_logger(name="conversation", log_file="conversation.log"):
+class TextFormatter(logging.Formatter):
+    """The old "[time] LEVEL message" lines, with the call SID if any."""
+
+    def format(self, record):
+        call = f"{record.call_sid} " if record.call_sid else ""
+        message = shorten(record.getMessage())
+        line = f"[{self.formatTime(record)}] {record.levelname} {call}{message}"
+        if record.exc_text:
+            line += f"\n{record.exc_text}"
+        return line
+
+
+class RotatingHandler(RotatingFileHandler):
+    """Rotates at ``maxBytes`` and also every ``interval`` seconds."""
+
+    def __init__(self, filename, interval: float, **kwargs):
+        super().__init__(filename, **kwargs)
+        self.interval = interval
+        self.rollover_at = time.time() + interval
+
+    def shouldRollover(self, record):
+        if self.interval and time.time() >= self.rollover_at:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self.rollover_at = time.time() + self.interval
+
+
+class CallQueueHandler(QueueHandler):
+    def prepare(self, record):
+        # Only the message (and a traceback) is rendered here, so the record
+        # holds no references into the caller; the listener does the rest.
+        # The record is fresh per call, so it is updated in place.
+        record.message = record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_formatter = logging.Formatter()
+
+# log file -> the handler feeding its listener
+_queues: dict[str, QueueHandler] = {}
+
+
+def _queue_handler(log_file: str) -> QueueHandler:
+    if log_file not in _queues:
+        file_handler = RotatingHandler(
+            log_file,
+            interval=LOG_ROTATE_HOURS * 3600,
+            maxBytes=LOG_MAX_BYTES,
+            backupCount=LOG_BACKUPS,
+            encoding="utf-8",
+        )
+        file_handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+        records = queue.SimpleQueue()
+        listener = QueueListener(records, file_handler, respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)
+        handler = CallQueueHandler(records)
+        handler.addFilter(CallFilter())
+        _queues[log_file] = handler
+    return _queues[log_file]
+
+
+def get_logger(name="conversation", log_file=LOG_FILE):
     logger = logging.getLogger(name)
-    
-    if not logger.hasHandlers():
-        logger.setLevel(logging.INFO)
-        file_handler = logging.FileHandler(log_file)
-        file_handler.setLevel(logging.INFO)
-        formatter = logging.Formatter('[%(asctime)s] %(levelname)s %(message)s')
-        file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
-
-    return logger
\ No newline at end of file
+
+    if not logger.handlers:
+        logger.setLevel(LOG_LEVEL)
+        logger.addHandler(_queue_handler(log_file))
+
+    return logger
@@ -0,0 +1,83 @@
+import re
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import ConversationTurn, Order
+
+# "✅ [set_address] 200 Success" -> tool name and outcome.
+TOOL_ENTRY = re.compile(r"([✅❌])\s*\[(\w+)\]")
+
+
+def legacy_rows(order: Order) -> list[ConversationTurn]:
+    rows = []
+    for seq, entry in enumerate(order.conversation):
+        text = entry.get("text", "")
+        tool_name, metadata = "", {}
+        if match := TOOL_ENTRY.search(text):
+            tool_name = match.group(2)
+            metadata = {"status": "success" if match.group(1) == "✅" else "error"}
+        rows.append(
+            ConversationTurn(
+                order=order,
+                seq=seq,
+                role=entry.get("role", "system"),
+                text=text,
+                tool_name=tool_name,
+                metadata=metadata,
+                # The JSON has no timestamps.
+                created_at=order.created_at,
+            )
+        )
+    return rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves Order.conversation JSON entries into ConversationTurn rows, "
+        "a chunk of orders per transaction. Safe to rerun."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk", type=int, default=500, help="Orders per transaction.")
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        pending = Order.objects.exclude(conversation=[]).order_by("pk")
+        if options["dry_run"]:
+            self.stdout.write(f"{pending.count()} orders to backfill")
+            return
+
+        last_pk, orders_done, rows_done = 0, 0, 0
+        while True:
+            with transaction.atomic():
+                # Locked, so a call still in progress can't add rows meanwhile.
+                chunk = list(
+                    pending.filter(pk__gt=last_pk).select_for_update()[: options["chunk"]]
+                )
+                if not chunk:
+                    break
+                rows_done += self.move(chunk)
+            orders_done += len(chunk)
+            last_pk = chunk[-1].pk
+            self.stdout.write(f"{orders_done} orders, {rows_done} entries")
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {orders_done} orders"))
+
+    def move(self, chunk: list[Order]) -> int:
+        rows = []
+        for order in chunk:
+            legacy = legacy_rows(order)
+            if order.conversation_length:
+                # Turns taken since the upgrade go after the legacy entries.
+                newer = list(order.conversation_turns.all())
+                order.conversation_turns.all().delete()
+                for row in newer:
+                    row.pk = None
+                    row.seq += len(legacy)
+                legacy += newer
+            rows += legacy
+            order.conversation = []
+            order.conversation_length = len(legacy)
+        ConversationTurn.objects.bulk_create(rows, batch_size=1000)
+        Order.objects.bulk_update(chunk, ["conversation", "conversation_length"])
+        return len(rows)
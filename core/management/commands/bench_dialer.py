@@ -0,0 +1,169 @@
+import statistics
+import tempfile
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import wait
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from twilio.http.http_client import TwilioHttpClient
+from twilio.rest import Client
+
+from core.dialer import DIAL_NUMBER_CPS, DIAL_RESTAURANT_CPS, DIALER_WORKERS, Dialer
+from core.models import OutboundCall, PhoneNumber, Restaurant
+from core.twilio_rest import TWILIO_TIMEOUT_SECONDS, TwilioRest
+from core.utils.fake_twilio import FakeTwilio
+
+ACCOUNT = ("ACbench", "token")
+
+
+class BlockingRest:
+    """
+    Baseline transports: Twilio's own blocking client, which holds the worker's
+    thread for the whole request, with or without a requests connection pool.
+    """
+
+    def __init__(self, api_url: str, pool_connections: bool):
+        self.client = Client(
+            *ACCOUNT,
+            http_client=TwilioHttpClient(
+                pool_connections=pool_connections, timeout=TWILIO_TIMEOUT_SECONDS
+            ),
+        )
+        self.client.api.base_url = api_url
+
+    def create_call(self, **kwargs) -> str:
+        return self.client.calls.create(**kwargs).sid
+
+
+def percentile(values: list[float], p: int) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[p - 1]
+
+
+class Command(BaseCommand):
+    help = (
+        "Places a burst of outbound calls through the dialer (core.dialer) against "
+        "a local fake Twilio REST API and reports throughput, queue wait, dial "
+        "latency, retries, connections opened and how closely each caller ID's "
+        "calls followed each other. Uses a throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--calls", type=int, default=60)
+        parser.add_argument("--restaurants", type=int, default=3)
+        parser.add_argument(
+            "--numbers", type=int, default=2, help="Caller IDs per restaurant."
+        )
+        parser.add_argument("--workers", type=int, default=DIALER_WORKERS)
+        parser.add_argument("--number-cps", type=float, default=DIAL_NUMBER_CPS)
+        parser.add_argument("--restaurant-cps", type=float, default=DIAL_RESTAURANT_CPS)
+        parser.add_argument(
+            "--latency", default="lognormal:0.2:0.3", help="Fake Twilio response time."
+        )
+        parser.add_argument(
+            "--twilio-cps",
+            type=float,
+            default=1.0,
+            help="Calls per second per caller ID the fake accepts.",
+        )
+        parser.add_argument(
+            "--connect-latency",
+            type=float,
+            default=0.1,
+            help="Fake cost of opening a connection (TLS handshake).",
+        )
+        parser.add_argument("--error-rate", type=float, default=0.05)
+        parser.add_argument(
+            "--transport",
+            choices=("pooled", "blocking", "fresh"),
+            default="pooled",
+            help="pooled: core.twilio_rest; blocking: Twilio's requests client; "
+            "fresh: that without keep-alive.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.settings_dict["NAME"]
+        connection.settings_dict["TEST"]["NAME"] = tempfile.mktemp(suffix=".sqlite3")
+        connection.creation.create_test_db(verbosity=0)
+        try:
+            self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def run(self, options):
+        restaurants = []
+        for r in range(options["restaurants"]):
+            restaurant = Restaurant.objects.create(
+                name=f"Restaurant {r}", phone_number=f"+1555{r:03d}0000"
+            )
+            PhoneNumber.objects.bulk_create(
+                PhoneNumber(restaurant=restaurant, number=f"+1555{r:03d}{n:04d}")
+                for n in range(1, options["numbers"])
+            )
+            restaurants.append(restaurant.pk)
+
+        fake = FakeTwilio(
+            latency=options["latency"],
+            connect_latency=options["connect_latency"],
+            cps=options["twilio_cps"],
+            error_rate=options["error_rate"],
+            seed=options["seed"],
+        )
+        with fake:
+            if options["transport"] == "pooled":
+                rest = TwilioRest(*ACCOUNT, api_url=fake.url)
+            else:
+                rest = BlockingRest(fake.url, pool_connections=options["transport"] == "blocking")
+            dialer = Dialer(
+                rest=rest,
+                workers=options["workers"],
+                number_cps=options["number_cps"],
+                restaurant_cps=options["restaurant_cps"],
+            )
+            started = time.monotonic()
+            futures = [
+                dialer.submit(
+                    f"+1444{i:07d}", restaurants[i % len(restaurants)], url="http://bench/voice/"
+                )
+                for i in range(options["calls"])
+            ]
+            wait(futures)
+            elapsed = time.monotonic() - started
+            if isinstance(rest, TwilioRest):
+                rest.close()
+
+        outcomes = Counter(fake_call.status for fake_call in fake.calls)
+        placed = [f for f in futures if not f.exception()]
+        # Shortest time between two accepted calls from the same caller ID.
+        accepted = defaultdict(list)
+        for fake_call in fake.calls:
+            if fake_call.status == 201:
+                accepted[fake_call.from_].append(fake_call.at)
+        min_gap = min(
+            (b - a for times in accepted.values() for a, b in zip(times, times[1:])),
+            default=0.0,
+        )
+
+        rows = list(OutboundCall.objects.values_list("queue_ms", "dial_ms", "attempts"))
+        queue_ms = [row[0] for row in rows]
+        dial_ms = [row[1] for row in rows]
+        self.stdout.write(
+            f"{len(placed)}/{options['calls']} placed in {elapsed:.1f}s "
+            f"({len(placed) / elapsed:.1f} calls/s) from "
+            f"{options['restaurants'] * options['numbers']} caller IDs\n"
+            f"queue wait ms  p50 {percentile(queue_ms, 50):.0f}  p95 {percentile(queue_ms, 95):.0f}  "
+            f"max {max(queue_ms, default=0):.0f}\n"
+            f"dial ms        p50 {percentile(dial_ms, 50):.0f}  p95 {percentile(dial_ms, 95):.0f}\n"
+            f"requests {sum(outcomes.values())}: accepted {outcomes[201]}, "
+            f"rate limited (429) {outcomes[429]}, unavailable (503) {outcomes[503]}; "
+            f"retried calls {sum(1 for row in rows if row[2] > 1)}; "
+            f"connections opened {fake.connections}\n"
+            f"shortest gap between a caller ID's calls: {min_gap * 1000:.0f} ms"
+        )
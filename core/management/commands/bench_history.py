@@ -0,0 +1,117 @@
+import asyncio
+import re
+import tempfile
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from pydantic_ai import ModelResponse, TextPart, ToolCallPart
+from pydantic_ai.models.function import FunctionModel
+
+from core import history
+from core.models import Category, MenuItem, Restaurant
+from core.tools import agent
+from core.turns import agent_turn, save_turn
+
+RESTAURANT_NUMBER = "+15550000000"
+CALLER_NUMBER = "+15551234567"
+# Roughly what pydantic-ai's test models count as a token.
+TOKEN_SPLIT = re.compile(r'[\s",.:]+')
+
+
+def scripted_model() -> FunctionModel:
+    """Fake agent model: fetches the menu when asked about it, otherwise chats."""
+
+    def respond(messages, info):
+        last = messages[-1].parts[-1]
+        if last.part_kind == "user-prompt" and "menu" in last.content:
+            return ModelResponse(parts=[ToolCallPart("get_menu", {})])
+        return ModelResponse(
+            parts=[
+                TextPart(
+                    "Okay, I've noted that for you. Your order so far has a few items "
+                    "and I can add more whenever you're ready. Would you like anything "
+                    "else, or should we move on to delivery or pickup?"
+                )
+            ]
+        )
+
+    return FunctionModel(respond)
+
+
+def summary_model(counter: dict) -> FunctionModel:
+    def respond(messages, info):
+        prompt = messages[-1].parts[-1].content
+        counter["tokens"] += len(TOKEN_SPLIT.split(prompt.strip()))
+        counter["folds"] += 1
+        return ModelResponse(parts=[TextPart(" ".join(["detail"] * 100))])
+
+    return FunctionModel(respond)
+
+
+class Command(BaseCommand):
+    help = (
+        "Input tokens per turn over a long call, replaying the full history vs. a "
+        "rolling window with a summary (core.history). Fake LLM, test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--turns", type=int, default=40)
+        parser.add_argument("--window", type=int, default=6)
+        parser.add_argument("--fold-every", type=int, default=4)
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        if connection.vendor == "sqlite":
+            connection.settings_dict["TEST"]["NAME"] = tempfile.mktemp(suffix=".sqlite3")
+        old_name = connection.creation.create_test_db(verbosity=0)
+        try:
+            restaurant = Restaurant.objects.create(name="Bench", phone_number=RESTAURANT_NUMBER)
+            for c in range(4):
+                category = Category.objects.create(name=f"Category {c}")
+                for i in range(10):
+                    MenuItem.objects.create(
+                        restaurant=restaurant, category=category, name=f"Dish {c}-{i}", price=9.5
+                    )
+            results = {}
+            for label, window in (("full", 0), (f"window={options['window']}", options["window"])):
+                history.HISTORY_WINDOW = window
+                history.HISTORY_FOLD_EVERY = options["fold_every"]
+                results[label] = asyncio.run(self.run_call(f"CA-{label}", options["turns"]))
+            self.report(results, options["turns"])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    async def run_call(self, call_sid: str, turns: int) -> dict:
+        summariser = {"tokens": 0, "folds": 0}
+        per_turn = []
+        with agent.override(model=scripted_model()), history.summary_agent.override(
+            model=summary_model(summariser)
+        ):
+            for n in range(turns):
+                speech = "what's on the menu?" if n % 5 == 0 else f"add {n % 3 + 1} of dish {n}"
+                turn = await agent_turn(
+                    call_sid=call_sid,
+                    phone_number=RESTAURANT_NUMBER,
+                    customer_phone=CALLER_NUMBER,
+                    user_speech=speech,
+                )
+                await save_turn(turn)
+                per_turn.append(turn.usage.input_tokens)
+        return {"per_turn": per_turn, **summariser}
+
+    def report(self, results: dict, turns: int):
+        labels = list(results)
+        self.stdout.write("turn  " + "  ".join(f"{label:>12}" for label in labels))
+        for n in range(turns):
+            if n == 0 or (n + 1) % 5 == 0:
+                row = "  ".join(f"{results[label]['per_turn'][n]:>12}" for label in labels)
+                self.stdout.write(f"{n + 1:>4}  {row}")
+        for label in labels:
+            r = results[label]
+            total = sum(r["per_turn"]) + r["tokens"]
+            self.stdout.write(
+                f"{label}: max {max(r['per_turn'])} input tokens/turn, "
+                f"total {total} (summariser {r['tokens']} over {r['folds']} folds)"
+            )
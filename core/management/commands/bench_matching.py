@@ -0,0 +1,93 @@
+import statistics
+import time
+import tracemalloc
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.matching import MATCHERS
+from core.utils.asr_noise import KINDS, generate_branches, generate_menu, noisy_queries
+
+
+class Command(BaseCommand):
+    help = (
+        "Latency, memory and top-1 accuracy of the name matchers (core.matching) "
+        "on generated menus or branch lists, with speech-recognition-style noisy "
+        "queries. No database needed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", default="50,500,5000,50000", help="Comma-separated numbers of names."
+        )
+        parser.add_argument(
+            "--matchers", default=",".join(MATCHERS), help="Comma-separated matcher names."
+        )
+        parser.add_argument("--kind", choices=("menu", "branch"), default="menu")
+        parser.add_argument("--queries", type=int, default=500)
+        parser.add_argument(
+            "--budget",
+            type=float,
+            default=30.0,
+            help="Stop querying a matcher after this many seconds per size.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        matchers = options["matchers"].split(",")
+        unknown = set(matchers) - set(MATCHERS)
+        if unknown:
+            raise CommandError(f"Unknown matchers {sorted(unknown)}, have {sorted(MATCHERS)}")
+        generate = generate_menu if options["kind"] == "menu" else generate_branches
+
+        self.stdout.write(
+            f"{'names':>6} {'matcher':<10} {'build ms':>9} {'memory KB':>10} "
+            f"{'p50 ms':>8} {'p95 ms':>8} {'top-1':>6} {'none':>6}  by kind"
+        )
+        for size in (int(s) for s in options["sizes"].split(",")):
+            names = generate(size, options["seed"])
+            queries = noisy_queries(names, options["queries"], options["seed"])
+            for name in matchers:
+                self.bench(name, names, queries, options["kind"], options["budget"])
+
+    def bench(self, name, names, queries, use, budget):
+        matcher_cls = MATCHERS[name]
+
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        matcher = matcher_cls(names, use)
+        memory = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        del matcher
+
+        started = time.perf_counter()
+        matcher = matcher_cls(names, use)
+        build_ms = (time.perf_counter() - started) * 1000
+
+        timings = []
+        right, asked, missed = Counter(), Counter(), 0
+        deadline = time.perf_counter() + budget
+        for kind, query, expected in queries:
+            started = time.perf_counter()
+            found = matcher.match(query)
+            timings.append((time.perf_counter() - started) * 1000)
+            asked[kind] += 1
+            right[kind] += found == expected
+            missed += found is None
+            if time.perf_counter() > deadline:
+                break
+
+        done = len(timings)
+        percentiles = (
+            statistics.quantiles(timings, n=100, method="inclusive") if done > 1 else timings * 99
+        )
+        p50, p95 = percentiles[49], percentiles[94]
+        by_kind = " ".join(
+            f"{kind}={right[kind] / asked[kind]:.0%}" for kind in KINDS if asked[kind]
+        )
+        partial = f" ({done} queries)" if done < len(queries) else ""
+        self.stdout.write(
+            f"{len(names):>6} {name:<10} {build_ms:>9.1f} {memory / 1024:>10.0f} "
+            f"{p50:>8.2f} {p95:>8.2f} {sum(right.values()) / done:>6.0%} "
+            f"{missed / done:>6.0%}  {by_kind}{partial}"
+        )
@@ -0,0 +1,97 @@
+import asyncio
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from core.models import AdminSetting, Restaurant
+from core.tools import agent
+from core.utils.fake_llm import fake_model
+from core.views import DEVELOPMENT
+
+RESTAURANT_NUMBER = "+15550000000"
+
+
+def call_payload(call_no: int, speech: str = "") -> dict:
+    """Form fields Twilio posts for a call (``To`` is the restaurant)."""
+    to_number, from_number = RESTAURANT_NUMBER, f"+1555{call_no:07d}"
+    if DEVELOPMENT:
+        # views.process_speech swaps From/To in development.
+        to_number, from_number = from_number, to_number
+    return {
+        "CallSid": f"CA-bench-{call_no}",
+        "From": from_number,
+        "To": to_number,
+        "SpeechResult": speech,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare turn throughput of the voice webhooks under WSGI (one thread per "
+        "request) and ASGI (one event loop) against a fake LLM. "
+        "Runs on a throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--calls", type=int, default=100)
+        parser.add_argument("--turns", type=int, default=3)
+        parser.add_argument("--latency", type=float, default=1.0, help="Fake LLM latency in seconds.")
+        parser.add_argument("--workers", type=int, default=8, help="WSGI worker threads.")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        if connection.vendor == "sqlite":
+            # A file-backed DB so worker threads don't fight over a shared-cache memory DB.
+            connection.settings_dict["TEST"]["NAME"] = tempfile.mktemp(suffix=".sqlite3")
+        old_name = connection.creation.create_test_db(verbosity=0)
+        try:
+            Restaurant.objects.create(name="Bench", phone_number=RESTAURANT_NUMBER)
+            AdminSetting.objects.create(key="GREETING", value="Hi! What would you like?")
+
+            model = fake_model(latency=options["latency"])
+            self.report("WSGI", self.run_wsgi(model, options), options)
+            self.report("ASGI", asyncio.run(self.run_asgi(model, options)), options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def run_wsgi(self, model, options) -> float:
+        def run_call(call_no):
+            # agent.override is context-local, so it's applied inside each worker thread.
+            with agent.override(model=model):
+                client = Client()
+                client.post("/voice/", call_payload(call_no))
+                for turn in range(options["turns"]):
+                    client.post("/process_speech/", call_payload(call_no, f"Turn {turn}"))
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+            list(pool.map(run_call, range(options["calls"])))
+        return time.perf_counter() - start
+
+    async def run_asgi(self, model, options) -> float:
+        async def run_call(call_no):
+            with agent.override(model=model):
+                client = AsyncClient()
+                await client.post("/voice/", call_payload(call_no))
+                for turn in range(options["turns"]):
+                    await client.post("/process_speech/", call_payload(call_no, f"Turn {turn}"))
+
+        # Offset the call numbers so CallSids don't collide with the WSGI run.
+        calls = range(options["calls"], 2 * options["calls"])
+        start = time.perf_counter()
+        await asyncio.gather(*(run_call(n) for n in calls))
+        return time.perf_counter() - start
+
+    def report(self, label, elapsed, options):
+        turns = options["calls"] * options["turns"]
+        self.stdout.write(
+            f"{label}: {turns} turns in {elapsed:.2f}s "
+            f"-> {turns / elapsed:.1f} turns/s "
+            f"({options['calls']} calls, LLM latency {options['latency']}s)"
+        )
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.utils.fake_twilio import FakeTwilio
+
+
+class Command(BaseCommand):
+    help = (
+        "Serves a local stand-in for Twilio's REST API (creating calls only). "
+        "Point TWILIO_API_URL at it to place calls offline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--latency", default="lognormal:0.2:0.3")
+        parser.add_argument("--connect-latency", type=float, default=0.1)
+        parser.add_argument("--cps", type=float, default=1.0, help="Calls per second per caller ID.")
+        parser.add_argument("--error-rate", type=float, default=0.0)
+
+    def handle(self, *args, **options):
+        fake = FakeTwilio(
+            latency=options["latency"],
+            connect_latency=options["connect_latency"],
+            cps=options["cps"],
+            error_rate=options["error_rate"],
+            port=options["port"],
+        )
+        with fake:
+            self.stdout.write(f"Fake Twilio on {fake.url}, Ctrl-C to stop")
+            try:
+                while True:
+                    time.sleep(1)
+            except KeyboardInterrupt:
+                pass
+        self.stdout.write(f"{len(fake.calls)} requests on {fake.connections} connections")
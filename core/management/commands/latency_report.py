@@ -0,0 +1,56 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import TurnMetrics, TurnSpan
+
+
+def percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))
+    return values[index]
+
+
+class Command(BaseCommand):
+    help = "p50/p95 turn latency per restaurant and per span (core.metrics)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=7)
+        parser.add_argument("--restaurant", type=int, help="Restaurant id")
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(days=options["days"])
+        turns = TurnMetrics.objects.filter(created_at__gte=since)
+        if options["restaurant"]:
+            turns = turns.filter(restaurant_id=options["restaurant"])
+
+        by_restaurant = defaultdict(list)
+        for name, total_ms in turns.values_list("restaurant__name", "total_ms"):
+            by_restaurant[name].append(total_ms)
+        self.table(
+            "Turn total by restaurant", by_restaurant, ("restaurant", "turns")
+        )
+
+        by_span = defaultdict(list)
+        spans = TurnSpan.objects.filter(turn__in=turns).values_list(
+            "kind", "name", "duration_ms"
+        )
+        for kind, name, duration_ms in spans:
+            by_span[f"{kind} {name}".strip()].append(duration_ms)
+        self.table("Spans", by_span, ("span", "count"))
+
+    def table(self, title: str, groups: dict, headers: tuple[str, str]):
+        self.stdout.write(f"\n{title}")
+        self.stdout.write(
+            f"{headers[0]:<40} {headers[1]:>7} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}"
+        )
+        rows = sorted(groups.items(), key=lambda item: -percentile(item[1], 95))
+        for label, values in rows:
+            self.stdout.write(
+                f"{label[:40]:<40} {len(values):>7} {percentile(values, 50):>9.0f} "
+                f"{percentile(values, 95):>9.0f} {max(values):>9.0f}"
+            )
@@ -0,0 +1,234 @@
+import asyncio
+import statistics
+import tempfile
+import time
+from dataclasses import dataclass, field
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from core.models import AdminSetting, Branch, Category, MenuItem, Restaurant
+from core.tools import agent
+from core.utils.fake_llm import Rule, latency_distribution, scripted_model
+from core.views import DEVELOPMENT
+
+RESTAURANT_NUMBER = "+15550000000"
+
+MENU = {
+    "Burgers": [("Cheese Burger", 8.5), ("Veggie Burger", 8.0)],
+    "Sides": [("Fries", 3.0), ("Onion Rings", 3.5)],
+    "Drinks": [("Coke", 2.0), ("Lemonade", 2.5)],
+}
+BRANCH = "Main Street"
+
+# What a typical caller says, one utterance per turn.
+CONVERSATION = [
+    "Hi, what's on the menu?",
+    "Two cheese burgers and a coke please",
+    "That's all",
+    "Pickup from Main Street at 7pm",
+    "Yes that's correct",
+]
+
+# How the fake model answers them.
+SCRIPT = [
+    Rule(
+        "menu",
+        "We have burgers, sides and drinks. What would you like?",
+        [("get_menu", {})],
+    ),
+    Rule(
+        "cheese burger",
+        "Okay, two cheese burgers and a coke. Anything else?",
+        [
+            (
+                "set_or_modify_items",
+                {
+                    "items": [
+                        {"name": "Cheese Burger", "quantity": 2},
+                        {"name": "Coke", "quantity": 1},
+                    ],
+                    "modifications": [],
+                },
+            )
+        ],
+    ),
+    Rule("that's all", "Would that be for delivery, pickup or a table booking?"),
+    Rule(
+        "pick ?up",
+        "Alright, so to confirm, two cheese burgers and a coke for pickup at "
+        "Main Street at 7pm. Is that all correct?",
+        [("set_pick_up_branch", {"branch_name": BRANCH, "time": "7pm"})],
+    ),
+    Rule("^yes", "Great! Your order has been placed.", [("confirm_order", {})]),
+]
+
+
+def call_payload(call_sid: str, caller: str, speech: str = "") -> dict:
+    """Form fields Twilio posts for a call (``To`` is the restaurant)."""
+    to_number, from_number = RESTAURANT_NUMBER, caller
+    if DEVELOPMENT:
+        # views.process_speech swaps From/To in development.
+        to_number, from_number = from_number, to_number
+    return {"CallSid": call_sid, "From": from_number, "To": to_number, "SpeechResult": speech}
+
+
+def percentile(values: list[float], p: int) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[p - 1]
+
+
+class QueryCounter:
+    """Execute wrapper counting the queries of every database connection."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def install(self, sender=None, connection=None, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+
+@dataclass
+class Level:
+    concurrency: int
+    elapsed: float = 0.0
+    # Seconds from posting the caller's speech to the real reply.
+    turns: list[float] = field(default_factory=list)
+    errors: int = 0
+    queries: int = 0
+
+    @property
+    def requests(self) -> int:
+        return len(self.turns) + self.errors
+
+
+class Command(BaseCommand):
+    help = (
+        "Replays synthetic multi-turn Twilio calls against /voice/ and "
+        "/process_speech/ at increasing concurrency, with a scripted fake LLM. "
+        "Reports throughput, turn latency percentiles, queries per turn and "
+        "error rate. Offline: no Twilio or OpenAI, throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            default="1,10,25,50",
+            help="Comma-separated numbers of simultaneous calls, one run each.",
+        )
+        parser.add_argument("--calls", type=int, default=50, help="Calls per run.")
+        parser.add_argument(
+            "--latency",
+            default="lognormal:0.8:0.4",
+            help="Fake LLM latency per model request: seconds, uniform:lo:hi, "
+            "normal:mean:sd or lognormal:median:sigma.",
+        )
+        parser.add_argument(
+            "--think", type=float, default=0.0, help="Caller pause between turns in seconds."
+        )
+        parser.add_argument("--seed", type=int, default=None)
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        if connection.vendor == "sqlite":
+            # A file-backed DB so the ORM's worker thread and this one share it.
+            connection.settings_dict["TEST"]["NAME"] = tempfile.mktemp(suffix=".sqlite3")
+        old_name = connection.creation.create_test_db(verbosity=0)
+        try:
+            self.seed()
+            model = scripted_model(
+                SCRIPT, latency_distribution(options["latency"], options["seed"])
+            )
+            queries = QueryCounter()
+            connection_created.connect(queries.install)
+            for conn in connections.all():
+                queries.install(connection=conn)
+
+            self.stdout.write(
+                f"{options['calls']} calls x {len(CONVERSATION)} turns per run, "
+                f"LLM latency {options['latency']}\n"
+            )
+            self.stdout.write(
+                f"{'calls':>6} {'turns/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+                f"{'queries/turn':>13} {'errors':>7}"
+            )
+            for concurrency in (int(c) for c in options["concurrency"].split(",")):
+                level = Level(concurrency)
+                before = queries.count
+                with agent.override(model=model):
+                    asyncio.run(self.run_level(level, options))
+                level.queries = queries.count - before
+                self.report(level)
+            connection_created.disconnect(queries.install)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def seed(self):
+        restaurant = Restaurant.objects.create(name="Load test", phone_number=RESTAURANT_NUMBER)
+        for category_name, items in MENU.items():
+            category = Category.objects.create(name=category_name)
+            for name, price in items:
+                MenuItem.objects.create(
+                    restaurant=restaurant, category=category, name=name, price=price
+                )
+        Branch.objects.create(restaurant=restaurant, name=BRANCH)
+        AdminSetting.objects.create(key="GREETING", value="Hi! What would you like to order?")
+
+    async def run_level(self, level: Level, options):
+        slots = asyncio.Semaphore(level.concurrency)
+
+        async def run_call(call_no: int):
+            async with slots:
+                await self.run_call(level, call_no, options)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(run_call(n) for n in range(options["calls"])))
+        level.elapsed = time.perf_counter() - started
+
+    async def run_call(self, level: Level, call_no: int, options):
+        call_sid = f"CA-load-{level.concurrency}-{call_no}"
+        caller = f"+1555{level.concurrency:03d}{call_no:04d}"
+        client = AsyncClient(raise_request_exception=False)
+        response = await client.post("/voice/", call_payload(call_sid, caller))
+        if response.status_code != 200:
+            level.errors += 1
+            return
+        for speech in CONVERSATION:
+            started = time.perf_counter()
+            response = await client.post(
+                "/process_speech/", call_payload(call_sid, caller, speech)
+            )
+            # Slow turns answer with a filler and a redirect (core.filler).
+            while response.status_code == 200 and b"/turn_result/" in response.content:
+                response = await client.post("/turn_result/", call_payload(call_sid, caller))
+            if response.status_code != 200:
+                level.errors += 1
+                break
+            level.turns.append(time.perf_counter() - started)
+            if b"<Hangup" in response.content:
+                break
+            if options["think"]:
+                await asyncio.sleep(options["think"])
+        await client.post(
+            "/call_status/", {"CallSid": call_sid, "CallStatus": "completed"}
+        )
+
+    def report(self, level: Level):
+        turns = sorted(level.turns)
+        ms = [t * 1000 for t in turns]
+        error_rate = level.errors / level.requests if level.requests else 0.0
+        self.stdout.write(
+            f"{level.concurrency:>6} {len(turns) / level.elapsed:>8.1f} "
+            f"{percentile(ms, 50):>8.0f} {percentile(ms, 95):>8.0f} {percentile(ms, 99):>8.0f} "
+            f"{level.queries / max(len(turns), 1):>13.1f} {error_rate:>7.1%}"
+        )
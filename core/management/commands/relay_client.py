@@ -0,0 +1,133 @@
+import asyncio
+import json
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from core.models import Restaurant
+from core.relay import conversation_relay
+from core.tools import agent
+from core.utils.fake_llm import fake_model
+from core.views import DEVELOPMENT
+
+RESTAURANT_NUMBER = "+15550000000"
+CALLER_NUMBER = "+15551234567"
+REPLY = (
+    "Sure, I've added two cheese burgers to your order. "
+    "Would you like any drinks with that? "
+    "We have cola, lemonade and iced tea today."
+)
+
+
+class InProcessSocket:
+    """Drives the relay ASGI app directly through its receive/send channels."""
+
+    def __init__(self):
+        self.inbox = asyncio.Queue()
+        self.outbox = asyncio.Queue()
+        self.app = None
+
+    async def connect(self):
+        self.app = asyncio.create_task(
+            conversation_relay({"type": "websocket", "path": "/relay/"}, self.inbox.get, self.outbox.put)
+        )
+        await self.inbox.put({"type": "websocket.connect"})
+        assert (await self.outbox.get())["type"] == "websocket.accept"
+
+    async def send(self, payload: dict):
+        await self.inbox.put({"type": "websocket.receive", "text": json.dumps(payload)})
+
+    async def recv(self) -> dict:
+        return json.loads((await self.outbox.get())["text"])
+
+    async def close(self):
+        await self.inbox.put({"type": "websocket.disconnect"})
+        await self.app
+
+
+class NetworkSocket:
+    """Talks to a running server (``uvicorn project.asgi:application``)."""
+
+    def __init__(self, url):
+        self.url = url
+        self.ws = None
+
+    async def connect(self):
+        import websockets
+
+        self.ws = await websockets.connect(self.url)
+
+    async def send(self, payload: dict):
+        await self.ws.send(json.dumps(payload))
+
+    async def recv(self) -> dict:
+        return json.loads(await self.ws.recv())
+
+    async def close(self):
+        await self.ws.close()
+
+
+class Command(BaseCommand):
+    help = (
+        "Fake Twilio ConversationRelay client. Sends caller prompts to the /relay/ "
+        "socket and reports time to first sentence vs. the full reply. Runs the "
+        "relay in-process against a fake LLM and a test database unless --url is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("prompts", nargs="*", default=["Two cheese burgers please"])
+        parser.add_argument("--url", help="e.g. ws://localhost:8000/relay/")
+        parser.add_argument("--to", default=RESTAURANT_NUMBER, help="Restaurant number.")
+        parser.add_argument("--latency", type=float, default=2.0, help="Fake LLM latency in seconds.")
+
+    def handle(self, *args, **options):
+        if options["url"]:
+            asyncio.run(self.run_call(NetworkSocket(options["url"]), options))
+            return
+
+        setup_test_environment()
+        if connection.vendor == "sqlite":
+            connection.settings_dict["TEST"]["NAME"] = tempfile.mktemp(suffix=".sqlite3")
+        old_name = connection.creation.create_test_db(verbosity=0)
+        try:
+            Restaurant.objects.create(name="Relay", phone_number=options["to"])
+            with agent.override(model=fake_model(latency=options["latency"], reply=REPLY)):
+                asyncio.run(self.run_call(InProcessSocket(), options))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    async def run_call(self, socket, options):
+        to_number, from_number = options["to"], CALLER_NUMBER
+        if DEVELOPMENT:
+            # core.relay swaps from/to in development, like views.process_speech.
+            to_number, from_number = from_number, to_number
+
+        await socket.connect()
+        await socket.send(
+            {"type": "setup", "callSid": "CA-relay-client", "from": from_number, "to": to_number}
+        )
+        for prompt in options["prompts"]:
+            self.stdout.write(f"👤 {prompt}")
+            await socket.send({"type": "prompt", "voicePrompt": prompt, "last": True})
+
+            started = time.perf_counter()
+            first_sentence = None
+            while True:
+                message = await socket.recv()
+                elapsed = time.perf_counter() - started
+                if message["type"] == "end":
+                    self.stdout.write("📞 end of call")
+                    break
+                if message["token"]:
+                    first_sentence = first_sentence or elapsed
+                    self.stdout.write(f"  🤖 +{elapsed:.2f}s {message['token'].strip()}")
+                if message["last"]:
+                    break
+            self.stdout.write(
+                f"  time to first sentence {first_sentence or 0:.2f}s, full reply {elapsed:.2f}s"
+            )
+        await socket.close()
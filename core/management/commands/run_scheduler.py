@@ -0,0 +1,29 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from core.scheduler import SCHEDULER_WORKERS, Dispatcher
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs scheduled jobs (customer callbacks) as they fall due. Run one or "
+        "more alongside the web workers; they share the work through the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=SCHEDULER_WORKERS)
+        parser.add_argument("--worker-id", help="Defaults to host:pid.")
+        parser.add_argument(
+            "--once", action="store_true", help="Run the jobs that are due, then exit."
+        )
+
+    def handle(self, *args, **options):
+        dispatcher = Dispatcher(options["worker_id"], options["workers"])
+        # Finish the jobs in hand on a deploy's SIGTERM; the rest stay pending.
+        signal.signal(signal.SIGTERM, lambda *_: dispatcher.stop())
+        self.stdout.write(f"Scheduler {dispatcher.worker_id} running, Ctrl-C to stop")
+        try:
+            dispatcher.run_forever(once=options["once"])
+        except KeyboardInterrupt:
+            dispatcher.stop()
@@ -0,0 +1,124 @@
+import json
+from collections import Counter
+
+import tiktoken
+from django.core.management.base import BaseCommand
+from pydantic_ai import ModelResponse, SystemPromptPart, TextPart, UserPromptPart
+from pydantic_ai.messages import ToolCallPart, ToolReturnPart
+
+from core.models import Order
+from core.prompt import call_prompt, restaurant_prompt
+from core.sessions import CallSession
+from core.tools import agent
+from core.turns import get_message_history
+
+COMPONENTS = (
+    "instructions",
+    "tool schemas",
+    "history: caller",
+    "history: agent",
+    "history: tool calls",
+    "history: tool results",
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Which parts of the prompt the input tokens go to, replaying every model "
+        "request of recent calls from their stored message history."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=20, help="Most recent N orders")
+        parser.add_argument("--order", type=int, help="A single order id")
+        parser.add_argument("--restaurant", type=int, help="Restaurant id")
+        parser.add_argument("--encoding", default="o200k_base", help="tiktoken encoding")
+
+    def handle(self, *args, **options):
+        self.count = self.tokenizer(options["encoding"])
+        orders = Order.objects.exclude(message_history=b"").select_related("restaurant")
+        if options["order"]:
+            orders = orders.filter(pk=options["order"])
+        if options["restaurant"]:
+            orders = orders.filter(restaurant_id=options["restaurant"])
+        orders = orders.order_by("-created_at")[: options["orders"]]
+
+        schemas = self.count(
+            json.dumps(
+                [
+                    {
+                        "name": tool.tool_def.name,
+                        "description": tool.tool_def.description,
+                        "parameters": tool.tool_def.parameters_json_schema,
+                    }
+                    for toolset in agent.toolsets
+                    for tool in getattr(toolset, "tools", {}).values()
+                ]
+            )
+        )
+
+        totals = Counter()
+        requests = 0
+        for order in orders:
+            order_totals, order_requests = self.replay(order, schemas)
+            totals += order_totals
+            requests += order_requests
+
+        if not requests:
+            self.stdout.write("No stored message histories.")
+            return
+        total = sum(totals.values())
+        self.stdout.write(
+            f"{len(orders)} calls, {requests} model requests, "
+            f"~{total} input tokens ({total / requests:.0f} per request)\n"
+        )
+        self.stdout.write(f"{'component':<24} {'tokens':>10} {'per req':>9} {'share':>7}")
+        for component in COMPONENTS:
+            tokens = totals[component]
+            self.stdout.write(
+                f"{component:<24} {tokens:>10} {tokens / requests:>9.0f} {tokens / total:>7.1%}"
+            )
+
+    def replay(self, order: Order, schemas: int) -> tuple[Counter, int]:
+        """
+        Counts the input of every model request of the call: each one sends
+        the instructions, the tool schemas and all messages before it.
+        """
+        session = CallSession(call_sid=order.call_sid, restaurant=order.restaurant, order=order)
+        instructions = restaurant_prompt(session) + call_prompt(session)
+        instructions = self.count(instructions)
+        history = Counter()
+        totals = Counter()
+        requests = 0
+        for message in get_message_history(order):
+            if isinstance(message, ModelResponse):
+                requests += 1
+                totals["instructions"] += instructions
+                totals["tool schemas"] += schemas
+                totals += history
+            for part in message.parts:
+                if isinstance(part, SystemPromptPart):
+                    # Sent with every request, like the instructions.
+                    instructions += self.count(part.content)
+                elif isinstance(part, UserPromptPart):
+                    history["history: caller"] += self.count(str(part.content))
+                elif isinstance(part, TextPart):
+                    history["history: agent"] += self.count(part.content)
+                elif isinstance(part, ToolCallPart):
+                    history["history: tool calls"] += self.count(
+                        part.tool_name + part.args_as_json_str()
+                    )
+                elif isinstance(part, ToolReturnPart):
+                    history["history: tool results"] += self.count(
+                        part.model_response_str()
+                    )
+        return totals, requests
+
+    def tokenizer(self, encoding: str):
+        try:
+            encode = tiktoken.get_encoding(encoding).encode
+        except Exception as e:
+            # The encoding is downloaded on first use; offline, estimate instead.
+            self.stderr.write(f"Can't load {encoding} ({e}); estimating 4 characters per token.")
+            return lambda text: (len(text) + 3) // 4
+        return lambda text: len(encode(text))
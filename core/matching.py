@@ -0,0 +1,267 @@
+"""
+Resolving what the caller said to a menu item or branch name.
+
+Names come from speech recognition, so they are often misspelt, sound-alike
+or missing a word. A matcher is built once from the candidate names and
+then answers ``match(query)`` with the best name, or None when nothing is
+close enough, and ``candidates(query)`` with the best few and their scores.
+Matchers register themselves in ``MATCHERS`` under a short name; ``NAME_MATCHER`` picks the one the tools use and
+``manage.py bench_matching`` compares them on generated menus and noisy
+queries.
+"""
+
+import os
+import re
+from collections import Counter
+from difflib import SequenceMatcher, get_close_matches
+from typing import Protocol
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+NAME_MATCHER = os.getenv("NAME_MATCHER", "hybrid")
+
+
+class Matcher(Protocol):
+    # Score a "menu" item or "branch" name needs to be accepted (own scale).
+    cutoffs: dict[str, float]
+
+    def __init__(self, names: list[str], use: str = "menu"): ...
+
+    def add(self, name: str): ...
+
+    def remove(self, name: str): ...
+
+    def candidates(self, query: str, limit: int = 5) -> list[tuple[str, float]]:
+        """The best names for ``query`` with their scores, best first."""
+
+    def match(self, query: str) -> str | None: ...
+
+
+MATCHERS: dict[str, type[Matcher]] = {}
+
+
+def register(name: str):
+    def decorator(cls):
+        MATCHERS[name] = cls
+        return cls
+
+    return decorator
+
+
+def get_matcher(names: list[str], use: str, kind: str | None = None) -> Matcher:
+    """
+    Builds the configured matcher (or ``kind``) over ``names``, with its
+    cutoffs for ``use``: "menu" or "branch".
+    """
+    return MATCHERS[kind or NAME_MATCHER](names, use)
+
+
+@register("difflib")
+class DifflibMatcher:
+    """``difflib.get_close_matches``: compares the query with every name."""
+
+    cutoffs = {"menu": 0.8, "branch": 0.7}
+
+    def __init__(self, names: list[str], use: str = "menu"):
+        self.names = list(names)
+        self.cutoff = self.cutoffs[use]
+
+    def add(self, name: str):
+        self.names.append(name)
+
+    def remove(self, name: str):
+        self.names.remove(name)
+
+    def candidates(self, query: str, limit: int = 5) -> list[tuple[str, float]]:
+        return [
+            (name, SequenceMatcher(None, query, name).ratio())
+            for name in get_close_matches(query, self.names, n=limit, cutoff=self.cutoff)
+        ]
+
+    def match(self, query: str) -> str | None:
+        matches = get_close_matches(query, self.names, n=1, cutoff=self.cutoff)
+        return matches[0] if matches else None
+
+
+ONES = [
+    "zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten",
+    "eleven", "twelve", "thirteen", "fourteen", "fifteen", "sixteen", "seventeen",
+    "eighteen", "nineteen",
+]
+TENS = ["", "", "twenty", "thirty", "forty", "fifty", "sixty", "seventy", "eighty", "ninety"]
+
+
+def number_words(number: int) -> str:
+    """7 -> "seven", 42 -> "forty two"; 100 and up are read digit by digit."""
+    if number < 20:
+        return ONES[number]
+    if number < 100:
+        return f"{TENS[number // 10]} {ONES[number % 10]}" if number % 10 else TENS[number // 10]
+    return " ".join(ONES[int(digit)] for digit in str(number))
+
+
+def normalise(name: str) -> str:
+    """Lowercase words, numbers spelt out: "7-Up & Fries" -> "seven up and fries"."""
+    name = name.lower().replace("&", " and ")
+    name = re.sub(r"\d+", lambda m: f" {number_words(int(m.group()))} ", name)
+    return " ".join(re.sub(r"[^\w\s]", " ", name).split())
+
+
+def trigrams(text: str) -> set[str]:
+    """Character trigrams of each word, padded like pg_trgm ("  c", " ch", ...)."""
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+@register("trigram")
+class TrigramMatcher:
+    """
+    Inverted index from character trigrams to names. A lookup only touches
+    names sharing a trigram with the query, and scores them by how much of
+    the name the query covers, less a penalty for the query's extra
+    trigrams, so "can i get the cheese burger" still finds "Cheese Burger".
+    """
+
+    # Tuned with bench_matching: no wrong dish on 50-item menus, few on 500.
+    cutoffs = {"menu": 0.7, "branch": 0.55}
+    # Weight of the query's trigrams that aren't in the name.
+    EXTRA_PENALTY = 0.25
+
+    def __init__(self, names: list[str], use: str = "menu"):
+        self.cutoff = self.cutoffs[use]
+        # key (normalised name) -> names, trigram -> keys
+        self.names: dict[str, list[str]] = {}
+        self.grams: dict[str, set[str]] = {}
+        self.index: dict[str, set[str]] = {}
+        for name in names:
+            self.add(name)
+
+    def key(self, name: str) -> str:
+        return normalise(name)
+
+    def add(self, name: str):
+        key = self.key(name)
+        if key not in self.names:
+            self.names[key] = []
+            self.grams[key] = trigrams(key)
+            for gram in self.grams[key]:
+                self.index.setdefault(gram, set()).add(key)
+        self.names[key].append(name)
+
+    def remove(self, name: str):
+        key = self.key(name)
+        names = self.names.get(key)
+        if not names or name not in names:
+            return
+        names.remove(name)
+        if names:
+            return
+        del self.names[key]
+        for gram in self.grams.pop(key):
+            postings = self.index[gram]
+            postings.discard(key)
+            if not postings:
+                del self.index[gram]
+
+    def candidates(self, query: str, limit: int = 5) -> list[tuple[str, float]]:
+        query_grams = trigrams(self.key(query))
+        if not query_grams:
+            return []
+        shared = Counter()
+        for gram in query_grams:
+            shared.update(self.index.get(gram, ()))
+        scored = []
+        for key, count in shared.items():
+            coverage = count / len(self.grams[key])
+            extra = (len(query_grams) - count) / len(query_grams)
+            scored.append((key, coverage - self.EXTRA_PENALTY * extra))
+        scored.sort(key=lambda item: -item[1])
+        return [(self.names[key][0], score) for key, score in scored[:limit]]
+
+    def match(self, query: str) -> str | None:
+        best = self.candidates(query, limit=1)
+        if best and best[0][1] >= self.cutoff:
+            return best[0][0]
+        return None
+
+
+# Spellings that sound alike, rewritten in order to one form (Metaphone-style).
+SOUNDS = [
+    (r"^kn|^gn|^pn|^wr", lambda m: m.group()[1]),
+    (r"^x", "s"),
+    (r"x", "ks"),
+    (r"ph", "f"),
+    (r"[cs]?ch|sh|ti(?=[ao])", "x"),
+    (r"ck|q", "k"),
+    (r"c(?=[eiy])", "s"),
+    (r"c", "k"),
+    (r"dg(?=[eiy])|g(?=[eiy])", "j"),
+    (r"gh(?![aeiou])", ""),
+    (r"th", "0"),
+    (r"z", "s"),
+    (r"v", "f"),
+]
+SOUNDS = [(re.compile(pattern), replacement) for pattern, replacement in SOUNDS]
+
+
+def phonetic_key(word: str) -> str:
+    """
+    How a word sounds, roughly: "cheese" and "chees" -> "xs", "chicken" and
+    "chikken" -> "xkn", "biryani" and "briyani" -> "brn".
+    """
+    for pattern, replacement in SOUNDS:
+        word = pattern.sub(replacement, word)
+    # Vowels (and h, w, y) only count at the start of a word.
+    key = word[:1] + re.sub(r"[aeiouhwy]", "", word[1:])
+    if key[:1] in "aeiouy":
+        key = "a" + key[1:]
+    # Doubled consonants sound like one.
+    return re.sub(r"(.)\1+", r"\1", key)
+
+
+@register("phonetic")
+class PhoneticMatcher(TrigramMatcher):
+    """``TrigramMatcher`` over the phonetic keys of the names' words."""
+
+    # Only consulted after spelling fails, so kept strict: a wrong dish is
+    # worse than asking again.
+    cutoffs = {"menu": 0.8, "branch": 0.6}
+
+    def key(self, name: str) -> str:
+        return " ".join(phonetic_key(word) for word in normalise(name).split())
+
+
+@register("hybrid")
+class HybridMatcher:
+    """
+    Spelling first (trigrams), and how the name sounds when no name is
+    spelt closely enough, e.g. "butter chikken" for "Butter Chicken".
+    """
+
+    cutoffs = TrigramMatcher.cutoffs
+
+    def __init__(self, names: list[str], use: str = "menu"):
+        self.spelling = TrigramMatcher(names, use)
+        self.sound = PhoneticMatcher(names, use)
+
+    def add(self, name: str):
+        self.spelling.add(name)
+        self.sound.add(name)
+
+    def remove(self, name: str):
+        self.spelling.remove(name)
+        self.sound.remove(name)
+
+    def candidates(self, query: str, limit: int = 5) -> list[tuple[str, float]]:
+        candidates = self.spelling.candidates(query, limit)
+        if candidates and candidates[0][1] >= self.spelling.cutoff:
+            return candidates
+        return self.sound.candidates(query, limit)
+
+    def match(self, query: str) -> str | None:
+        return self.spelling.match(query) or self.sound.match(query)
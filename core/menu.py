@@ -0,0 +1,149 @@
+"""
+Per-restaurant menu snapshots.
+
+A restaurant's menu is read with one joined query into an immutable
+``MenuSnapshot`` and kept in memory under the restaurant's menu version,
+which ``core.signals`` bumps whenever an item, branch or category changes.
+The bump is also made to ``Restaurant.menu_version`` in the database, and
+each snapshot records the value it was built at (``db_version``). A snapshot
+is handed to a new call only if both still match, so the next caller on any
+worker gets the edited menu, for one small query per call; caches shared
+between calls use ``db_version`` to tell which menu a reply was made from.
+Snapshots are also rebuilt after ``MENU_REFRESH_SECONDS``. A call pins the snapshot it first used
+(``CallSession.menu``), so every lookup in the call is free and sees the same
+menu even if it is edited mid-call: the prompt's menu (``core.prompt``),
+``get_menu``, and the item and branch names the tools resolve
+(``RestaurantIndex``, built from the same rows) all come from it.
+"""
+
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict
+
+from django.db.models import F
+from dotenv import load_dotenv
+
+from .logger import get_logger
+from .menu_index import RestaurantIndex
+from .models import Branch, MenuItem, Restaurant
+
+log = get_logger()
+
+load_dotenv()
+
+MENU_REFRESH_SECONDS = int(os.getenv("MENU_REFRESH_SECONDS", "60"))
+
+# Bumped whenever a restaurant's menu or branches change (see core.signals),
+# so caches keyed on it stop matching. None holds changes that affect every
+# restaurant (categories). Per process; other workers rely on their caches' TTL.
+_menu_versions: dict[int | None, int] = {}
+
+
+def menu_version(restaurant_id: int) -> tuple[int, int]:
+    return _menu_versions.get(restaurant_id, 0), _menu_versions.get(None, 0)
+
+
+def bump_menu_version(restaurant_id: int | None):
+    _menu_versions[restaurant_id] = _menu_versions.get(restaurant_id, 0) + 1
+    restaurants = Restaurant.objects.all()
+    if restaurant_id is not None:
+        restaurants = restaurants.filter(pk=restaurant_id)
+    restaurants.update(menu_version=F("menu_version") + 1)
+
+
+def db_menu_version(restaurant_id: int) -> int:
+    """``Restaurant.menu_version`` as stored, i.e. as every worker sees it."""
+    return (
+        Restaurant.objects.filter(pk=restaurant_id)
+        .values_list("menu_version", flat=True)
+        .first()
+        or 0
+    )
+
+
+@dataclass(frozen=True)
+class MenuSnapshot:
+    restaurant_id: int
+    version: tuple[int, int]
+    # Restaurant.menu_version when the snapshot was read.
+    db_version: int
+    # category -> {item name: price}. Shared by every call: never mutate it.
+    menu: Dict[str, Dict[str, Any]]
+    # Every item of the restaurant, by name, for resolving what callers say.
+    index: RestaurantIndex
+    loaded_at: float = field(default_factory=time.monotonic)
+
+
+# restaurant id -> its latest snapshot
+_snapshots: dict[int, MenuSnapshot] = {}
+_lock = threading.Lock()
+
+
+def build_menu(restaurant: Restaurant) -> tuple[Dict[str, Dict[str, Any]], list[tuple[int, str]]]:
+    """
+    Builds the menu of a restaurant from the database, in one query.
+
+    Returns:
+        tuple: A dictionary representing the menu, grouped by category, with
+               each item and its price; and (id, name) of every item of the
+               restaurant, categorised or not.
+    """
+    menu_dict: Dict[str, Dict[str, Any]] = {}
+    items = []
+    rows = MenuItem.objects.filter(restaurant=restaurant).values_list(
+        "id", "category__name", "name", "price"
+    )
+    for item_id, category, name, price in rows:
+        items.append((item_id, name))
+        if category is not None:
+            menu_dict.setdefault(category, {})[name] = price
+    return menu_dict, items
+
+
+def menu_snapshot(restaurant: Restaurant) -> MenuSnapshot:
+    """
+    The restaurant's current snapshot, built if its menu changed since, here
+    or (per ``Restaurant.menu_version``) on another worker.
+    """
+    snapshot = _snapshots.get(restaurant.pk)
+    version = menu_version(restaurant.pk)
+    # Read before the menu: an edit in between leaves the snapshot marked older
+    # than its contents, never newer.
+    db_version = db_menu_version(restaurant.pk)
+    if (
+        snapshot
+        and snapshot.version == version
+        and snapshot.db_version == db_version
+        and time.monotonic() - snapshot.loaded_at < MENU_REFRESH_SECONDS
+    ):
+        return snapshot
+
+    menu, items = build_menu(restaurant)
+    branches = Branch.objects.filter(restaurant=restaurant).values_list("name", flat=True)
+    snapshot = MenuSnapshot(
+        restaurant_id=restaurant.pk,
+        version=version,
+        db_version=db_version,
+        menu=menu,
+        index=RestaurantIndex(items, list(branches)),
+    )
+    with _lock:
+        _snapshots[restaurant.pk] = snapshot
+    log.info(f"[menu] snapshot of {restaurant} v{version}: {len(items)} items")
+    return snapshot
+
+
+def format_menu_for_instructions(menu_dict):
+    """
+    The menu as prompt text. Categories and items are sorted so the text is
+    byte-identical however the rows come out of the database.
+    """
+    menu_string = ""
+    for category, items in sorted(menu_dict.items()):
+        menu_string += f"**{category}:**\n"
+        for item, price in sorted(items.items()):
+            menu_string += f"- {item}: ${price:.2f}\n"
+        menu_string += "\n"  # Add a newline for separation between categories
+    return menu_string
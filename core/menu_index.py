@@ -0,0 +1,46 @@
+"""
+Index of a menu snapshot's item and branch names.
+
+``set_or_modify_items`` resolves what the caller said against the calling
+restaurant's own items only, as they were in the menu snapshot the call
+pinned (``CallSession.menu``), so the items a caller can order are exactly
+the ones the prompt and ``get_menu`` showed them; ``set_pick_up_branch`` does
+the same with its branches. Each snapshot gets its index (``core.matching``
+matchers, hybrid by default) when it is built, and it is never changed
+afterwards: a menu or branch edit makes a new snapshot with a new index. A
+lookup doesn't touch the database.
+"""
+
+from .matching import Matcher, get_matcher
+
+
+class RestaurantIndex:
+    def __init__(self, items: list[tuple[int, str]], branches: list[str] = ()):
+        self.names: dict[int, str] = {}
+        # name -> ids of the items called that (normally one)
+        self.ids: dict[str, list[int]] = {}
+        for item_id, name in items:
+            self.names[item_id] = name
+            self.ids.setdefault(name, []).append(item_id)
+        self.matcher: Matcher = get_matcher(list(self.ids), "menu")
+        self.branches: list[str] = sorted(branches)
+        self.branch_matcher: Matcher = get_matcher(self.branches, "branch")
+
+    def __len__(self):
+        return len(self.names)
+
+    def resolve(self, names: list[str]) -> dict[str, tuple[int, str] | None]:
+        """Spoken name -> (item id, menu name) of its best match, or None."""
+        resolved = {}
+        for name in names:
+            match = self.matcher.match(name)
+            resolved[name] = (self.ids[match][0], match) if match else None
+        return resolved
+
+    def branch(self, name: str) -> str | None:
+        """The branch name best matching ``name``, or None."""
+        return self.branch_matcher.match(name)
+
+    def candidates(self, query: str, limit: int = 5) -> list[tuple[str, float]]:
+        """The best-scoring item names for ``query``, best first."""
+        return self.matcher.candidates(query, limit)
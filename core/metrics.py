@@ -0,0 +1,248 @@
+"""
+Per-turn latency breakdown.
+
+A ``TurnTimer`` is started for each caller turn and collects spans: request
+parse, database work, each model request, each tool call and the response
+build. Model requests and tool calls are timed by the ``timing`` capability
+on the agent, everything else with ``span``. The timer travels in a context
+variable, so code deep in a turn can add spans without being handed it.
+
+Finished turns are stored as ``TurnMetrics`` with one ``TurnSpan`` per span;
+``manage.py latency_report`` gives p50/p95 per restaurant and per tool. They
+are written by a background thread (``MetricsWriter``) in batches, at least
+every ``METRICS_FLUSH_SECONDS``, so measuring a turn adds no database write
+to it.
+
+LLM usage is normally taken from a finished run's result. Runs that may never
+finish (speculative ones) are given a ``Spend`` instead, through
+``current_spend``, which the same capability adds every model response to as
+it arrives.
+"""
+
+import atexit
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from django.db import close_old_connections, transaction
+from dotenv import load_dotenv
+from pydantic_ai import ModelResponse
+from pydantic_ai.capabilities import Hooks
+from pydantic_ai.messages import ModelMessage
+from pydantic_ai.usage import RunUsage
+
+from .logger import get_logger
+from .models import Order, SpanKind, TurnMetrics, TurnSpan
+
+log = get_logger()
+
+load_dotenv()
+
+TURN_METRICS = os.getenv("TURN_METRICS", "true").lower() == "true"
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "1"))
+METRICS_BATCH = int(os.getenv("METRICS_BATCH", "200"))
+
+
+class TurnTimer:
+    def __init__(self, mode: str):
+        self.mode = mode
+        self.started = time.perf_counter()
+        # (kind, name, start_ms, duration_ms)
+        self.spans: list[tuple[str, str, float, float]] = []
+        self.usage = RunUsage()
+        self.cost = Decimal(0)
+
+    def add(self, kind: str, name: str, started: float, ended: float):
+        self.spans.append(
+            (kind, name, (started - self.started) * 1000, (ended - started) * 1000)
+        )
+
+    def total(self, kind: str) -> float:
+        return sum(duration for k, _, _, duration in self.spans if k == kind)
+
+    def count(self, kind: str) -> int:
+        return sum(1 for k, *_ in self.spans if k == kind)
+
+
+current_timer: ContextVar[TurnTimer | None] = ContextVar("current_timer", default=None)
+
+
+def start_turn(mode: str) -> TurnTimer | None:
+    if not TURN_METRICS:
+        return None
+    timer = TurnTimer(mode)
+    current_timer.set(timer)
+    return timer
+
+
+def record_usage(usage: RunUsage, cost: Decimal):
+    """Adds the turn's LLM usage to the current turn's metrics."""
+    timer = current_timer.get()
+    if timer is not None:
+        timer.usage = timer.usage + usage
+        timer.cost += cost
+
+
+@dataclass
+class Spend:
+    """LLM usage and its estimated cost in USD."""
+
+    usage: RunUsage = field(default_factory=RunUsage)
+    cost: Decimal = Decimal(0)
+
+    def add(self, other: "Spend"):
+        self.usage.incr(other.usage)
+        self.cost += other.cost
+
+    def add_response(self, response: ModelResponse):
+        self.usage.incr(response.usage)
+        self.usage.requests += 1
+        self.cost += llm_cost([response])
+
+
+# Added to by every model response and tool call of the agent run in progress.
+current_spend: ContextVar[Spend | None] = ContextVar("current_spend", default=None)
+
+
+def llm_cost(messages: list[ModelMessage]) -> Decimal:
+    """Estimated cost in USD of the model responses (genai-prices)."""
+    cost = Decimal(0)
+    for message in messages:
+        if isinstance(message, ModelResponse) and message.model_name:
+            try:
+                cost += message.cost().total_price
+            except LookupError:
+                # Unknown model (e.g. a test model); counted as free.
+                pass
+    return cost
+
+
+@contextmanager
+def span(kind: str, name: str = ""):
+    """Times the block as a span of the current turn (a no-op outside one)."""
+    timer = current_timer.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timer is not None:
+            timer.add(kind, name, started, time.perf_counter())
+
+
+class MetricsWriter:
+    """Stores finished turns from a background thread, a batch at a time."""
+
+    def __init__(self, flush_seconds: float = METRICS_FLUSH_SECONDS, batch: int = METRICS_BATCH):
+        self.flush_seconds = flush_seconds
+        self.batch = batch
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def put(self, metrics: TurnMetrics, spans: list[TurnSpan]):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="metrics", daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+        self._queue.put((metrics, spans))
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_seconds
+            while len(batch) < self.batch and (left := deadline - time.monotonic()) > 0:
+                try:
+                    batch.append(self._queue.get(timeout=left))
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def flush(self):
+        """Writes whatever is queued now, in the calling thread."""
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self._write(batch)
+
+    def _write(self, batch: list[tuple[TurnMetrics, list[TurnSpan]]]):
+        try:
+            close_old_connections()
+            with transaction.atomic():
+                TurnMetrics.objects.bulk_create([metrics for metrics, _ in batch])
+                for metrics, spans in batch:
+                    for turn_span in spans:
+                        turn_span.turn = metrics
+                TurnSpan.objects.bulk_create(
+                    [turn_span for _, spans in batch for turn_span in spans]
+                )
+        except Exception as e:
+            log.exception(f"[metrics] could not store {len(batch)} turns {e}")
+
+
+metrics_writer = MetricsWriter()
+
+
+def finish_turn(timer: TurnTimer | None, order: Order | None):
+    """Queues the turn's timings to be stored. Never fails the turn."""
+    if current_timer.get() is timer:
+        current_timer.set(None)
+    if timer is None or order is None:
+        return
+    total_ms = (time.perf_counter() - timer.started) * 1000
+    metrics = TurnMetrics(
+        order=order,
+        restaurant_id=order.restaurant_id,
+        mode=timer.mode,
+        total_ms=total_ms,
+        parse_ms=timer.total(SpanKind.PARSE),
+        db_ms=timer.total(SpanKind.DB),
+        model_ms=timer.total(SpanKind.MODEL),
+        tools_ms=timer.total(SpanKind.TOOL),
+        render_ms=timer.total(SpanKind.RENDER),
+        model_requests=timer.count(SpanKind.MODEL),
+        input_tokens=timer.usage.input_tokens,
+        cache_read_tokens=timer.usage.cache_read_tokens,
+        output_tokens=timer.usage.output_tokens,
+        tool_calls=timer.usage.tool_calls,
+        llm_cost=timer.cost,
+    )
+    spans = [
+        TurnSpan(kind=kind, name=name, start_ms=start_ms, duration_ms=duration_ms)
+        for kind, name, start_ms, duration_ms in timer.spans
+    ]
+    metrics_writer.put(metrics, spans)
+    log.info(
+        f"[metrics] {order.call_sid} {total_ms:.0f} ms "
+        f"(model {metrics.model_ms:.0f}, tools {metrics.tools_ms:.0f}, db {metrics.db_ms:.0f})"
+    )
+
+
+# ------------------ Agent capability ------------------
+timing = Hooks()
+
+
+@timing.on.model_request
+async def time_model_request(ctx, *, request_context, handler):
+    with span(SpanKind.MODEL, ctx.model.model_name):
+        response = await handler(request_context)
+    if (spend := current_spend.get()) is not None:
+        spend.add_response(response)
+    return response
+
+
+@timing.on.tool_execute
+async def time_tool(ctx, *, call, tool_def, args, handler):
+    if (spend := current_spend.get()) is not None:
+        spend.usage.tool_calls += 1
+    with span(SpanKind.TOOL, call.tool_name):
+        return await handler(args)
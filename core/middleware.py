@@ -0,0 +1,68 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from .logger import bind_call
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise middleware that can also run in async mode.
+
+    The stock middleware is sync-only, so under ASGI Django would run every
+    request (and our async views behind it) through a single sync thread,
+    serialising all calls. Static file lookups are in-memory, so they are safe
+    to do directly on the event loop.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
+
+
+class CallContextMiddleware:
+    """
+    Tags every log line written while serving a Twilio webhook with the
+    call's SID (see core.logger). Async-capable so it doesn't push the
+    voice views onto a sync thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def bind(request):
+        # Twilio posts forms. (CsrfViewMiddleware parses POST bodies anyway.)
+        bind_call(request.POST.get("CallSid") if request.method == "POST" else None)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        self.bind(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        self.bind(request)
+        return await self.get_response(request)
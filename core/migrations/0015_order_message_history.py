@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_alter_order_conversation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='message_history',
+            field=models.BinaryField(blank=True, default=bytes),
+        ),
+    ]
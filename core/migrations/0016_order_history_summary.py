@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_order_message_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='history_summary',
+            field=models.TextField(blank=True, default=''),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_phonenumber'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='adminsetting',
+            name='restaurant',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='settings', to='core.restaurant'),
+        ),
+        migrations.AlterField(
+            model_name='adminsetting',
+            name='key',
+            field=models.CharField(max_length=100),
+        ),
+        migrations.AddConstraint(
+            model_name='adminsetting',
+            constraint=models.UniqueConstraint(fields=('restaurant', 'key'), name='unique_setting_per_restaurant'),
+        ),
+        migrations.AddConstraint(
+            model_name='adminsetting',
+            constraint=models.UniqueConstraint(condition=models.Q(('restaurant__isnull', True)), fields=('key',), name='unique_global_setting'),
+        ),
+    ]
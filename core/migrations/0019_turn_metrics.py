@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_adminsetting_restaurant'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TurnMetrics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('mode', models.CharField(max_length=16)),
+                ('total_ms', models.FloatField()),
+                ('parse_ms', models.FloatField(default=0)),
+                ('db_ms', models.FloatField(default=0)),
+                ('model_ms', models.FloatField(default=0)),
+                ('tools_ms', models.FloatField(default=0)),
+                ('render_ms', models.FloatField(default=0)),
+                ('model_requests', models.PositiveSmallIntegerField(default=0)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='turn_metrics', to='core.order')),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='turn_metrics', to='core.restaurant')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TurnSpan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('parse', 'Request parse'), ('db', 'Database'), ('model', 'Model request'), ('tool', 'Tool'), ('render', 'Response build')], max_length=16)),
+                ('name', models.CharField(blank=True, max_length=100)),
+                ('start_ms', models.FloatField()),
+                ('duration_ms', models.FloatField()),
+                ('turn', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='spans', to='core.turnmetrics')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'name'], name='core_turnsp_kind_9140d7_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:16
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_usage_accounting'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='conversation_length',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='conversation',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.CreateModel(
+            name='ConversationTurn',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.PositiveIntegerField()),
+                ('role', models.CharField(choices=[('user', 'Caller'), ('agent', 'Agent'), ('system', 'Tool')], max_length=16)),
+                ('text', models.TextField()),
+                ('tool_name', models.CharField(blank=True, default='', max_length=64)),
+                ('metadata', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversation_turns', to='core.order')),
+            ],
+            options={
+                'ordering': ['order', 'seq'],
+                'constraints': [models.UniqueConstraint(fields=('order', 'seq'), name='unique_conversation_seq')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:33
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_scheduled_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboundCall',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('to_number', models.CharField(max_length=20)),
+                ('from_number', models.CharField(blank=True, max_length=20)),
+                ('call_sid', models.CharField(blank=True, max_length=64)),
+                ('status', models.CharField(choices=[('placed', 'Placed'), ('failed', 'Failed')], max_length=16)),
+                ('attempts', models.PositiveIntegerField(default=1)),
+                ('queue_ms', models.FloatField()),
+                ('dial_ms', models.FloatField()),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('restaurant', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='core.restaurant')),
+            ],
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_restaurant_menu_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='speculative_cost',
+            field=models.DecimalField(decimal_places=6, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='summary_cost',
+            field=models.DecimalField(decimal_places=6, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='speculative_cost',
+            field=models.DecimalField(decimal_places=6, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='summary_cost',
+            field=models.DecimalField(decimal_places=6, default=0, max_digits=12),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 
 class StatusEnum(models.TextChoices):
@@ -15,14 +16,49 @@ class StatusEnum(models.TextChoices):
     CALL_BACK_REQUESTED = "CALL_BACK_REQUESTED", "Call Back Requested"
 
 
-class Restaurant(models.Model):
+class UsageRollup(models.Model):
+    """LLM usage summed over every turn (kept up to date by turns.save_turn)."""
+
+    input_tokens = models.PositiveBigIntegerField(default=0)
+    cache_read_tokens = models.PositiveBigIntegerField(default=0)
+    output_tokens = models.PositiveBigIntegerField(default=0)
+    llm_requests = models.PositiveIntegerField(default=0)
+    tool_calls = models.PositiveIntegerField(default=0)
+    # Estimated with genai-prices, in USD.
+    llm_cost = models.DecimalField(max_digits=12, decimal_places=6, default=0)
+    # Parts of the above spent outside the turns' own agent runs: history
+    # summaries (core.history) and speculative runs that were thrown away
+    # (core.speculation).
+    summary_cost = models.DecimalField(max_digits=12, decimal_places=6, default=0)
+    speculative_cost = models.DecimalField(max_digits=12, decimal_places=6, default=0)
+
+    class Meta:
+        abstract = True
+
+
+class Restaurant(UsageRollup):
     name = models.CharField(max_length=255)
     phone_number = models.CharField(max_length=20, unique=True)
+    # Bumped in the database whenever the menu or branches change (see
+    # core.menu.bump_menu_version), so every worker sees the same version.
+    menu_version = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.name
 
 
+class PhoneNumber(models.Model):
+    """An extra inbound number (DID) that reaches a restaurant."""
+
+    restaurant = models.ForeignKey(
+        Restaurant, on_delete=models.CASCADE, related_name="phone_numbers"
+    )
+    number = models.CharField(max_length=20, unique=True)
+
+    def __str__(self):
+        return self.number
+
+
 class Branch(models.Model):
     restaurant = models.ForeignKey(
         Restaurant, on_delete=models.CASCADE, related_name="branches"
@@ -33,14 +69,23 @@ class Branch(models.Model):
         return f"{self.name} ({self.restaurant.name})"
 
 
-class Order(models.Model):
+class Order(UsageRollup):
     restaurant = models.ForeignKey(
         Restaurant, on_delete=models.CASCADE, null=True, blank=True
     )
     customer_phone = models.CharField(max_length=20)
     call_sid = models.CharField(max_length=64, unique=True)
     # conversation = models.TextField(default="", blank=True)
-    conversation = models.JSONField(default=list)
+    # Legacy: entries are stored as ConversationTurn rows. Kept for orders
+    # not yet copied over by ``manage.py backfill_conversation``.
+    conversation = models.JSONField(default=list, blank=True)
+    # Number of ConversationTurn rows, i.e. the next entry's seq.
+    conversation_length = models.PositiveIntegerField(default=0)
+    # Full pydantic-ai message history (tool calls and results included),
+    # zlib-compressed JSON. See core.turns.dump_messages / load_messages.
+    message_history = models.BinaryField(default=bytes, blank=True)
+    # Summary of exchanges folded out of the history window (see core.history).
+    history_summary = models.TextField(default="", blank=True)
     status = models.CharField(
         max_length=32, choices=StatusEnum.choices, default=StatusEnum.PENDING
     )
@@ -71,6 +116,44 @@ class Order(models.Model):
     def __str__(self):
         return f"Order #{self.id}"
 
+    def conversation_entries(self) -> list[dict]:
+        """
+        The whole conversation as ``{"role", "text"}`` dicts: legacy JSON
+        entries first, then the rows.
+        """
+        rows = self.conversation_turns.values("role", "text") if self.conversation_length else []
+        return [*self.conversation, *rows]
+
+
+class ConversationRole(models.TextChoices):
+    USER = "user", "Caller"
+    AGENT = "agent", "Agent"
+    SYSTEM = "system", "Tool"
+
+
+class ConversationTurn(models.Model):
+    """One entry of a call's conversation. Appended, never rewritten."""
+
+    order = models.ForeignKey(
+        Order, on_delete=models.CASCADE, related_name="conversation_turns"
+    )
+    seq = models.PositiveIntegerField()
+    role = models.CharField(max_length=16, choices=ConversationRole.choices)
+    text = models.TextField()
+    # Tool entries only.
+    tool_name = models.CharField(max_length=64, blank=True, default="")
+    metadata = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["order", "seq"]
+        constraints = [
+            models.UniqueConstraint(fields=["order", "seq"], name="unique_conversation_seq")
+        ]
+
+    def __str__(self):
+        return f"{self.order} #{self.seq} {self.role}"
+
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
@@ -114,8 +197,166 @@ class OrderItem(models.Model):
 
 
 class AdminSetting(models.Model):
-    key = models.CharField(max_length=100, unique=True)
+    """
+    A global setting, or a restaurant's override of it when ``restaurant`` is set.
+    Read through ``core.settings_store`` rather than queried directly.
+    """
+
+    restaurant = models.ForeignKey(
+        Restaurant,
+        on_delete=models.CASCADE,
+        related_name="settings",
+        null=True,
+        blank=True,
+    )
+    key = models.CharField(max_length=100)
     value = models.TextField()
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["restaurant", "key"], name="unique_setting_per_restaurant"
+            ),
+            models.UniqueConstraint(
+                fields=["key"],
+                condition=models.Q(restaurant__isnull=True),
+                name="unique_global_setting",
+            ),
+        ]
+
     def __str__(self):
         return self.key
+
+
+class TurnMetrics(models.Model):
+    """Where the time went in one caller turn (see core.metrics)."""
+
+    order = models.ForeignKey(
+        Order, on_delete=models.CASCADE, related_name="turn_metrics"
+    )
+    restaurant = models.ForeignKey(
+        Restaurant, on_delete=models.CASCADE, related_name="turn_metrics"
+    )
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    # "gather" or "relay"
+    mode = models.CharField(max_length=16)
+    total_ms = models.FloatField()
+    parse_ms = models.FloatField(default=0)
+    db_ms = models.FloatField(default=0)
+    model_ms = models.FloatField(default=0)
+    tools_ms = models.FloatField(default=0)
+    render_ms = models.FloatField(default=0)
+    model_requests = models.PositiveSmallIntegerField(default=0)
+    input_tokens = models.PositiveIntegerField(default=0)
+    cache_read_tokens = models.PositiveIntegerField(default=0)
+    output_tokens = models.PositiveIntegerField(default=0)
+    tool_calls = models.PositiveSmallIntegerField(default=0)
+    llm_cost = models.DecimalField(max_digits=10, decimal_places=6, default=0)
+
+    def __str__(self):
+        return f"Turn {self.created_at:%H:%M:%S} of {self.order} ({self.total_ms:.0f} ms)"
+
+
+class SpanKind(models.TextChoices):
+    PARSE = "parse", "Request parse"
+    DB = "db", "Database"
+    MODEL = "model", "Model request"
+    TOOL = "tool", "Tool"
+    RENDER = "render", "Response build"
+
+
+class TurnSpan(models.Model):
+    turn = models.ForeignKey(
+        TurnMetrics, on_delete=models.CASCADE, related_name="spans"
+    )
+    kind = models.CharField(max_length=16, choices=SpanKind.choices)
+    # The tool or DB step, e.g. "set_or_modify_items" or "load_session".
+    name = models.CharField(max_length=100, blank=True)
+    # Offset from the start of the turn.
+    start_ms = models.FloatField()
+    duration_ms = models.FloatField()
+
+    class Meta:
+        indexes = [models.Index(fields=["kind", "name"])]
+
+    def __str__(self):
+        return f"{self.kind} {self.name} {self.duration_ms:.0f} ms"
+
+
+class JobStatus(models.TextChoices):
+    PENDING = "pending", "Pending"
+    RUNNING = "running", "Running"
+    DONE = "done", "Done"
+    FAILED = "failed", "Failed"
+    CANCELLED = "cancelled", "Cancelled"
+
+
+class ScheduledJob(models.Model):
+    """
+    Work to do at ``run_at``, e.g. calling a customer back. Run by
+    ``manage.py run_scheduler`` (see core.scheduler).
+    """
+
+    # Handler name in core.scheduler.JOBS, e.g. "call_back".
+    kind = models.CharField(max_length=64)
+    restaurant = models.ForeignKey(
+        Restaurant, on_delete=models.CASCADE, null=True, blank=True
+    )
+    # At most one pending or running job per key; scheduling the same key
+    # again moves that job instead of adding another.
+    key = models.CharField(max_length=255)
+    payload = models.JSONField(default=dict, blank=True)
+    run_at = models.DateTimeField()
+    status = models.CharField(
+        max_length=16, choices=JobStatus.choices, default=JobStatus.PENDING
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    # The scheduler running it, and until when the claim holds. A job still
+    # running after that is taken to be lost with its worker and re-run.
+    locked_by = models.CharField(max_length=100, blank=True, default="")
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["run_at"]
+        indexes = [models.Index(fields=["status", "run_at"])]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["key"],
+                condition=models.Q(status__in=["pending", "running"]),
+                name="unique_active_job_key",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.key} at {self.run_at:%Y-%m-%d %H:%M} ({self.status})"
+
+
+class DialStatus(models.TextChoices):
+    PLACED = "placed", "Placed"
+    FAILED = "failed", "Failed"
+
+
+class OutboundCall(models.Model):
+    """One call the dialer placed (or gave up on), see core.dialer."""
+
+    restaurant = models.ForeignKey(
+        Restaurant, on_delete=models.CASCADE, null=True, blank=True
+    )
+    to_number = models.CharField(max_length=20)
+    # Caller ID of the last attempt.
+    from_number = models.CharField(max_length=20, blank=True)
+    call_sid = models.CharField(max_length=64, blank=True)
+    status = models.CharField(max_length=16, choices=DialStatus.choices)
+    attempts = models.PositiveIntegerField(default=1)
+    # Time spent waiting for a worker and the rate limits, over all attempts.
+    queue_ms = models.FloatField()
+    # Twilio's response time for the last attempt.
+    dial_ms = models.FloatField()
+    error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.to_number} {self.status} {self.created_at:%Y-%m-%d %H:%M}"
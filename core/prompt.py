@@ -0,0 +1,108 @@
+"""
+Per-restaurant and per-call parts of the agent's prompt.
+
+The prompt is laid out so that the longest possible prefix is byte-identical
+from one request to the next, which providers bill as cached input:
+
+1. ``myinst.INSTRUCTIONS`` (the system prompt): the same for every call.
+2. The restaurant block (``restaurant_prompt``): menu and branches in a
+   stable order, plus the restaurant's ``PROMPT_NOTES`` setting. The same for
+   every call to that restaurant while its menu is unchanged.
+3. The call block (``call_prompt``): the same for every turn of the call.
+4. The conversation.
+
+With the menu in the prompt the model rarely needs a ``get_menu`` round trip.
+The block's menu and branches are the call's pinned snapshot
+(``CallSession.menu``), so they are the ones ``get_menu`` returns and the
+tools resolve names against. It is compiled once per snapshot and rebuilt
+when the settings change; compiled blocks expire after
+``PROMPT_REFRESH_SECONDS``.
+"""
+
+import os
+import threading
+
+from asgiref.sync import sync_to_async
+from cachetools import TTLCache
+from django.utils import timezone
+from dotenv import load_dotenv
+
+from .logger import get_logger
+from .menu import MenuSnapshot, format_menu_for_instructions
+from .models import Restaurant
+from .sessions import CallSession
+from .settings_store import settings_store
+
+log = get_logger()
+
+load_dotenv()
+
+PROMPT_REFRESH_SECONDS = int(os.getenv("PROMPT_REFRESH_SECONDS", "300"))
+
+# (restaurant id, snapshot) -> (settings version, restaurant name, prompt).
+# Calls on an older snapshot keep theirs until it expires.
+_compiled: TTLCache = TTLCache(maxsize=1000, ttl=PROMPT_REFRESH_SECONDS)
+_lock = threading.Lock()
+
+
+def compile_restaurant_prompt(restaurant: Restaurant, snapshot: MenuSnapshot) -> str:
+    branches = snapshot.index.branches
+    notes = settings_store.get("PROMPT_NOTES", restaurant.pk, default="")
+
+    prompt = f"## Restaurant: {restaurant.name}\n\n## Menu\n\n"
+    prompt += format_menu_for_instructions(snapshot.menu)
+    if branches:
+        prompt += "## Branches (for pickup)\n\n"
+        prompt += "".join(f"- {name}\n" for name in branches)
+    if notes:
+        prompt += f"\n## Notes\n\n{notes.strip()}\n"
+    return prompt
+
+
+def _key(snapshot: MenuSnapshot) -> tuple:
+    return snapshot.restaurant_id, snapshot.db_version, snapshot.version, snapshot.loaded_at
+
+
+def _cached(session: CallSession) -> str | None:
+    if session.snapshot is None:
+        return None
+    with _lock:
+        compiled = _compiled.get(_key(session.snapshot))
+    if compiled is None:
+        return None
+    settings_version, name, prompt = compiled
+    if (settings_version, name) != (settings_store.version, session.restaurant.name):
+        return None
+    return prompt
+
+
+def restaurant_prompt(session: CallSession) -> str:
+    if (prompt := _cached(session)) is not None:
+        return prompt
+    if settings_store.stale:
+        settings_store.load()
+    restaurant = session.restaurant
+    snapshot = session.pinned_menu()
+    settings_version = settings_store.version
+    prompt = compile_restaurant_prompt(restaurant, snapshot)
+    with _lock:
+        _compiled[_key(snapshot)] = (settings_version, restaurant.name, prompt)
+    log.info(f"[prompt] compiled {restaurant} ({len(prompt)} chars)")
+    return prompt
+
+
+async def arestaurant_prompt(session: CallSession) -> str:
+    if (prompt := _cached(session)) is not None:
+        return prompt
+    return await sync_to_async(restaurant_prompt)(session)
+
+
+def call_prompt(session: CallSession) -> str:
+    """Details of this call; nothing here changes between its turns."""
+    order = session.order
+    started = timezone.localtime(order.created_at)
+    return (
+        "## This call\n\n"
+        f"- Caller's phone number: {order.customer_phone}\n"
+        f"- Call started: {started:%A %Y-%m-%d %H:%M}\n"
+    )
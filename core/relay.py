@@ -0,0 +1,193 @@
+"""
+Streaming voice mode over a Twilio ConversationRelay WebSocket.
+
+Instead of one ``<Gather>`` webhook per turn, ``views.voice`` answers with
+``<Connect><ConversationRelay url="wss://.../relay/">`` and Twilio keeps a
+socket open for the whole call. Twilio does speech recognition and
+text-to-speech on its side and exchanges JSON messages with us:
+
+    in:  {"type": "setup", "callSid": ..., "from": ..., "to": ...}
+         {"type": "prompt", "voicePrompt": "...", "last": true}
+         {"type": "interrupt", ...}
+    out: {"type": "text", "token": "...", "last": false}
+         {"type": "end"}
+
+Replies are streamed sentence by sentence while the agent is still
+generating, so the caller hears the first sentence long before the full
+completion is done. Prompts are queued and run one turn at a time, so the
+socket keeps being read during a turn. An ``interrupt`` only stops the
+reply being streamed: the turn still runs to the end and is saved, so the
+conversation matches whatever its tools did to the order.
+"""
+
+import asyncio
+import json
+import re
+import time
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from pydantic_ai.messages import PartDeltaEvent, PartStartEvent, TextPart, TextPartDelta
+
+from .logger import bind_call, get_logger
+from .metrics import finish_turn, start_turn
+from .models import StatusEnum
+from .sessions import evict_session
+from .turns import run_turn
+from .views import DEVELOPMENT
+
+log = get_logger()
+
+RELAY_PATH = "/relay/"
+
+# A sentence ends at . ! or ? followed by whitespace, so "$3.50" is not split.
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+class SentenceBuffer:
+    """Accumulates streamed text deltas and releases complete sentences."""
+
+    def __init__(self):
+        self.text = ""
+
+    def feed(self, delta: str) -> list[str]:
+        self.text += delta
+        *sentences, self.text = SENTENCE_END.split(self.text)
+        return [s for s in sentences if s.strip()]
+
+    def flush(self) -> str:
+        rest, self.text = self.text.strip(), ""
+        return rest
+
+
+async def conversation_relay(scope, receive, send):
+    """ASGI app for one ConversationRelay socket (one call)."""
+    call = {}
+    prompts: asyncio.Queue[str | None] = asyncio.Queue()
+    turns_task = None
+    # Set when the caller talks over the turn being streamed.
+    interrupted = asyncio.Event()
+    speaking = False
+    closed = False
+
+    async def send_json(payload: dict):
+        if not closed:
+            await send({"type": "websocket.send", "text": json.dumps(payload)})
+
+    async def take_turns():
+        nonlocal speaking
+        while (user_speech := await prompts.get()) is not None:
+            interrupted.clear()
+            speaking = True
+            try:
+                await handle_prompt(user_speech)
+            except Exception as e:
+                log.exception(f"[relay] {call.get('call_sid')} turn failed {e}")
+            finally:
+                speaking = False
+
+    async def handle_prompt(user_speech: str):
+        buffer = SentenceBuffer()
+        started = time.perf_counter()
+        first_sentence_at = None
+
+        async def send_sentence(sentence: str):
+            nonlocal first_sentence_at
+            if interrupted.is_set():
+                return
+            if first_sentence_at is None:
+                first_sentence_at = time.perf_counter() - started
+            await send_json({"type": "text", "token": sentence + " ", "last": False})
+
+        async def stream_reply(ctx, events):
+            async for event in events:
+                if isinstance(event, PartStartEvent) and isinstance(event.part, TextPart):
+                    delta = event.part.content
+                elif isinstance(event, PartDeltaEvent) and isinstance(event.delta, TextPartDelta):
+                    delta = event.delta.content_delta
+                else:
+                    continue
+                for sentence in buffer.feed(delta):
+                    await send_sentence(sentence)
+
+        timer = start_turn("relay")
+        try:
+            order, ai_reply = await run_turn(
+                call_sid=call["call_sid"],
+                phone_number=call["to_number"],
+                customer_phone=call["from_number"],
+                user_speech=user_speech,
+                event_stream_handler=stream_reply,
+            )
+        except Exception as e:
+            log.exception(f"[relay] {call['call_sid']} turn failed {e}")
+            await send_json(
+                {"type": "text", "token": "Sorry, something went wrong.", "last": True}
+            )
+            return
+        if rest := buffer.flush():
+            await send_sentence(rest)
+        elif first_sentence_at is None and ai_reply:
+            # Answered without the LLM (core.intents, core.response_cache).
+            await send_sentence(ai_reply)
+        if not interrupted.is_set():
+            await send_json({"type": "text", "token": "", "last": True})
+        finish_turn(timer, order)
+        log.info(
+            f"[relay] {call['call_sid']} first sentence {first_sentence_at or 0:.2f}s, "
+            f"full reply {time.perf_counter() - started:.2f}s"
+        )
+
+        if order.status in (StatusEnum.CONFIRMED, StatusEnum.CALL_BACK_REQUESTED):
+            await send_json({"type": "end"})
+
+    try:
+        while True:
+            message = await receive()
+
+            if message["type"] == "websocket.connect":
+                await send({"type": "websocket.accept"})
+                continue
+            if message["type"] == "websocket.disconnect":
+                break
+
+            data = json.loads(message.get("text") or message["bytes"])
+
+            if data["type"] == "setup":
+                # Mirror views.process_speech's numbering in development.
+                to_number, from_number = data["to"], data["from"]
+                if DEVELOPMENT:
+                    to_number, from_number = from_number, to_number
+                call.update(
+                    call_sid=data["callSid"], to_number=to_number, from_number=from_number
+                )
+                bind_call(data["callSid"])
+                log.info(f"[relay] setup {call}")
+
+            elif data["type"] == "prompt" and data.get("last", True):
+                log.info(f"[relay] {call.get('call_sid')} prompt {data['voicePrompt']}")
+                if turns_task is None:
+                    turns_task = asyncio.create_task(take_turns())
+                prompts.put_nowait(data["voicePrompt"])
+
+            elif data["type"] == "interrupt":
+                # The caller talked over the reply; stop streaming the rest of
+                # it, but let the turn finish and be saved.
+                if speaking:
+                    interrupted.set()
+                log.info(f"[relay] {call.get('call_sid')} interrupted")
+
+            elif data["type"] == "error":
+                log.error(f"[relay] {call.get('call_sid')} {data.get('description')}")
+    finally:
+        # The caller hung up: finish and save the turn in progress, but drop
+        # any queued prompts and send nothing more.
+        closed = True
+        if turns_task:
+            while not prompts.empty():
+                prompts.get_nowait()
+            prompts.put_nowait(None)
+            await turns_task
+        if call:
+            evict_session(call["call_sid"])
+        await sync_to_async(close_old_connections)()
@@ -0,0 +1,184 @@
+"""
+Cache of agent replies to repeated questions.
+
+Callers keep asking the same things ("what's on the menu?", "do you
+deliver?"). With ``RESPONSE_CACHE=true`` a reply is stored under
+
+    (restaurant, menu version, order phase, normalised utterance)
+
+and the next caller asking the same thing in the same phase gets it without
+an LLM run. Replies are shared between callers, so only questions about the
+restaurant itself are cached: the utterance must match ``QUESTIONS`` (menu,
+prices, hours, branches, delivery) and say nothing about the caller's own
+order (``PERSONAL``), and the run may only have called ``SHARED_TOOLS``.
+Anything else always reaches the agent.
+
+The menu version is ``Restaurant.menu_version`` as stored, so every worker
+stops matching replies made from an old menu as soon as it is edited; a
+call still on an older snapshot than the stored one (``CallSession.menu``)
+neither reads nor fills the cache. Entries expire after
+``RESPONSE_CACHE_TTL`` seconds and the least recently used ones are dropped
+beyond ``RESPONSE_CACHE_SIZE``.
+
+The cache is per process.
+"""
+
+import os
+import re
+import threading
+from dataclasses import dataclass
+
+from asgiref.sync import sync_to_async
+from cachetools import TTLCache
+from dotenv import load_dotenv
+from pydantic_ai import ModelRequest, ModelResponse, ToolCallPart
+from pydantic_ai.messages import ModelMessage
+
+from .logger import get_logger
+from .menu import db_menu_version
+from .models import Order, OrderItem
+from .sessions import CallSession
+
+log = get_logger()
+
+load_dotenv()
+
+RESPONSE_CACHE = os.getenv("RESPONSE_CACHE", "false").lower() == "true"
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "600"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1000"))
+# Short answers ("yes", "the second one") only make sense in context.
+MIN_WORDS = 3
+
+CONTRACTIONS = {
+    "what's": "what is",
+    "where's": "where is",
+    "how's": "how is",
+    "it's": "it is",
+    "do u": "do you",
+    "whats": "what is",
+}
+# Questions whose answer is the same for every caller of a restaurant.
+QUESTIONS = re.compile(
+    r"\b(?:menu|price|prices|cost|how much is|how much are|what do you have|"
+    r"what do you serve|what do you sell|what do you offer|do you have|do you serve|"
+    r"do you sell|do you make|do you deliver|do you do|hours|open|close|closing|"
+    r"branch|branches|located|location|address of the restaurant|vegetarian|vegan|"
+    r"gluten|halal|spicy)\b"
+)
+# Anything about the caller's own order, details or earlier turns.
+PERSONAL = re.compile(
+    r"\b(?:i|i'm|i'd|i'll|i've|me|my|mine|we|our|us|order|ordered|total|bill|it|"
+    r"that|this|those|these|them|they|again|same)\b"
+)
+# Tools whose result is the same for every caller of the restaurant.
+SHARED_TOOLS = {"get_menu"}
+
+# Words that don't change what is being asked.
+FILLERS = re.compile(
+    r"\b(?:um+|uh+|er+|hmm+|so|well|okay|ok|hi|hello|hey|please|thanks|thank you|"
+    r"just|actually|like|could you|can you|tell me|i want to know|i wanted to know)\b"
+)
+
+
+def normalise(text: str) -> str:
+    text = text.lower().replace("’", "'")
+    text = re.sub(r"[^\w\s']", " ", text)
+    text = " ".join(text.split())
+    for short, long in CONTRACTIONS.items():
+        text = re.sub(rf"\b{re.escape(short)}\b", long, text)
+    return " ".join(FILLERS.sub(" ", text).split())
+
+
+async def order_phase(order: Order) -> str:
+    """Coarse order state; replies are only reused within the same phase."""
+    if order.status != "PENDING":
+        return order.status
+    if order.order_type:
+        return order.order_type
+    if await OrderItem.objects.filter(order=order).aexists():
+        return "items"
+    return "empty"
+
+
+@dataclass
+class CachedReply:
+    reply: str
+    # The run's new messages, replayed into the caller's history.
+    messages: list[ModelMessage]
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    stored: int = 0
+    skipped: int = 0
+
+    def __str__(self):
+        total = self.hits + self.misses
+        rate = self.hits / total if total else 0.0
+        return (
+            f"hit rate {self.hits}/{total} ({rate:.0%}), stored {self.stored}, "
+            f"not cacheable {self.skipped}"
+        )
+
+
+_cache: TTLCache = TTLCache(maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL)
+_lock = threading.Lock()
+stats = CacheStats()
+
+
+def cacheable(utterance: str) -> bool:
+    return bool(QUESTIONS.search(utterance)) and not PERSONAL.search(utterance)
+
+
+async def cache_key(session: CallSession, user_speech: str) -> tuple | None:
+    utterance = normalise(user_speech)
+    if len(utterance.split()) < MIN_WORDS or not cacheable(utterance):
+        return None
+    restaurant_id = session.restaurant.pk
+    snapshot = await sync_to_async(session.pinned_menu)()
+    if snapshot.db_version != await sync_to_async(db_menu_version)(restaurant_id):
+        # The call answers from an older menu than other callers now get.
+        return None
+    return (
+        restaurant_id,
+        snapshot.db_version,
+        await order_phase(session.order),
+        utterance,
+    )
+
+
+def lookup(key: tuple | None) -> CachedReply | None:
+    if key is None:
+        return None
+    with _lock:
+        cached = _cache.get(key)
+    if cached:
+        stats.hits += 1
+        log.info(f"[response cache] hit {key[-1]!r} | {stats}")
+    else:
+        stats.misses += 1
+    return cached
+
+
+def store(key: tuple | None, reply: str, new_messages: list[ModelMessage]):
+    """Stores the run unless it called a tool whose result is the caller's own."""
+    if key is None:
+        return
+    tools = {
+        part.tool_name
+        for message in new_messages
+        if isinstance(message, ModelResponse)
+        for part in message.parts
+        if isinstance(part, ToolCallPart)
+    }
+    if tools - SHARED_TOOLS:
+        stats.skipped += 1
+        return
+    # Keep the caller's own prompt out of it; it is re-added on a hit.
+    if new_messages and isinstance(new_messages[0], ModelRequest):
+        new_messages = new_messages[1:]
+    with _lock:
+        _cache[key] = CachedReply(reply=reply, messages=new_messages)
+    stats.stored += 1
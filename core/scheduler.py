@@ -0,0 +1,260 @@
+"""
+Durable scheduled jobs.
+
+``schedule()`` stores a ``ScheduledJob`` row, so pending work survives
+deploys and crashes. ``manage.py run_scheduler`` runs a ``Dispatcher``: one
+thread that loads the jobs due in the next ``SCHEDULER_HORIZON_SECONDS``
+into a heap, sleeps until the earliest is due and hands it to a fixed pool of
+``SCHEDULER_WORKERS`` threads. However many jobs are pending, a scheduler
+holds at most ``SCHEDULER_BATCH`` of them in memory and uses the same number
+of threads.
+
+Several schedulers can run side by side. A job is claimed with a conditional
+UPDATE that only one of them can win, and the claim is a lease: if its
+scheduler dies mid-job, another one re-runs it once ``locked_until`` passes.
+Failed jobs are retried with backoff up to ``SCHEDULER_MAX_ATTEMPTS`` times.
+
+Jobs carry a key. Scheduling a key that already has a pending job moves
+that job instead of adding a second one, and ``cancel()`` drops it, e.g.
+when the customer calls back before we call them (see core.jobs). Every load
+re-reads the ``run_at`` of the jobs already in the heap, and heap entries
+that no longer match it are dropped, so a moved job runs at its new time.
+
+A job can run more than once (a lease that ran out, a release that didn't
+reach the database), so handlers get the ``ScheduledJob`` and record what
+they have done in it before returning.
+"""
+
+import heapq
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable
+
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from dotenv import load_dotenv
+
+from .logger import get_logger
+from .models import JobStatus, ScheduledJob
+
+log = get_logger()
+
+load_dotenv()
+
+SCHEDULER_POLL_SECONDS = float(os.getenv("SCHEDULER_POLL_SECONDS", "5"))
+SCHEDULER_HORIZON_SECONDS = float(os.getenv("SCHEDULER_HORIZON_SECONDS", "60"))
+SCHEDULER_BATCH = int(os.getenv("SCHEDULER_BATCH", "500"))
+SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", "4"))
+SCHEDULER_LEASE_SECONDS = int(os.getenv("SCHEDULER_LEASE_SECONDS", "300"))
+SCHEDULER_MAX_ATTEMPTS = int(os.getenv("SCHEDULER_MAX_ATTEMPTS", "3"))
+# Doubled after every failed attempt.
+SCHEDULER_RETRY_SECONDS = int(os.getenv("SCHEDULER_RETRY_SECONDS", "60"))
+
+# kind -> handler, called with the claimed ScheduledJob
+JOBS: dict[str, Callable[[ScheduledJob], Any]] = {}
+
+
+def job(kind: str):
+    """Registers the decorated function as the handler of ``kind`` jobs."""
+
+    def decorator(func):
+        JOBS[kind] = func
+        return func
+
+    return decorator
+
+
+def schedule(
+    kind: str,
+    key: str,
+    delay_seconds: float,
+    payload: dict | None = None,
+    restaurant_id: int | None = None,
+) -> bool:
+    """
+    Runs the ``kind`` handler with ``payload`` in ``delay_seconds``. If ``key``
+    already has a pending job, that job is moved instead.
+
+    Returns False when a job with this key is running right now.
+    """
+    fields = {
+        "kind": kind,
+        "payload": payload or {},
+        "run_at": timezone.now() + timedelta(seconds=delay_seconds),
+        "restaurant_id": restaurant_id,
+    }
+    # A second pass covers another worker creating the job between our
+    # UPDATE and INSERT.
+    for _ in range(2):
+        pending = ScheduledJob.objects.filter(key=key, status=JobStatus.PENDING)
+        if pending.update(**fields, attempts=0, last_error="", updated_at=timezone.now()):
+            return True
+        try:
+            with transaction.atomic():
+                ScheduledJob.objects.create(key=key, **fields)
+            return True
+        except IntegrityError:
+            continue
+    log.info(f"[scheduler] {key} is running, not rescheduled")
+    return False
+
+
+def cancel(key: str) -> int:
+    """Cancels the key's pending job, if any. Returns how many were cancelled."""
+    return ScheduledJob.objects.filter(key=key, status=JobStatus.PENDING).update(
+        status=JobStatus.CANCELLED, updated_at=timezone.now()
+    )
+
+
+async def acancel(key: str) -> int:
+    return await ScheduledJob.objects.filter(key=key, status=JobStatus.PENDING).aupdate(
+        status=JobStatus.CANCELLED, updated_at=timezone.now()
+    )
+
+
+def _claimable(now: datetime) -> Q:
+    """Due pending jobs, and running jobs whose scheduler lost its lease."""
+    return Q(status=JobStatus.PENDING, run_at__lte=now) | Q(
+        status=JobStatus.RUNNING, locked_until__lt=now
+    )
+
+
+class Dispatcher:
+    def __init__(self, worker_id: str | None = None, workers: int = SCHEDULER_WORKERS):
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        # (run_at, job id) of loaded jobs, earliest first. Entries whose run_at
+        # isn't the job's in _queued any more are stale and skipped.
+        self._heap: list[tuple[datetime, int]] = []
+        # job id -> its run_at when last loaded
+        self._queued: dict[int, datetime] = {}
+        self._slots = threading.BoundedSemaphore(workers)
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="scheduled-job")
+        self._stopping = threading.Event()
+
+    def stop(self):
+        self._stopping.set()
+
+    # ------------------ Loading ------------------
+    def load(self) -> int:
+        """
+        Queues jobs due within the horizon that aren't queued yet, and requeues
+        queued ones that were moved. Returns how many heap entries it added.
+        """
+        now = timezone.now()
+        horizon = now + timedelta(seconds=SCHEDULER_HORIZON_SECONDS)
+        due = (
+            ScheduledJob.objects.filter(
+                Q(status=JobStatus.PENDING, run_at__lte=horizon)
+                | Q(status=JobStatus.RUNNING, locked_until__lt=now)
+            )
+            .order_by("run_at")
+            .values_list("pk", "run_at")[:SCHEDULER_BATCH]
+        )
+        loaded = 0
+        for job_id, run_at in due:
+            if self._queued.get(job_id) == run_at:
+                continue
+            if job_id not in self._queued and len(self._queued) >= SCHEDULER_BATCH:
+                continue
+            heapq.heappush(self._heap, (run_at, job_id))
+            self._queued[job_id] = run_at
+            loaded += 1
+        return loaded
+
+    # ------------------ Running ------------------
+    def claim(self, job_id: int) -> ScheduledJob | None:
+        """Takes the job if it is still due and no other scheduler holds it."""
+        now = timezone.now()
+        claimed = ScheduledJob.objects.filter(_claimable(now), pk=job_id).update(
+            status=JobStatus.RUNNING,
+            locked_by=self.worker_id,
+            locked_until=now + timedelta(seconds=SCHEDULER_LEASE_SECONDS),
+            attempts=F("attempts") + 1,
+            updated_at=now,
+        )
+        return ScheduledJob.objects.get(pk=job_id) if claimed else None
+
+    def run(self, job: ScheduledJob):
+        close_old_connections()
+        started = time.perf_counter()
+        try:
+            handler = JOBS.get(job.kind)
+            if handler is None:
+                raise LookupError(f"No handler for {job.kind!r} jobs")
+            handler(job)
+        except Exception as e:
+            log.exception(f"[scheduler] {job.kind} {job.key} attempt {job.attempts} failed: {e}")
+            retry = job.attempts < SCHEDULER_MAX_ATTEMPTS
+            delay = SCHEDULER_RETRY_SECONDS * 2 ** (job.attempts - 1)
+            self._release(
+                job,
+                status=JobStatus.PENDING if retry else JobStatus.FAILED,
+                run_at=timezone.now() + timedelta(seconds=delay) if retry else job.run_at,
+                last_error=str(e),
+            )
+        else:
+            log.info(
+                f"[scheduler] {job.kind} {job.key} done in "
+                f"{(time.perf_counter() - started) * 1000:.0f} ms"
+            )
+            self._release(job, status=JobStatus.DONE)
+        finally:
+            self._slots.release()
+            close_old_connections()
+
+    def _release(self, job: ScheduledJob, **fields):
+        # Only if our lease still holds: otherwise another scheduler owns it now.
+        ScheduledJob.objects.filter(
+            pk=job.pk, status=JobStatus.RUNNING, locked_by=self.worker_id
+        ).update(**fields, locked_by="", locked_until=None, updated_at=timezone.now())
+
+    def dispatch_due(self) -> int:
+        """Claims and starts every queued job that is due. Returns how many."""
+        started = 0
+        while self._heap and self._heap[0][0] <= timezone.now():
+            run_at, job_id = self._heap[0]
+            if self._queued.get(job_id) != run_at:
+                # Moved since it was queued; its new entry is in the heap.
+                heapq.heappop(self._heap)
+                continue
+            # Wait for a free worker, so claimed jobs don't sit out their
+            # lease in the pool's queue.
+            while not self._slots.acquire(timeout=1):
+                if self._stopping.is_set():
+                    return started
+            heapq.heappop(self._heap)
+            del self._queued[job_id]
+            job = self.claim(job_id)
+            if job is None:
+                # Cancelled, moved, or taken by another scheduler.
+                self._slots.release()
+                continue
+            self._pool.submit(self.run, job)
+            started += 1
+        return started
+
+    def run_forever(self, once: bool = False):
+        """Runs due jobs until ``stop()``, or until none are due if ``once``."""
+        log.info(f"[scheduler] {self.worker_id} started")
+        next_load = 0.0
+        try:
+            while not self._stopping.is_set():
+                if time.monotonic() >= next_load:
+                    self.load()
+                    next_load = time.monotonic() + SCHEDULER_POLL_SECONDS
+                started = self.dispatch_due()
+                if once and not started:
+                    break
+                wait = next_load - time.monotonic()
+                if self._heap:
+                    until_due = (self._heap[0][0] - timezone.now()).total_seconds()
+                    wait = min(wait, until_due)
+                self._stopping.wait(max(wait, 0.01))
+        finally:
+            self._pool.shutdown(wait=True)
+            log.info(f"[scheduler] {self.worker_id} stopped")
@@ -0,0 +1,110 @@
+"""
+In-process cache of per-call state.
+
+A ``CallSession`` is loaded once per turn and handed to every tool through
+``OrderDeps.session``, so the view and the tools share one ``Order`` object
+instead of each querying for it. The restaurant and the menu snapshot
+(``core.menu``) are kept for the whole call; the order is re-read once per turn because another
+worker may have served the previous webhook.
+
+Sessions are evicted when the call ends (``evict_session``) or after
+``SESSION_TTL_SECONDS`` without a turn.
+"""
+
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict
+
+from dotenv import load_dotenv
+
+from .jobs import acancel_callbacks
+from .logger import get_logger
+from .menu import MenuSnapshot, menu_snapshot
+from .models import Order, Restaurant
+from .tenants import resolver
+
+log = get_logger()
+
+load_dotenv()
+
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", str(30 * 60)))
+
+
+@dataclass
+class CallSession:
+    call_sid: str
+    restaurant: Restaurant
+    order: Order
+    # Pinned by the first lookup of the menu (see ``menu``).
+    snapshot: MenuSnapshot | None = None
+    last_used: float = field(default_factory=time.monotonic)
+
+    def pinned_menu(self) -> MenuSnapshot:
+        """
+        The menu snapshot the call first needed, kept for the rest of it.
+        Pinning it checks the stored menu version (one query); later lookups
+        are free.
+        """
+        if self.snapshot is None:
+            self.snapshot = menu_snapshot(self.restaurant)
+        return self.snapshot
+
+    @property
+    def menu(self) -> Dict[str, Dict[str, Any]]:
+        """The menu as it was when the call first needed it. Don't mutate it."""
+        return self.pinned_menu().menu
+
+
+_sessions: dict[str, CallSession] = {}
+_lock = threading.Lock()
+
+
+def _prune(now: float):
+    for call_sid, session in list(_sessions.items()):
+        if now - session.last_used > SESSION_TTL_SECONDS:
+            del _sessions[call_sid]
+
+
+async def aget_session(
+    call_sid: str, phone_number: str, customer_phone: str
+) -> CallSession:
+    """
+    Returns the call's session with its order freshly loaded for this turn.
+
+    One query (the order) on a cached session, two or three on the first turn
+    (the restaurant comes from core.tenants; a new call cancels the caller's
+    pending callback).
+    """
+    now = time.monotonic()
+    with _lock:
+        _prune(now)
+        session = _sessions.get(call_sid)
+
+    if session:
+        await session.order.arefresh_from_db()
+        session.last_used = now
+        return session
+
+    restaurant = await resolver.aresolve(phone_number)
+    if restaurant is None:
+        raise Restaurant.DoesNotExist(f"No restaurant is reached on {phone_number}")
+    order, created = await Order.objects.aget_or_create(
+        call_sid=call_sid,
+        restaurant=restaurant,
+        customer_phone=customer_phone,
+    )
+    if created:
+        await acancel_callbacks(restaurant.pk, customer_phone)
+    session = CallSession(call_sid=call_sid, restaurant=restaurant, order=order)
+    with _lock:
+        _sessions[call_sid] = session
+    return session
+
+
+def evict_session(call_sid: str):
+    """Drops the call's session, e.g. on hangup."""
+    with _lock:
+        if _sessions.pop(call_sid, None):
+            log.info(f"[session] evicted {call_sid}")
@@ -0,0 +1,98 @@
+"""
+In-memory view of ``AdminSetting``.
+
+All settings are loaded in one query and served from a dict; a restaurant's
+own row for a key overrides the global one. Saving or deleting a setting
+clears the cache (see ``core.signals``) and the next read reloads it. Other
+workers pick changes up after ``SETTINGS_REFRESH_SECONDS``.
+
+Views that render the same TwiML for every call memoise it with
+``rendered``, which is cleared together with the settings.
+"""
+
+import os
+import threading
+import time
+from typing import Callable
+
+from asgiref.sync import sync_to_async
+from dotenv import load_dotenv
+
+from .logger import get_logger
+from .models import AdminSetting
+
+log = get_logger()
+
+load_dotenv()
+
+SETTINGS_REFRESH_SECONDS = int(os.getenv("SETTINGS_REFRESH_SECONDS", "300"))
+
+
+class SettingsStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        # (restaurant id or None, key) -> value
+        self._values: dict[tuple[int | None, str], str] = {}
+        self._rendered: dict[tuple, bytes] = {}
+        # Changes on every (re)load, for caches built from settings.
+        self.version = 0
+
+    @property
+    def stale(self) -> bool:
+        return (
+            self._loaded_at is None
+            or time.monotonic() - self._loaded_at > SETTINGS_REFRESH_SECONDS
+        )
+
+    def load(self):
+        values = {
+            (restaurant_id, key): value
+            for restaurant_id, key, value in AdminSetting.objects.values_list(
+                "restaurant_id", "key", "value"
+            )
+        }
+        with self._lock:
+            self._values = values
+            self._rendered = {}
+            self._loaded_at = time.monotonic()
+            self.version += 1
+        log.info(f"[settings] loaded {len(values)} settings")
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+            self._rendered = {}
+
+    def get(self, key: str, restaurant_id: int | None = None, default: str | None = None):
+        if self.stale:
+            self.load()
+        return self._lookup(key, restaurant_id, default)
+
+    async def aget(
+        self, key: str, restaurant_id: int | None = None, default: str | None = None
+    ):
+        if self.stale:
+            await sync_to_async(self.load)()
+        return self._lookup(key, restaurant_id, default)
+
+    def _lookup(self, key, restaurant_id, default):
+        values = self._values
+        if (restaurant_id, key) in values:
+            return values[(restaurant_id, key)]
+        return values.get((None, key), default)
+
+    def rendered(self, cache_key: tuple, render: Callable[[], str]) -> bytes:
+        """
+        Returns ``render()`` encoded, building it only on the first call for
+        ``cache_key`` since the settings were last loaded.
+        """
+        body = self._rendered.get(cache_key)
+        if body is None:
+            body = render().encode()
+            with self._lock:
+                self._rendered[cache_key] = body
+        return body
+
+
+settings_store = SettingsStore()
@@ -0,0 +1,47 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .menu import bump_menu_version
+from .models import AdminSetting, Branch, Category, MenuItem, PhoneNumber, Restaurant
+from .settings_store import settings_store
+from .tenants import resolver
+
+
+@receiver(post_save, sender=Restaurant)
+def restaurant_saved(sender, instance, **kwargs):
+    resolver.restaurant_saved(instance)
+
+
+@receiver(post_delete, sender=Restaurant)
+def restaurant_deleted(sender, instance, **kwargs):
+    resolver.restaurant_deleted(instance)
+
+
+@receiver(post_save, sender=PhoneNumber)
+def phone_number_saved(sender, instance, **kwargs):
+    resolver.number_saved(instance)
+
+
+@receiver(post_delete, sender=PhoneNumber)
+def phone_number_deleted(sender, instance, **kwargs):
+    resolver.number_deleted(instance)
+
+
+@receiver(post_save, sender=AdminSetting)
+@receiver(post_delete, sender=AdminSetting)
+def admin_setting_changed(sender, instance, **kwargs):
+    settings_store.invalidate()
+
+
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+@receiver(post_save, sender=Branch)
+@receiver(post_delete, sender=Branch)
+def menu_changed(sender, instance, **kwargs):
+    bump_menu_version(instance.restaurant_id)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    bump_menu_version(None)
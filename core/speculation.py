@@ -0,0 +1,188 @@
+"""
+Speculative agent runs on Twilio partial speech results.
+
+With ``SPECULATIVE_TURNS=true`` the ``<Gather>`` verbs ask Twilio for a
+``partialResultCallback``. Every time the stable part of the transcript
+changes, ``speculate`` starts an agent run on it in the background (and
+cancels the previous one). When the final ``SpeechResult`` arrives,
+``resolve`` reuses the speculative run if the caller said nothing more, so
+most of the LLM latency was spent while the caller was still talking.
+
+Speculative runs are read-only: any tool that changes the order aborts them
+(``tools.mutates_order``) and the turn is run normally.
+
+A used run is accounted for by its turn. What a run spent before it was
+cancelled, aborted or outdated is added to the order and restaurant as
+``speculative_cost`` (``turns.save_spend``).
+
+The background tasks live on the server's event loop, so this needs ASGI.
+"""
+
+import asyncio
+import os
+import re
+import time
+from dataclasses import dataclass, field
+
+from dotenv import load_dotenv
+
+from .logger import get_logger
+from .metrics import Spend
+from .models import Order
+from .tools import SpeculativeRunAborted
+from .turns import agent_turn, run_turn, save_spend, save_turn
+
+log = get_logger()
+
+load_dotenv()
+
+SPECULATIVE_TURNS = os.getenv("SPECULATIVE_TURNS", "false").lower() == "true"
+# Don't bother speculating on one or two words.
+MIN_WORDS = 3
+# Forget speculations for calls that never posted a final result.
+MAX_AGE_SECONDS = 120
+
+
+@dataclass
+class Speculation:
+    call_sid: str
+    transcript: str
+    task: asyncio.Task
+    # What the run has spent so far.
+    spend: Spend
+    started_at: float = field(default_factory=time.perf_counter)
+    finished_at: float | None = None
+
+
+@dataclass
+class SpeculationStats:
+    turns: int = 0
+    hits: int = 0
+    aborted: int = 0
+    cancelled: int = 0
+    saved_seconds: float = 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.turns if self.turns else 0.0
+
+    def __str__(self):
+        return (
+            f"hit rate {self.hits}/{self.turns} ({self.hit_rate:.0%}), "
+            f"aborted {self.aborted}, cancelled {self.cancelled}, "
+            f"saved {self.saved_seconds:.2f}s total"
+        )
+
+
+_speculations: dict[str, Speculation] = {}
+# Accounting for dropped runs, kept referenced until it is saved.
+_saving: set[asyncio.Task] = set()
+stats = SpeculationStats()
+
+
+def normalise(text: str) -> str:
+    return " ".join(re.sub(r"[^\w\s']", " ", text.lower()).split())
+
+
+def drop(speculation: Speculation):
+    """Cancels the run and, once it has stopped, saves what it spent."""
+
+    def save(task):
+        saving = asyncio.ensure_future(
+            save_spend(speculation.call_sid, speculation.spend, "speculative_cost")
+        )
+        _saving.add(saving)
+        saving.add_done_callback(_saving.discard)
+
+    speculation.task.cancel()
+    speculation.task.add_done_callback(save)
+
+
+def speculate(call_sid: str, phone_number: str, customer_phone: str, transcript: str):
+    """Starts (or restarts) a speculative run for the call's partial transcript."""
+    key = normalise(transcript)
+    if len(key.split()) < MIN_WORDS:
+        return
+
+    current = _speculations.get(call_sid)
+    if current and current.transcript == key:
+        return
+    if current:
+        drop(current)
+        stats.cancelled += 1
+
+    now = time.perf_counter()
+    for sid, old in list(_speculations.items()):
+        if now - old.started_at > MAX_AGE_SECONDS:
+            drop(old)
+            del _speculations[sid]
+
+    spend = Spend()
+    task = asyncio.create_task(
+        agent_turn(
+            call_sid=call_sid,
+            phone_number=phone_number,
+            customer_phone=customer_phone,
+            user_speech=transcript,
+            speculative=True,
+            spend=spend,
+        )
+    )
+    speculation = Speculation(call_sid=call_sid, transcript=key, task=task, spend=spend)
+
+    def finished(task):
+        speculation.finished_at = time.perf_counter()
+        # Retrieve the exception so dropped speculations don't warn "never retrieved".
+        if not task.cancelled():
+            task.exception()
+
+    task.add_done_callback(finished)
+    _speculations[call_sid] = speculation
+    log.info(f"[speculation] {call_sid} started on '{key}'")
+
+
+async def resolve(
+    call_sid: str, phone_number: str, customer_phone: str, user_speech: str
+) -> tuple[Order, str]:
+    """
+    Runs the final turn, reusing the call's speculative run when it matches.
+
+    Returns:
+        tuple[Order, str]: Same as ``turns.run_turn``.
+    """
+    arrived_at = time.perf_counter()
+    speculation = _speculations.pop(call_sid, None)
+    stats.turns += 1
+
+    if speculation and speculation.transcript == normalise(user_speech):
+        try:
+            turn = await speculation.task
+        except SpeculativeRunAborted as e:
+            stats.aborted += 1
+            drop(speculation)
+            log.info(f"[speculation] {call_sid} aborted by {e} | {stats}")
+        except Exception as e:
+            drop(speculation)
+            log.exception(f"[speculation] {call_sid} failed {e}")
+        else:
+            waited = time.perf_counter() - arrived_at
+            saved = (speculation.finished_at - speculation.started_at) - waited
+            stats.hits += 1
+            stats.saved_seconds += saved
+            log.info(f"[speculation] {call_sid} hit, saved {saved:.2f}s | {stats}")
+            # Keep the final transcript (punctuation and all) in the conversation.
+            turn.entries[0].text = user_speech
+            order = await save_turn(turn)
+            return order, turn.ai_reply
+    else:
+        if speculation:
+            drop(speculation)
+            stats.cancelled += 1
+        log.info(f"[speculation] {call_sid} miss | {stats}")
+
+    return await run_turn(
+        call_sid=call_sid,
+        phone_number=phone_number,
+        customer_phone=customer_phone,
+        user_speech=user_speech,
+    )
@@ -0,0 +1,170 @@
+"""
+Maps dialled numbers to restaurants without touching the database.
+
+A restaurant is reached on its ``Restaurant.phone_number`` and on any number
+of extra ``PhoneNumber`` rows. All of them are held in memory and kept up to
+date by model signals (see ``core.signals``), so resolving the restaurant for
+a webhook is a dict lookup.
+
+Signals only fire in the process that saved the model, so other workers
+also reload everything every ``TENANT_REFRESH_SECONDS``. Until then, a
+number they don't know is looked up in the database with one query and the
+answer kept; a number no restaurant has is remembered as such for
+``TENANT_MISS_SECONDS``.
+"""
+
+import os
+import re
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.db.models import Q
+from dotenv import load_dotenv
+
+from .logger import get_logger
+from .models import PhoneNumber, Restaurant
+
+log = get_logger()
+
+load_dotenv()
+
+TENANT_REFRESH_SECONDS = int(os.getenv("TENANT_REFRESH_SECONDS", "300"))
+TENANT_MISS_SECONDS = int(os.getenv("TENANT_MISS_SECONDS", "10"))
+
+
+def normalise_number(number: str) -> str:
+    """'+1 (555) 000-0000' -> '+15550000000'"""
+    return re.sub(r"[^\d+]", "", number or "")
+
+
+class TenantResolver:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self._restaurants: dict[int, Restaurant] = {}
+        # number -> restaurant id, for Restaurant.phone_number and PhoneNumber rows.
+        self._primary: dict[str, int] = {}
+        self._extra: dict[str, int] = {}
+        # Reverse maps, to drop a number when it is changed.
+        self._primary_by_restaurant: dict[int, str] = {}
+        self._extra_by_pk: dict[int, str] = {}
+        # Numbers looked up in the database since the last load: found ones
+        # (number -> restaurant id) and missing ones (number -> expiry).
+        self._fetched: dict[str, int] = {}
+        self._missing: dict[str, float] = {}
+
+    @property
+    def stale(self) -> bool:
+        return (
+            self._loaded_at is None
+            or time.monotonic() - self._loaded_at > TENANT_REFRESH_SECONDS
+        )
+
+    def load(self):
+        """Reloads every restaurant and number (two queries)."""
+        restaurants = {r.pk: r for r in Restaurant.objects.all()}
+        numbers = PhoneNumber.objects.values_list("pk", "number", "restaurant_id")
+        with self._lock:
+            self._restaurants = restaurants
+            self._primary = {}
+            self._primary_by_restaurant = {}
+            for restaurant in restaurants.values():
+                self._set_primary(restaurant)
+            self._extra = {}
+            self._extra_by_pk = {}
+            for pk, number, restaurant_id in numbers:
+                self._set_extra(pk, number, restaurant_id)
+            self._fetched = {}
+            self._missing = {}
+            self._loaded_at = time.monotonic()
+        log.info(
+            f"[tenants] loaded {len(self._restaurants)} restaurants, "
+            f"{len(self._primary) + len(self._extra)} numbers"
+        )
+
+    def resolve(self, number: str) -> Restaurant | None:
+        if self.stale:
+            self.load()
+        known, restaurant = self._lookup(number)
+        return restaurant if known else self._fetch(number)
+
+    async def aresolve(self, number: str) -> Restaurant | None:
+        if self.stale:
+            await sync_to_async(self.load)()
+        known, restaurant = self._lookup(number)
+        return restaurant if known else await sync_to_async(self._fetch)(number)
+
+    def _lookup(self, number: str) -> tuple[bool, Restaurant | None]:
+        """(known, restaurant); not known means only the database can tell."""
+        number = normalise_number(number)
+        restaurant_id = self._extra.get(
+            number, self._primary.get(number, self._fetched.get(number))
+        )
+        if restaurant_id in self._restaurants:
+            return True, self._restaurants[restaurant_id]
+        return self._missing.get(number, 0) > time.monotonic(), None
+
+    def _fetch(self, number: str) -> Restaurant | None:
+        """
+        One query for a number missing from memory, e.g. added through
+        another worker since the last load.
+        """
+        numbers = {number, normalise_number(number)}
+        restaurant = Restaurant.objects.filter(
+            Q(phone_number__in=numbers) | Q(phone_numbers__number__in=numbers)
+        ).first()
+        number = normalise_number(number)
+        with self._lock:
+            if restaurant:
+                self._restaurants.setdefault(restaurant.pk, restaurant)
+                self._fetched[number] = restaurant.pk
+            else:
+                self._missing[number] = time.monotonic() + TENANT_MISS_SECONDS
+        log.info(f"[tenants] {number} not loaded; database has {restaurant or 'no restaurant'}")
+        return restaurant
+
+    # ------------------ Signal handlers ------------------
+    def restaurant_saved(self, restaurant: Restaurant):
+        with self._lock:
+            self._restaurants[restaurant.pk] = restaurant
+            self._set_primary(restaurant)
+            self._missing = {}
+
+    def restaurant_deleted(self, restaurant: Restaurant):
+        with self._lock:
+            self._restaurants.pop(restaurant.pk, None)
+            old = self._primary_by_restaurant.pop(restaurant.pk, None)
+            if old:
+                self._primary.pop(old, None)
+
+    def number_saved(self, phone_number: PhoneNumber):
+        with self._lock:
+            self._set_extra(phone_number.pk, phone_number.number, phone_number.restaurant_id)
+            self._missing = {}
+
+    def number_deleted(self, phone_number: PhoneNumber):
+        with self._lock:
+            old = self._extra_by_pk.pop(phone_number.pk, None)
+            if old:
+                self._extra.pop(old, None)
+                self._fetched.pop(old, None)
+
+    def _set_primary(self, restaurant: Restaurant):
+        old = self._primary_by_restaurant.get(restaurant.pk)
+        if old:
+            self._primary.pop(old, None)
+        number = normalise_number(restaurant.phone_number)
+        self._primary[number] = restaurant.pk
+        self._primary_by_restaurant[restaurant.pk] = number
+
+    def _set_extra(self, pk: int, number: str, restaurant_id: int):
+        old = self._extra_by_pk.get(pk)
+        if old:
+            self._extra.pop(old, None)
+        number = normalise_number(number)
+        self._extra[number] = restaurant_id
+        self._extra_by_pk[pk] = number
+
+
+resolver = TenantResolver()
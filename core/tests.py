@@ -1,3 +1,787 @@
+import asyncio
+import io
+import json
+import logging
+import queue
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.db.models import F
 from django.test import TestCase
+from django.utils import timezone
+from pydantic_ai import (
+    ModelRequest,
+    ModelResponse,
+    SystemPromptPart,
+    TextPart,
+    ToolCallPart,
+    ToolReturnPart,
+    UserPromptPart,
+)
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+from twilio.base.exceptions import TwilioRestException
+
+from . import dialer as dialer_module
+from . import history, jobs, logger, menu, response_cache, scheduler, sessions, tenants, views
+from .dialer import Dial, Dialer, TokenBucket
+from .intents import _try_fast_path
+from .management.commands.relay_client import CALLER_NUMBER, REPLY, InProcessSocket
+from .matching import HybridMatcher, TrigramMatcher, phonetic_key
+from .models import (
+    AdminSetting,
+    Branch,
+    Category,
+    ConversationTurn,
+    DialStatus,
+    JobStatus,
+    MenuItem,
+    Order,
+    OrderItem,
+    PhoneNumber,
+    Restaurant,
+    ScheduledJob,
+)
+from .relay import SentenceBuffer
+from .sessions import CallSession
+from .settings_store import settings_store
+from .tools import OrderDeps, apply_order_items, set_or_modify_items, set_pick_up_branch
+from .turns import _store_turn, agent, agent_turn, dump_messages
+from .twilio_rest import TwilioRest
+from .utils.fake_llm import fake_model
+from .utils.fake_twilio import FakeTwilio
+
+
+class MenuTestCase(TestCase):
+    """A restaurant with a small menu and an empty order."""
+
+    def setUp(self):
+        menu._snapshots.clear()
+        self.restaurant = Restaurant.objects.create(name="Test", phone_number="+15550000000")
+        mains = Category.objects.create(name="Mains")
+        drinks = Category.objects.create(name="Drinks")
+        self.burger = MenuItem.objects.create(
+            restaurant=self.restaurant, category=mains, name="Cheese Burger", price=8.5
+        )
+        self.pizza = MenuItem.objects.create(
+            restaurant=self.restaurant, category=mains, name="Pizza", price=11
+        )
+        self.coke = MenuItem.objects.create(
+            restaurant=self.restaurant, category=drinks, name="Coke", price=2
+        )
+        self.order = self.new_order("CA1")
+
+    def new_order(self, call_sid: str) -> Order:
+        return Order.objects.create(
+            restaurant=self.restaurant, call_sid=call_sid, customer_phone="+15551111111"
+        )
+
+    def deps(self, order: Order | None = None) -> OrderDeps:
+        order = order or self.order
+        session = CallSession(call_sid=order.call_sid, restaurant=self.restaurant, order=order)
+        return OrderDeps(session_id=order.call_sid, phone_number="+15550000000", session=session)
+
+    def lines(self, order: Order | None = None) -> dict[str, int]:
+        return dict(
+            OrderItem.objects.filter(order=order or self.order).values_list(
+                "menu_item__name", "quantity"
+            )
+        )
+
+
+class OrderItemsTests(MenuTestCase):
+    def test_replaces_the_whole_list(self):
+        apply_order_items(self.order, {self.burger.pk: (2, None), self.coke.pk: (1, None)})
+        apply_order_items(self.order, {self.burger.pk: (3, None), self.pizza.pk: (1, None)})
+        self.assertEqual(self.lines(), {"Cheese Burger": 3, "Pizza": 1})
+
+    def test_failure_rolls_back_every_change(self):
+        apply_order_items(self.order, {self.burger.pk: (2, None), self.coke.pk: (1, None)})
+        with mock.patch.object(OrderItem.objects, "bulk_create", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                # Deletes the coke and updates the burger before failing.
+                apply_order_items(
+                    self.order, {self.burger.pk: (5, None), self.pizza.pk: (1, None)}
+                )
+        self.assertEqual(self.lines(), {"Cheese Burger": 2, "Coke": 1})
+
+    def test_unknown_item_changes_nothing(self):
+        ctx = SimpleNamespace(deps=self.deps())
+        set_or_modify_items(
+            ctx, items=[{"name": "Cheese Burger", "quantity": 1}], modifications=[]
+        )
+        result = set_or_modify_items(
+            ctx,
+            items=[{"name": "Pizza", "quantity": 1}, {"name": "Space Noodles", "quantity": 2}],
+            modifications=[],
+        )
+        self.assertEqual(result["status"], "error")
+        self.assertEqual(self.lines(), {"Cheese Burger": 1})
+
+
+class SchedulerTests(TestCase):
+    def job(self) -> ScheduledJob:
+        return ScheduledJob.objects.get(key="k")
+
+    def test_schedule_moves_the_pending_job(self):
+        scheduler.schedule("call_back", "k", 600, {"to_number": "+1"})
+        scheduler.schedule("call_back", "k", 60, {"to_number": "+2"})
+        job = self.job()
+        self.assertEqual(ScheduledJob.objects.count(), 1)
+        self.assertEqual(job.payload, {"to_number": "+2"})
+        self.assertLess(job.run_at, timezone.now() + timedelta(seconds=120))
+
+    def test_schedule_leaves_a_running_job(self):
+        scheduler.schedule("call_back", "k", 0)
+        ScheduledJob.objects.update(status=JobStatus.RUNNING)
+        self.assertFalse(scheduler.schedule("call_back", "k", 60))
+
+    def test_moved_job_runs_at_its_new_time(self):
+        scheduler.schedule("call_back", "k", 30)
+        dispatcher = scheduler.Dispatcher(workers=1)
+        dispatcher._pool = mock.Mock()
+        dispatcher.load()
+        scheduler.schedule("call_back", "k", 0)
+        dispatcher.load()
+        self.assertEqual(dispatcher.dispatch_due(), 1)
+        job = dispatcher._pool.submit.call_args.args[1]
+        self.assertEqual(job.status, JobStatus.RUNNING)
+        # The old entry is skipped when it comes due.
+        dispatcher._heap = [(timezone.now(), job.pk)]
+        self.assertEqual(dispatcher.dispatch_due(), 0)
+
+    def test_claim_takes_over_an_expired_lease(self):
+        scheduler.schedule("call_back", "k", 0)
+        first, second = scheduler.Dispatcher(workers=1), scheduler.Dispatcher(workers=1)
+        second.worker_id = "other"
+        self.assertIsNotNone(first.claim(self.job().pk))
+        self.assertIsNone(second.claim(self.job().pk))
+        ScheduledJob.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        job = second.claim(self.job().pk)
+        self.assertEqual((job.locked_by, job.attempts), ("other", 2))
+
+    def test_callback_is_not_dialled_twice(self):
+        scheduler.schedule("call_back", "k", 0, {"to_number": "+1", "restaurant_id": None})
+        dispatcher = scheduler.Dispatcher(workers=1)
+        with (
+            mock.patch.object(jobs.dialer, "dial", return_value="CA123") as dial,
+            mock.patch.object(scheduler, "close_old_connections"),
+        ):
+            dispatcher._slots.acquire()
+            dispatcher.run(dispatcher.claim(self.job().pk))
+            # As if the lease ran out before the release.
+            ScheduledJob.objects.update(
+                status=JobStatus.RUNNING, locked_until=timezone.now() - timedelta(seconds=1)
+            )
+            dispatcher._slots.acquire()
+            dispatcher.run(dispatcher.claim(self.job().pk))
+        self.assertEqual(dial.call_count, 1)
+        self.assertEqual(self.job().payload["call_sid"], "CA123")
+        self.assertEqual(self.job().status, JobStatus.DONE)
+
+
+class StubRest:
+    """Stands in for TwilioRest: fails the first ``failures`` calls with a 429."""
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.calls = []
+
+    def create_call(self, **kwargs) -> str:
+        self.calls.append(kwargs)
+        if len(self.calls) <= self.failures:
+            raise TwilioRestException(429, "/Calls.json", "Too Many Requests")
+        return f"CA{len(self.calls)}"
+
+
+class DialerTests(TestCase):
+    def test_token_bucket(self):
+        bucket = TokenBucket(rate=2, burst=1)
+        now = bucket.updated
+        self.assertEqual(bucket.ready_in(now), 0)
+        bucket.take(now)
+        self.assertAlmostEqual(bucket.ready_in(now), 0.5)
+        self.assertAlmostEqual(bucket.ready_in(now + 0.25), 0.25)
+        self.assertEqual(bucket.ready_in(now + 10), 0)
+
+    def test_reserve_spaces_calls_out(self):
+        dialer = Dialer(rest=StubRest(), number_cps=1, restaurant_cps=2)
+        dials = [Dial("+1444", 1, ["+1555", "+1666"], "http://test/") for _ in range(3)]
+        now = 100.0
+        dialer._bucket("+1555", 1).updated = dialer._bucket("+1666", 1).updated = now
+        dialer._bucket(1, 2).updated = now
+
+        self.assertEqual(dialer._reserve(dials[0], now), 0)
+        # The restaurant's bucket is empty for half a second.
+        self.assertAlmostEqual(dialer._reserve(dials[1], now), 0.5)
+        self.assertEqual(dialer._reserve(dials[1], now + 0.5), 0)
+        # The first number is busy until now + 1.
+        self.assertAlmostEqual(dialer._reserve(dials[2], now + 0.5), 0.5)
+        self.assertEqual(dialer._reserve(dials[2], now + 1), 0)
+        self.assertEqual(
+            [dial.from_number for dial in dials], ["+1555", "+1666", "+1555"]
+        )
+
+    def test_retries_refused_calls(self):
+        rest = StubRest(failures=2)
+        dialer = Dialer(rest=rest, workers=1)
+        with (
+            mock.patch.object(dialer_module, "DIAL_RETRY_SECONDS", 0.01),
+            mock.patch.object(Dialer, "_record") as record,
+        ):
+            self.assertEqual(dialer.submit("+1444").result(timeout=5), "CA3")
+        self.assertEqual(len(rest.calls), 3)
+        dial, status = record.call_args.args
+        self.assertEqual((status, dial.attempts), (DialStatus.PLACED, 3))
+
+
+def agent_says(text: str):
+    """A model that answers ``text`` and counts its requests in ``.calls``."""
+
+    def respond(messages, info: AgentInfo) -> ModelResponse:
+        respond.calls += 1
+        return ModelResponse(parts=[TextPart(text)])
+
+    respond.calls = 0
+    return respond
+
+
+class FastPathTests(MenuTestCase):
+    def setUp(self):
+        super().setUp()
+        self.model = agent_says("Sorry, could you say that again?")
+        self.enterContext(agent.override(model=FunctionModel(self.model)))
+        self.enterContext(mock.patch("core.turns.FAST_INTENTS", True))
+        self.addCleanup(sessions.evict_session, "CA1")
+
+    def after_agent_said(self, text: str):
+        self.order.message_history = dump_messages(
+            [
+                ModelRequest(parts=[UserPromptPart("I'd like burgers")]),
+                ModelResponse(parts=[TextPart(text)]),
+            ]
+        )
+        self.order.save()
+
+    async def turn(self, user_speech: str):
+        return await agent_turn("CA1", "+15550000000", "+15551111111", user_speech)
+
+    async def test_adds_items_without_the_llm(self):
+        turn = await self.turn("two cheese burgers and a coke please")
+        self.assertEqual(self.model.calls, 0)
+        self.assertIn("2 Cheese Burger and 1 Coke", turn.ai_reply)
+        self.assertEqual(await sync_to_async(self.lines)(), {"Cheese Burger": 2, "Coke": 1})
+
+    async def test_bare_quantity_after_how_many(self):
+        await sync_to_async(self.after_agent_said)("How many cheese burgers would you like?")
+        await self.turn("two")
+        self.assertEqual(self.model.calls, 0)
+        self.assertEqual(await sync_to_async(self.lines)(), {"Cheese Burger": 2})
+
+    async def test_bare_quantity_otherwise_goes_to_the_llm(self):
+        await sync_to_async(self.after_agent_said)("Would you like cheese burgers with that?")
+        await self.turn("two")
+        self.assertEqual(self.model.calls, 1)
+        self.assertEqual(await sync_to_async(self.lines)(), {})
+
+    def test_failed_tool_leaves_no_entries(self):
+        def set_or_modify_items(ctx, **args):
+            ctx.deps.entries.append("error entry")
+            return {"status": "error", "message": "Not found in menu."}
+
+        deps = self.deps()
+        with mock.patch("core.intents.set_or_modify_items", set_or_modify_items):
+            self.assertIsNone(_try_fast_path(deps, [], "two pizzas"))
+        self.assertEqual(deps.entries, [])
+
+
+class ResponseCacheTests(MenuTestCase):
+    def setUp(self):
+        super().setUp()
+        response_cache._cache.clear()
+        self.model = agent_says("We have burgers, pizza and coke.")
+        self.enterContext(agent.override(model=FunctionModel(self.model)))
+        self.enterContext(mock.patch("core.turns.RESPONSE_CACHE", True))
+        for call_sid in ("CA1", "CA2", "CA3"):
+            self.addCleanup(sessions.evict_session, call_sid)
+
+    async def turn(self, call_sid: str, user_speech: str):
+        return await agent_turn(call_sid, "+15550000000", "+15551111111", user_speech)
+
+    def test_caches_only_questions_about_the_restaurant(self):
+        for utterance in ("what is on the menu", "when do you close", "do you deliver"):
+            self.assertTrue(response_cache.cacheable(utterance), utterance)
+        personal = ("no that is all", "how much is my order", "what did i order", "hi there")
+        for utterance in personal:
+            self.assertFalse(response_cache.cacheable(utterance), utterance)
+
+    async def test_second_caller_gets_the_cached_reply(self):
+        first = await self.turn("CA1", "What's on the menu?")
+        second = await self.turn("CA2", "um, what is on the menu please")
+        self.assertEqual(self.model.calls, 1)
+        self.assertEqual(second.ai_reply, first.ai_reply)
+        # The reply is replayed after the second caller's own words.
+        self.assertEqual(second.messages[-2].parts[-1].content, "um, what is on the menu please")
+
+    async def test_order_questions_reach_the_agent(self):
+        await self.turn("CA1", "how much is my order")
+        await self.turn("CA2", "how much is my order")
+        self.assertEqual(self.model.calls, 2)
+
+    async def test_menu_edit_invalidates_replies(self):
+        await self.turn("CA1", "what is on the menu")
+        session = sessions._sessions["CA1"]
+        key = await response_cache.cache_key(session, "what is on the menu")
+        self.assertIsNotNone(key)
+
+        await sync_to_async(MenuItem.objects.create)(
+            restaurant=self.restaurant, name="Fries", price=3
+        )
+        # CA1 still answers from the old menu: no reads or writes.
+        self.assertIsNone(await response_cache.cache_key(session, "what is on the menu"))
+        await self.turn("CA3", "what is on the menu")
+        self.assertEqual(self.model.calls, 2)
+
+
+class TwilioRestTests(TestCase):
+    def test_slow_requests_time_out(self):
+        with FakeTwilio(latency="2") as fake:
+            rest = TwilioRest("ACtest", "token", api_url=fake.url, timeout=0.3)
+            self.addCleanup(rest.close)
+            started = time.monotonic()
+            with self.assertRaises(asyncio.TimeoutError):
+                rest.create_call(url="http://test/voice/", to="+1444", from_="+1555")
+        self.assertLess(time.monotonic() - started, 1.5)
+
+
+class MenuSnapshotTests(MenuTestCase):
+    def test_build_menu_is_one_query(self):
+        with self.assertNumQueries(1):
+            menu_dict, items = menu.build_menu(self.restaurant)
+        self.assertEqual(menu_dict["Drinks"], {"Coke": 2})
+        self.assertEqual(len(items), 3)
+
+    def test_call_keeps_its_snapshot(self):
+        session = self.deps().session
+        # Stored version, items, branches.
+        with self.assertNumQueries(3):
+            snapshot = session.pinned_menu()
+        self.burger.delete()
+        with self.assertNumQueries(0):
+            self.assertIs(session.pinned_menu(), snapshot)
+            self.assertIn("Cheese Burger", session.menu["Mains"])
+        # The next call gets the edited menu.
+        self.assertNotIn("Cheese Burger", self.deps().session.menu["Mains"])
+
+    def test_edit_on_another_worker_reaches_new_calls(self):
+        self.deps().session.pinned_menu()
+        # Another worker's edit: only the stored version changes here.
+        MenuItem.objects.filter(pk=self.burger.pk).update(name="Veggie Burger")
+        Restaurant.objects.update(menu_version=F("menu_version") + 1)
+        self.assertIn("Veggie Burger", self.deps().session.menu["Mains"])
+
+    def test_item_deleted_since_the_snapshot(self):
+        ctx = SimpleNamespace(deps=self.deps())
+        ctx.deps.session.pinned_menu()
+        self.pizza.delete()
+        # Postgres checks the foreign key when the batch commits.
+        with mock.patch("core.tools.apply_order_items", side_effect=IntegrityError):
+            result = set_or_modify_items(
+                ctx,
+                items=[{"name": "Coke", "quantity": 1}, {"name": "Pizza", "quantity": 1}],
+                modifications=[],
+            )
+        self.assertEqual(result["status"], "error")
+        self.assertIn("Pizza", result["message"])
+        self.assertNotIn("Coke", result["message"])
+
+
+class SettingsStoreTests(TestCase):
+    def setUp(self):
+        settings_store.invalidate()
+        self.addCleanup(settings_store.invalidate)
+        self.restaurant = Restaurant.objects.create(name="Test", phone_number="+15550000000")
+        self.other = Restaurant.objects.create(name="Other", phone_number="+15550000001")
+        AdminSetting.objects.create(key="GREETING", value="Hi!")
+        AdminSetting.objects.create(restaurant=self.restaurant, key="GREETING", value="Welcome!")
+
+    def test_restaurant_overrides_global(self):
+        self.assertEqual(settings_store.get("GREETING", self.restaurant.pk), "Welcome!")
+        self.assertEqual(settings_store.get("GREETING", self.other.pk), "Hi!")
+        self.assertEqual(settings_store.get("FILLER", self.other.pk, default="Hold on"), "Hold on")
+
+    def test_served_from_memory_until_a_setting_changes(self):
+        settings_store.get("GREETING")
+        with self.assertNumQueries(0):
+            settings_store.get("GREETING", self.other.pk)
+        AdminSetting.objects.create(restaurant=self.other, key="GREETING", value="Hello!")
+        self.assertEqual(settings_store.get("GREETING", self.other.pk), "Hello!")
+
+    def test_greeting_twiml_ignores_the_host_header(self):
+        with (
+            mock.patch.object(views, "VOICE_MODE", "relay"),
+            mock.patch.object(views, "SITE_URL", "https://orders.example.com"),
+        ):
+            for host in ("a.example", "b.example"):
+                response = self.client.post(
+                    "/voice/",
+                    {"To": "+15550000000", "From": "+15550000000"},
+                    headers={"host": host},
+                )
+                self.assertContains(response, "wss://orders.example.com/relay/")
+                self.assertContains(response, "Welcome!")
+        self.assertEqual(len(settings_store._rendered), 1)
+
+
+MENU_NAMES = [
+    "Butter Chicken", "Chicken Biryani", "Cheese Naan", "Garlic Naan",
+    "Seven Up", "Cheese Burger", "Chicken Burger",
+]
+
+
+class TrigramMatcherTests(TestCase):
+    def setUp(self):
+        self.matcher = TrigramMatcher(MENU_NAMES)
+
+    def test_ranks_by_coverage_of_the_name(self):
+        ranked = [name for name, _ in self.matcher.candidates("can i get the cheese burger", 3)]
+        self.assertEqual(ranked, ["Cheese Burger", "Cheese Naan", "Chicken Burger"])
+        self.assertEqual(self.matcher.match("chees naan"), "Cheese Naan")
+        self.assertEqual(self.matcher.match("7 up"), "Seven Up")
+
+    def test_no_match_below_the_cutoff(self):
+        self.assertIsNone(self.matcher.match("sushi platter"))
+        # Three dishes are equally likely.
+        self.assertIsNone(self.matcher.match("chicken"))
+
+
+class RestaurantIndexTests(MenuTestCase):
+    def test_only_the_restaurants_own_items(self):
+        other = Restaurant.objects.create(name="Other", phone_number="+15550000001")
+        MenuItem.objects.create(restaurant=other, name="Pepperoni Pizza", price=12)
+        resolved = menu.menu_snapshot(self.restaurant).index.resolve(["pepperoni pizza"])
+        self.assertEqual(resolved, {"pepperoni pizza": (self.pizza.pk, "Pizza")})
+
+    def test_branch_from_the_calls_snapshot(self):
+        Branch.objects.create(restaurant=self.restaurant, name="Airport Road")
+        Branch.objects.create(restaurant=self.restaurant, name="Riverside")
+        ctx = SimpleNamespace(deps=self.deps())
+        ctx.deps.session.pinned_menu()
+        with self.assertNumQueries(1):  # saving the order
+            result = set_pick_up_branch(ctx, branch_name="river side", time="7pm")
+        self.assertEqual(result["status"], "success")
+        self.assertEqual(Order.objects.get(pk=self.order.pk).pickup_branch, "Riverside")
+        result = set_pick_up_branch(ctx, branch_name="the mall", time="7pm")
+        self.assertEqual(result["status"], "error")
+
+
+class PhoneticMatchingTests(TestCase):
+    def test_phonetic_key(self):
+        self.assertEqual(phonetic_key("cheese"), phonetic_key("chees"))
+        self.assertEqual(phonetic_key("chicken"), phonetic_key("chikken"))
+        self.assertEqual(phonetic_key("biryani"), phonetic_key("briyani"))
+
+    def test_sound_only_when_spelling_fails(self):
+        matcher = HybridMatcher(MENU_NAMES)
+        self.assertIsNone(TrigramMatcher(MENU_NAMES).match("briyani chicken"))
+        self.assertEqual(matcher.match("briyani chicken"), "Chicken Biryani")
+        # Spelt closely enough: the trigram ranking is kept.
+        self.assertEqual(
+            matcher.candidates("cheese burger", 2),
+            matcher.spelling.candidates("cheese burger", 2),
+        )
+        self.assertIsNone(matcher.match("sushi platter"))
+
+
+class SentenceBufferTests(TestCase):
+    def test_releases_whole_sentences(self):
+        buffer = SentenceBuffer()
+        self.assertEqual(buffer.feed("That's $3"), [])
+        self.assertEqual(buffer.feed(".50 for the coke. Any"), ["That's $3.50 for the coke."])
+        self.assertEqual(buffer.feed("thing else? Thanks! Bye"), ["Anything else?", "Thanks!"])
+        self.assertEqual(buffer.flush(), "Bye")
+        self.assertEqual(buffer.flush(), "")
+
+
+class RelayTests(TestCase):
+    SENTENCES = SentenceBuffer().feed(REPLY + " ")
+
+    def setUp(self):
+        Restaurant.objects.create(name="Relay", phone_number="+15550000000")
+        self.enterContext(agent.override(model=fake_model(latency=0.3, reply=REPLY)))
+        self.enterContext(mock.patch("core.relay.finish_turn"))
+
+    async def start_call(self, call_sid: str) -> InProcessSocket:
+        to_number, from_number = "+15550000000", CALLER_NUMBER
+        if views.DEVELOPMENT:
+            to_number, from_number = from_number, to_number
+        socket = InProcessSocket()
+        await socket.connect()
+        await socket.send(
+            {"type": "setup", "callSid": call_sid, "from": from_number, "to": to_number}
+        )
+        return socket
+
+    async def prompt(self, socket: InProcessSocket, text: str):
+        await socket.send({"type": "prompt", "voicePrompt": text, "last": True})
+
+    async def tokens_until_last(self, socket: InProcessSocket) -> list[str]:
+        tokens = []
+        while not (message := await socket.recv())["last"]:
+            tokens.append(message["token"].strip())
+        return tokens
+
+    async def saved_turns(self, call_sid: str) -> list[tuple[int, str]]:
+        return [
+            row
+            async for row in ConversationTurn.objects.filter(order__call_sid=call_sid)
+            .order_by("seq")
+            .values_list("seq", "role")
+        ]
+
+    async def test_streams_sentence_by_sentence(self):
+        socket = await self.start_call("CA-stream")
+        await self.prompt(socket, "Two cheese burgers please")
+        self.assertEqual(await self.tokens_until_last(socket), self.SENTENCES)
+        await socket.close()
+        self.assertEqual(len(await self.saved_turns("CA-stream")), 2)
+
+    async def test_interrupted_turn_is_saved_and_queued_prompts_run_in_order(self):
+        socket = await self.start_call("CA-interrupt")
+        await self.prompt(socket, "Two cheese burgers please")
+        first = await socket.recv()
+        await socket.send({"type": "interrupt", "utteranceUntilInterrupt": "Sure"})
+        # Read while the first turn is still running.
+        await self.prompt(socket, "And a cola")
+        tokens = [first["token"].strip(), *await self.tokens_until_last(socket)]
+        await socket.close()
+        # The rest of the first reply was dropped, the second streamed whole.
+        self.assertEqual(tokens, self.SENTENCES[:1] + self.SENTENCES)
+        self.assertEqual(
+            [seq for seq, _ in await self.saved_turns("CA-interrupt")], [0, 1, 2, 3]
+        )
+
+
+def exchange(i: int) -> list:
+    """A caller prompt, a get_menu call and its result, and the reply."""
+    call = ToolCallPart("get_menu", {}, tool_call_id=f"call-{i}")
+    return [
+        ModelRequest(parts=[UserPromptPart(f"question {i}")]),
+        ModelResponse(parts=[call]),
+        ModelRequest(parts=[ToolReturnPart("get_menu", "the menu", tool_call_id=f"call-{i}")]),
+        ModelResponse(parts=[TextPart(f"answer {i}")]),
+    ]
+
+
+class HistoryWindowTests(TestCase):
+    def setUp(self):
+        self.enterContext(mock.patch.object(history, "HISTORY_WINDOW", 2))
+        self.enterContext(mock.patch.object(history, "HISTORY_FOLD_EVERY", 2))
+        self.prompts = []
+
+        def summarise(messages, info: AgentInfo) -> ModelResponse:
+            self.prompts.append(messages[-1].parts[-1].content)
+            return ModelResponse(parts=[TextPart(f"summary {len(self.prompts)}")])
+
+        self.enterContext(history.summary_agent.override(model=FunctionModel(summarise)))
+
+    def conversation(self, exchanges: range) -> list:
+        messages = [message for i in exchanges for message in exchange(i)]
+        messages[0] = ModelRequest(
+            parts=[SystemPromptPart("You take orders."), *messages[0].parts]
+        )
+        return messages
+
+    async def test_short_history_is_replayed_whole(self):
+        messages = self.conversation(range(3))
+        kept, summary, spend = await history.apply_history_policy(messages, "")
+        self.assertEqual((kept, summary, self.prompts), (messages, "", []))
+        self.assertEqual(spend.usage.requests, 0)
+
+    async def test_old_exchanges_are_folded_into_the_summary(self):
+        kept, summary, spend = await history.apply_history_policy(
+            self.conversation(range(4)), ""
+        )
+        self.assertEqual(summary, "summary 1")
+        self.assertEqual(spend.usage.requests, 1)
+        self.assertIn("Customer: question 1", self.prompts[0])
+        self.assertNotIn("question 2", self.prompts[0])
+        # The last two exchanges, whole, with the system prompt and summary first.
+        self.assertEqual(len(kept), 8)
+        self.assertEqual(
+            [part.content for part in kept[0].parts],
+            ["You take orders.", history.SUMMARY_PREFIX + "summary 1", "question 2"],
+        )
+        self.assertIsInstance(kept[1].parts[0], ToolCallPart)
+
+        # Two turns later the summary is updated, not duplicated.
+        kept, summary, _ = await history.apply_history_policy(
+            kept + exchange(4) + exchange(5), summary
+        )
+        self.assertIn("Existing summary:\nsummary 1", self.prompts[1])
+        system = [part.content for part in kept[0].parts if isinstance(part, SystemPromptPart)]
+        self.assertEqual(system, ["You take orders.", history.SUMMARY_PREFIX + "summary 2"])
+
+
+class SessionTests(TestCase):
+    def setUp(self):
+        self.restaurant = Restaurant.objects.create(name="Test", phone_number="+15550000000")
+        self.addCleanup(sessions.evict_session, "CA-session")
+
+    def session(self) -> CallSession:
+        return async_to_sync(sessions.aget_session)(
+            "CA-session", "+15550000000", "+15551111111"
+        )
+
+    def test_later_turns_reuse_the_session(self):
+        first = self.session()
+        Order.objects.filter(pk=first.order.pk).update(address="1 Main St")
+        with self.assertNumQueries(1):  # the order, re-read for the turn
+            second = self.session()
+        self.assertIs(second, first)
+        self.assertEqual(second.order.address, "1 Main St")
+
+    def test_new_call_cancels_the_pending_callback(self):
+        scheduler.schedule(
+            "call_back", jobs.callback_key(self.restaurant.pk, "+15551111111"), 600
+        )
+        self.session()
+        self.assertEqual(ScheduledJob.objects.get().status, JobStatus.CANCELLED)
+
+    def test_ended_and_idle_calls_are_evicted(self):
+        first = self.session()
+        sessions.evict_session("CA-session")
+        second = self.session()
+        self.assertIsNot(second, first)
+
+        later = time.monotonic() + sessions.SESSION_TTL_SECONDS + 1
+        with mock.patch.object(sessions.time, "monotonic", return_value=later):
+            self.assertIsNot(self.session(), second)
+        # Still one order for the whole call.
+        self.assertEqual(Order.objects.filter(call_sid="CA-session").count(), 1)
+
+
+class TenantResolverTests(TestCase):
+    def setUp(self):
+        self.restaurant = Restaurant.objects.create(name="Test", phone_number="+15550000000")
+        # A resolver of its own stands in for another worker: the signals
+        # only reach the module's one.
+        self.resolver = tenants.TenantResolver()
+        self.resolver.load()
+
+    def test_loaded_numbers_resolve_from_memory(self):
+        with self.assertNumQueries(0):
+            restaurant = self.resolver.resolve("+1 (555) 000-0000")
+        self.assertEqual(restaurant, self.restaurant)
+
+    def test_number_added_elsewhere_is_fetched_once(self):
+        PhoneNumber.objects.create(restaurant=self.restaurant, number="+15550000009")
+        with self.assertNumQueries(1):
+            self.assertEqual(self.resolver.resolve("+15550000009"), self.restaurant)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.resolver.resolve("+15550000009"), self.restaurant)
+
+    def test_unknown_numbers_are_remembered_for_a_while(self):
+        with self.assertNumQueries(1):
+            self.assertIsNone(self.resolver.resolve("+15559999999"))
+        with self.assertNumQueries(0):
+            self.assertIsNone(self.resolver.resolve("+15559999999"))
+
+        later = time.monotonic() + tenants.TENANT_MISS_SECONDS + 1
+        with mock.patch.object(tenants.time, "monotonic", return_value=later):
+            with self.assertNumQueries(1):
+                self.assertIsNone(self.resolver.resolve("+15559999999"))
+
+    def test_saving_a_restaurant_forgets_the_misses(self):
+        self.assertIsNone(self.resolver.resolve("+15559999999"))
+        other = Restaurant.objects.create(name="Other", phone_number="+15559999999")
+        self.resolver.restaurant_saved(other)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.resolver.resolve("+15559999999"), other)
+
+
+class StoreTurnTests(TestCase):
+    def store(self, order: Order, *texts: str):
+        entries = [ConversationTurn(role="user", text=text) for text in texts]
+        _store_turn(order, entries, ["conversation_length"], {})
+
+    def test_turns_follow_the_backfilled_entries(self):
+        order = Order.objects.create(
+            call_sid="CA-legacy",
+            customer_phone="+15551111111",
+            conversation=[{"role": "user", "text": "one"}, {"role": "ai", "text": "two"}],
+        )
+        self.store(order, "three", "four")
+        call_command("backfill_conversation", stdout=io.StringIO())
+        # ``order`` was loaded before the backfill and still has length 2.
+        self.store(order, "five")
+
+        turns = ConversationTurn.objects.filter(order=order).order_by("seq")
+        self.assertEqual(
+            list(turns.values_list("seq", "text")),
+            [(0, "one"), (1, "two"), (2, "three"), (3, "four"), (4, "five")],
+        )
+        order.refresh_from_db()
+        self.assertEqual(order.conversation_length, 5)
+        self.assertEqual(order.conversation, [])
+
+
+class LoggerTests(TestCase):
+    def setUp(self):
+        # The file handler's path, minus the file: records go through the
+        # queue handler and its filter, and are formatted as the listener would.
+        self.records = queue.SimpleQueue()
+        handler = logger.CallQueueHandler(self.records)
+        handler.addFilter(logger.CallFilter())
+        self.log = logging.getLogger("core.tests.logger")
+        self.log.addHandler(handler)
+        self.addCleanup(self.log.removeHandler, handler)
+        self.addCleanup(logger.bind_call, None)
+
+    def lines(self) -> list[dict]:
+        formatter = logger.JsonFormatter()
+        lines = []
+        while not self.records.empty():
+            lines.append(json.loads(formatter.format(self.records.get())))
+        return lines
+
+    def test_json_lines(self):
+        logger.bind_call("CA-log")
+        self.log.warning("took %sms", 120, extra={"turn": 3})
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            self.log.exception("failed")
+        logger.bind_call(None)
+        self.log.warning("between calls")
+
+        took, failed, between = self.lines()
+        self.assertEqual(took["level"], "WARNING")
+        self.assertEqual(took["logger"], "core.tests.logger")
+        self.assertEqual(took["call_sid"], "CA-log")
+        self.assertEqual(took["message"], "took 120ms")
+        self.assertEqual(took["turn"], 3)
+        self.assertTrue(took["time"].endswith("+00:00"))
+        self.assertIn("ValueError: boom", failed["exception"])
+        self.assertNotIn("call_sid", between)
+
+    async def test_each_task_logs_its_own_call(self):
+        async def serve(call_sid: str):
+            logger.bind_call(call_sid)
+            await asyncio.sleep(0)
+            self.log.warning("turn")
+
+        await asyncio.gather(serve("CA-1"), serve("CA-2"))
+        self.log.warning("outside")
+        self.assertEqual(
+            [line.get("call_sid") for line in self.lines()], ["CA-1", "CA-2", None]
+        )
 
-# Create your tests here.
+    def test_long_messages_are_cut_short(self):
+        with mock.patch.multiple(logger, LOG_MAX_CHARS=10, LOG_LARGE_SAMPLE_RATE=0):
+            self.log.warning("x" * 25)
+            self.assertEqual(self.lines()[0]["message"], f"{'x' * 10}… (+15 chars)")
@@ -1,20 +1,29 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import asyncio
 from asgiref.sync import sync_to_async
-from difflib import get_close_matches
 from typing import Callable, Any, Dict
 import functools
 import json
 
+from django.db import IntegrityError, transaction
+
 from .logger import get_logger
 
 log = get_logger()
 
-from .models import Restaurant, Order, Category, OrderItem, MenuItem, StatusEnum, Branch
+from .models import (
+    Order,
+    OrderItem,
+    MenuItem,
+    StatusEnum,
+    ConversationRole,
+    ConversationTurn,
+)
+from .prompt import arestaurant_prompt, call_prompt
+from .metrics import timing
+from .sessions import CallSession
 
-# Scheduler
-from core.utils.scheduler import run_after_delay
-from core.utils.call_from_twillio import call
+from .jobs import schedule_callback
 
 
 import os
@@ -27,49 +36,110 @@ from .myinst import INSTRUCTIONS
 class OrderDeps:
     session_id: str
     phone_number: str
+    # Order, restaurant and menu for this call, shared by all tools.
+    session: CallSession
+    # Set for runs started on partial speech results (see core.speculation).
+    speculative: bool = False
+    # The turn's new conversation entries, stored by turns.save_turn.
+    entries: list[ConversationTurn] = field(default_factory=list)
+
+
+class SpeculativeRunAborted(Exception):
+    """A speculative run tried to call a tool that changes the order."""
 
 
 agent = Agent(
     "openai:gpt-5-mini",
     deps_type=OrderDeps,
     system_prompt=INSTRUCTIONS,
+    capabilities=[timing],
 )
 
 
-# ------------------ 🤝 Helpers ------------------
-def get_or_create_order(call_sid: str) -> Order:
-    order, _ = Order.objects.get_or_create(call_sid=call_sid)
-    return order
+# Prompt layout: see core.prompt.
+@agent.instructions
+async def restaurant_instructions(ctx: RunContext[OrderDeps]) -> str:
+    return await arestaurant_prompt(ctx.deps.session)
 
 
-def find_menu_item_by_name(name: str) -> MenuItem | None:
-    all_names = MenuItem.objects.values_list("name", flat=True)
-    print("\n\nall_names\n: ", all_names)
-    matches = get_close_matches(name, all_names, n=1, cutoff=0.8)
-    if matches:
-        return MenuItem.objects.filter(name=matches[0]).first()
-    return None
+@agent.instructions
+def call_instructions(ctx: RunContext[OrderDeps]) -> str:
+    return call_prompt(ctx.deps.session)
 
 
-def find_branch_by_name(name: str, restaurant: Restaurant) -> Branch | None:
-    """
-    Finds a branch by name for a specific restaurant using fuzzy matching.
+# ------------------ 🤝 Helpers ------------------
+def resolve_menu_items(names: list[str], session: CallSession) -> dict[str, tuple[int, str] | None]:
+    """Spoken item name -> (menu item id, menu name), from the call's menu snapshot."""
+    return session.pinned_menu().index.resolve(names)
 
-    Args:
-        name (str): The name of the branch to search for.
-        restaurant (Restaurant): The restaurant instance whose branches to search.
 
-    Returns:
-        Branch | None: The matched Branch instance or None if not found.
+@transaction.atomic
+def apply_order_items(order: Order, wanted: dict[int, tuple[int, str | None]]):
+    """
+    Makes the order's lines match ``wanted`` (menu item id -> quantity,
+    modifications): creates, updates and deletes lines in bulk.
     """
-    all_names = Branch.objects.filter(restaurant=restaurant).values_list(
-        "name", flat=True
+    existing = {
+        line.menu_item_id: line
+        for line in OrderItem.objects.select_for_update().filter(order=order)
+    }
+    to_create, to_update = [], []
+    for menu_item_id, (quantity, modifications) in wanted.items():
+        line = existing.pop(menu_item_id, None)
+        if line is None:
+            to_create.append(
+                OrderItem(
+                    order=order,
+                    menu_item_id=menu_item_id,
+                    quantity=quantity,
+                    modifications=modifications,
+                )
+            )
+        elif (line.quantity, line.modifications) != (quantity, modifications):
+            line.quantity = quantity
+            line.modifications = modifications
+            to_update.append(line)
+    # Left out of the complete list, so removed from the order.
+    if existing:
+        OrderItem.objects.filter(pk__in=[line.pk for line in existing.values()]).delete()
+    if to_update:
+        OrderItem.objects.bulk_update(to_update, ["quantity", "modifications"])
+    if to_create:
+        OrderItem.objects.bulk_create(to_create)
+
+
+def find_branch_by_name(name: str, session: CallSession) -> str | None:
+    """The restaurant's branch best matching ``name``, from the call's menu snapshot."""
+    return session.pinned_menu().index.branch(name)
+
+
+def add_entry(ctx: RunContext[OrderDeps], tool_name: str, text: str, status: str):
+    """Adds a tool's outcome to the turn's conversation."""
+    ctx.deps.entries.append(
+        ConversationTurn(
+            role=ConversationRole.SYSTEM,
+            text=text,
+            tool_name=tool_name,
+            metadata={"status": status},
+        )
     )
-    print("\n\nbranch_names\n: ", list(all_names))
-    matches = get_close_matches(name, all_names, n=1, cutoff=0.7)
-    if matches:
-        return Branch.objects.filter(restaurant=restaurant, name=matches[0]).first()
-    return
+
+
+def mutates_order(func: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Marks a tool that writes to the order.
+
+    Speculative runs must not have side effects, so they are aborted as soon
+    as the model asks for one of these tools.
+    """
+
+    @functools.wraps(func)
+    def wrapper(ctx: RunContext[OrderDeps], *args: Any, **kwargs: Any) -> Any:
+        if ctx.deps.speculative:
+            raise SpeculativeRunAborted(func.__name__)
+        return func(ctx, *args, **kwargs)
+
+    return wrapper
 
 
 def to_async(func: Callable[..., Any]) -> Callable[..., Any]:
@@ -80,56 +150,24 @@ def to_async(func: Callable[..., Any]) -> Callable[..., Any]:
     return wrapper
 
 
-def format_menu_for_instructions(menu_dict):
-    log.info(type(menu_dict))
-    log.info(menu_dict)
-    menu_string = ""
-    for category, items in menu_dict.items():
-        menu_string += f"**{category}:**\n"
-        for item, price in items.items():
-            menu_string += f"- {item}: ${price:.2f}\n"
-        menu_string += "\n"  # Add a newline for separation between categories
-    return menu_string
-
-
 # ------------------ 🛠️ Tools ------------------
 @agent.tool
 def get_menu(ctx: RunContext[OrderDeps]) -> Dict[str, Dict[str, Any]]:
     """
-    Fetches the menu from the database for a restaurant identified by its phone number.
+    Fetches the menu of the restaurant the customer called.
 
-    This function is designed to be called from an asynchronous agent. The
-    @to_async decorator handles running the synchronous database queries
-    on a background thread.
-
-    Args:
-        phone_number (str): The phone number of the restaurant.
+    The call sees the same menu snapshot throughout (``CallSession.menu``).
 
     Returns:
         Dict[str, Dict[str, Any]]: A dictionary representing the menu,
                                     grouped by category, with each item and its price.
     """
-    menu_dict = {}
-    print(ctx.deps.phone_number)
-    log.info(f"Fetching restaurant for phone number: '{ctx.deps.phone_number}'")
-    restaurant = Restaurant.objects.get(phone_number=ctx.deps.phone_number)
-    print(f"{restaurant = }")
-
-    categories = Category.objects.filter(menuitem__restaurant=restaurant).distinct()
-    log.info(f"categories: {categories}")
-
-    for category in categories:
-        items = MenuItem.objects.filter(restaurant=restaurant, category=category)
-        if items.exists():
-            menu_dict[category.name] = {item.name: item.price for item in items}
-
-    print(menu_dict)
-    log.info(menu_dict)
-    return menu_dict
+    return ctx.deps.session.menu
 
 
 # @transaction.atomic
 @agent.tool
+@mutates_order
 def set_or_modify_items(
     ctx: RunContext[OrderDeps],
     items: list[dict[str, Any]],
@@ -137,6 +175,8 @@ def set_or_modify_items(
 ) -> dict[str, Any]:
     """
     Creates a new order for a specific person or modifies an existing order for that person.
+    ``items`` is the complete order: items left out are removed. Nothing is
+    changed unless every item is valid and on the menu.
 
     Args:
         items (List[Dict[str, Any]]): A list of dictionaries, where each dictionary represents an item
@@ -151,24 +191,53 @@ def set_or_modify_items(
         Dict[str, Any]: A dictionary indicating the success or failure of the operation,
                         and potentially details about the order.
     """
-    log.info(f"[items] {items}")
+    log.info(f"[items] {len(items)} lines, {len(modifications)} modifications")
     log.info(f"[modifications] {modifications}")
     log.info(f"[session_id] {ctx.deps.session_id}")
 
     try:
-        order = get_or_create_order(ctx.deps.session_id)
-        processed_items = []
+        order = ctx.deps.session.order
 
+        # Validate the whole request before changing anything.
         for item in items:
-            item_name = item.get("name")
-            quantity = item.get("quantity")
-
-            if not item_name or quantity is None:
+            if not item.get("name") or item.get("quantity") is None:
                 return {
                     "status": "error",
                     "message": "Each item must have 'name' and 'quantity'.",
                 }
+            if int(item["quantity"]) < 0:
+                return {
+                    "status": "error",
+                    "message": f"Quantity of '{item['name']}' can't be negative.",
+                }
 
+        menu_items = resolve_menu_items(
+            [item["name"] for item in items], ctx.deps.session
+        )
+        unknown = [name for name, menu_item in menu_items.items() if menu_item is None]
+        if unknown:
+            add_entry(
+                ctx,
+                "set_or_modify_items",
+                f"\t❌ [set_or_modify_items] 403 Items {unknown} not found in menu.\n",
+                "error",
+            )
+            return {
+                "status": "error",
+                "message": f"Not found in menu: {', '.join(unknown)}. The order was not changed.",
+            }
+
+        wanted = {}
+        processed_items = []
+        for item in items:
+            item_name = item["name"]
+            menu_item_id, menu_name = menu_items[item_name]
+            if menu_item_id in wanted:
+                return {
+                    "status": "error",
+                    "message": f"'{menu_name}' is listed twice. The order was not changed.",
+                }
+            quantity = int(item["quantity"])
             item_modifications = [
                 mod.get("details")
                 for mod in modifications
@@ -177,47 +246,46 @@ def set_or_modify_items(
             modifications_str = (
                 json.dumps(item_modifications) if item_modifications else None
             )
-
-            menu_item = find_menu_item_by_name(item_name)
-            if not menu_item:
-                order.conversation.append(
+            # Quantity 0 removes the item.
+            if quantity:
+                wanted[menu_item_id] = (quantity, modifications_str)
+                processed_items.append(
                     {
-                        "role": "system",
-                        "text": f"\t❌ [set_or_modify_items] 403 Item '{item_name}' not found in menu.\n",
+                        "name": menu_name,
+                        "quantity": quantity,
+                        "modifications": item_modifications,
                     }
                 )
-                return {
-                    "status": "error",
-                    "message": f"Item '{item_name}' not found in menu.",
-                }
-
-            existing_item = OrderItem.objects.filter(
-                order=order, menu_item=menu_item
-            ).first()
 
-            if existing_item:
-                existing_item.quantity = quantity
-                existing_item.modifications = modifications_str
-                existing_item.save()
-            else:
-                OrderItem.objects.create(
-                    order=order,
-                    menu_item=menu_item,
-                    quantity=quantity,
-                    modifications=modifications_str,
-                )
-
-            processed_items.append(
-                {
-                    "name": item_name,
-                    "quantity": quantity,
-                    "modifications": item_modifications,
-                }
+        try:
+            apply_order_items(order, wanted)
+        except IntegrityError:
+            # Deleted since the call's menu snapshot was taken.
+            existing = set(
+                MenuItem.objects.filter(pk__in=wanted).values_list("pk", flat=True)
+            )
+            gone = [
+                menu_name
+                for menu_item_id, menu_name in menu_items.values()
+                if menu_item_id in wanted and menu_item_id not in existing
+            ]
+            add_entry(
+                ctx,
+                "set_or_modify_items",
+                f"\t❌ [set_or_modify_items] 403 Items {gone} no longer on the menu.\n",
+                "error",
             )
-        order.conversation.append(
-            {"role": "system", "text": "✅ [set_or_modify_items] 200 Success"}
+            return {
+                "status": "error",
+                "message": f"Not found in menu: {', '.join(gone)}. The order was not changed.",
+            }
+
+        add_entry(
+            ctx,
+            "set_or_modify_items",
+            "✅ [set_or_modify_items] 200 Success",
+            "success",
         )
-        order.save()
         log.info(f"[set_or_modify_items] 200 {ctx.deps.session_id}")
         return {
             "status": "success",
@@ -226,15 +294,18 @@ def set_or_modify_items(
         }
 
     except Exception as e:
-        order.conversation.append(
-            {"role": "system", "text": f"❌ [set_or_modify_items] 402 Exception {e}"}
+        add_entry(
+            ctx,
+            "set_or_modify_items",
+            f"❌ [set_or_modify_items] 402 Exception {e}",
+            "error",
         )
-        order.save()
         # log.exception(f"[set_or_modify_items] 402 Exception {e} {ctx.deps.session_id}")
         return {"status": "error", "message": f"An unexpected error occurred: {e}"}
 
 
 @agent.tool
+@mutates_order
 def confirm_order(ctx: RunContext[OrderDeps]) -> dict[str, Any]:
     """Mark an order as cofirmed so that the kichen team can start prepairing.
 
@@ -243,28 +314,24 @@ def confirm_order(ctx: RunContext[OrderDeps]) -> dict[str, Any]:
                         and potentially details about the order.
     """
     try:
-        order = get_or_create_order(ctx.deps.session_id)
+        order = ctx.deps.session.order
         if not order:
             return {"status": "error", "message": "Order not found."}
 
         order.status = StatusEnum.CONFIRMED
 
-        order.conversation.append(
-            {"role": "system", "text": "✅ [confirm_order] 200 Success"}
-        )
-        order.save()
+        add_entry(ctx, "confirm_order", "✅ [confirm_order] 200 Success", "success")
+        order.save(update_fields=["status"])
         log.info(f"[confirm_order] 200 {ctx.deps.session_id}")
         return {"status": "success", "message": "Order confirmed."}
     except Exception as e:
-        order.conversation.append(
-            {"role": "system", "text": f"❌ [confirm_order] error {e}"}
-        )
-        order.save()
+        add_entry(ctx, "confirm_order", f"❌ [confirm_order] error {e}", "error")
         # log.exception(f"[confirm_order] error {e}")
         return {"status": "error", "message": f"Could not confirm order: {e}"}
 
 
 @agent.tool
+@mutates_order
 def set_order_type(ctx: RunContext[OrderDeps], order_type: str) -> dict[str, Any]:
     """Set the type of the order (e.g., 'delivery', 'pickup', 'table booking').
 
@@ -277,24 +344,29 @@ def set_order_type(ctx: RunContext[OrderDeps], order_type: str) -> dict[str, Any
                         and potentially details about the order.
     """
     try:
-        order = get_or_create_order(ctx.deps.session_id)
+        order = ctx.deps.session.order
         if not order:
             return {"status": "error", "message": "Order not found."}
 
         order.order_type = order_type  # assuming you have an `order_type` field
 
-        order.conversation += f"\t✅ [set_order_type] 200 Success\n"
-        order.save()
+        add_entry(
+            ctx,
+            "set_order_type",
+            "\t✅ [set_order_type] 200 Success\n",
+            "success",
+        )
+        order.save(update_fields=["order_type"])
         # log.info(f"[set_order_type] 200 {ctx.deps.session_id}")
         return {"status": "success", "message": "Order type set successfully."}
     except Exception as e:
-        order.conversation += f"\t❌ [set_order_type] error {e}\n"
-        order.save()
+        add_entry(ctx, "set_order_type", f"\t❌ [set_order_type] error {e}\n", "error")
         # log.exception(f"[set_order_type] error {e}")
         return {"status": "error", "message": f"Could not set order type: {e}"}
 
 
 @agent.tool
+@mutates_order
 def set_address(ctx: RunContext[OrderDeps], address: str) -> dict[str, Any]:
     """Set address for an order with order type 'delivery'.
 
@@ -306,34 +378,24 @@ def set_address(ctx: RunContext[OrderDeps], address: str) -> dict[str, Any]:
         Dict[str, Any]: A dictionary indicating the success or failure of the operation,
     """
     try:
-        order = get_or_create_order(ctx.deps.session_id)
+        order = ctx.deps.session.order
         if not order:
             return {"status": "error", "message": "Order not found."}
 
         order.address = address  # assuming you have an `address` field
 
-        order.conversation.append(
-            {
-                "role": "system",
-                "text": f"\t✅ [set_address] 200 Success\n",
-            }
-        )
-        order.save()
+        add_entry(ctx, "set_address", f"\t✅ [set_address] 200 Success\n", "success")
+        order.save(update_fields=["address"])
         # log.info(f"[set_address] 200 {ctx.deps.session_id}")
         return {"status": "success", "message": "Address set successfully."}
     except Exception as e:
-        order.conversation.append(
-            {
-                "role": "system",
-                "text": f"\t❌ [set_address] error {e}\n",
-            }
-        )
-        order.save()
+        add_entry(ctx, "set_address", f"\t❌ [set_address] error {e}\n", "error")
         # log.exception(f"[set_address] error {e}")
         return {"status": "error", "message": f"Could not set address: {e}"}
 
 
 @agent.tool
+@mutates_order
 def set_table_booking(
     ctx: RunContext[OrderDeps], no_of_people: int, time: str
 ) -> dict[str, Any]:
@@ -350,7 +412,7 @@ def set_table_booking(
                         including relevant messages.
     """
     try:
-        order = get_or_create_order(ctx.deps.session_id)
+        order = ctx.deps.session.order
         if not order:
             return {"status": "error", "message": "Order not found."}
 
@@ -358,28 +420,28 @@ def set_table_booking(
         order.no_of_people = no_of_people  # make sure field exists
         order.booking_time = time  # make sure field exists (DateTimeField preferred, parse time accordingly)
 
-        order.conversation.append(
-            {
-                "role": "system",
-                "text": f"\t✅ [set_table_booking] 200 Success\n",
-            }
+        add_entry(
+            ctx,
+            "set_table_booking",
+            f"\t✅ [set_table_booking] 200 Success\n",
+            "success",
         )
-        order.save()
+        order.save(update_fields=["order_type", "no_of_people", "booking_time"])
         log.info(f"[set_table_booking] 200 {ctx.deps.session_id}")
         return {"status": "success", "message": "Table booking set successfully."}
     except Exception as e:
-        order.conversation.append(
-            {
-                "role": "system",
-                "text": f"\t❌ [set_table_booking] error {e}\n",
-            }
+        add_entry(
+            ctx,
+            "set_table_booking",
+            f"\t❌ [set_table_booking] error {e}\n",
+            "error",
         )
-        order.save()
         log.exception(f"[set_table_booking] error {e}")
         return {"status": "error", "message": f"Could not set table booking: {e}"}
 
 
 @agent.tool
+@mutates_order
 def set_pick_up_branch(
     ctx: RunContext[OrderDeps], branch_name: str, time: str
 ) -> dict[str, Any]:
@@ -396,38 +458,37 @@ def set_pick_up_branch(
     """
 
     try:
-        order = get_or_create_order(ctx.deps.session_id)
+        order = ctx.deps.session.order
         if not order:
             return {"status": "error", "message": "Order not found."}
 
-        branch = find_branch_by_name(branch_name, order.restaurant)
+        branch = find_branch_by_name(branch_name, ctx.deps.session)
         if not branch:
             return {"status": "error", "message": f"branch '{branch_name}' not found."}
 
         order.order_type = "pickup"
-        order.pickup_branch = branch.name  # ensure this field exists
+        order.pickup_branch = branch
         order.pickup_time = time  # parse to DateTime if needed
 
-        order.conversation.append(
-            {
-                "role": "system",
-                "text": f"\t✅ [set_pick_up_branch] 200 Success\n",
-            }
+        add_entry(
+            ctx,
+            "set_pick_up_branch",
+            f"\t✅ [set_pick_up_branch] 200 Success\n",
+            "success",
         )
-        order.save()
+        order.save(update_fields=["order_type", "pickup_branch", "pickup_time"])
         log.info(f"[set_pick_up_branch] 200 {ctx.deps.session_id}")
         return {
             "status": "success",
             "message": "Pickup branch and time set successfully.",
         }
     except Exception as e:
-        order.conversation.append(
-            {
-                "role": "system",
-                "text": f"\t❌ [set_pick_up_branch] error {e}\n",
-            }
+        add_entry(
+            ctx,
+            "set_pick_up_branch",
+            f"\t❌ [set_pick_up_branch] error {e}\n",
+            "error",
         )
-        order.save()
         log.exception(f"[set_pick_up_branch] error {e}")
         return {"status": "error", "message": f"Could not set pickup branch: {e}"}
 
@@ -449,6 +510,7 @@ def transfer_to_human(
 
 
 @agent.tool
+@mutates_order
 def call_back(
     ctx: RunContext[OrderDeps], callback_delay_minutes: int
 ) -> dict[str, Any]:
@@ -464,39 +526,25 @@ def call_back(
                         including relevant messages.
     """
     try:
-        order = get_or_create_order(ctx.deps.session_id)
+        order = ctx.deps.session.order
         if not order:
             return {"status": "error", "message": "Order not found."}
-        customer_phone = get_or_create_order(ctx.deps.session_id).customer_phone
-        run_after_delay(
-            callback_delay_minutes * 60,
-            call,
-            to_number=customer_phone,
-        )
+        # Stored, so it survives restarts; asking again moves the callback.
+        if not schedule_callback(order, callback_delay_minutes * 60):
+            return {"status": "error", "message": "The customer is being called back right now."}
 
         order.status = (
             StatusEnum.CALL_BACK_REQUESTED
         )  # You need to define this enum value
-        order.conversation.append(
-            {
-                "role": "system",
-                "text": f"\t✅ [call_back] 200 Success\n",
-            }
-        )
-        order.save()
+        add_entry(ctx, "call_back", f"\t✅ [call_back] 200 Success\n", "success")
+        order.save(update_fields=["status"])
 
         log.info(f"[call_back] 200 {ctx.deps.session_id}")
 
         return {"status": "success", "message": "Callback requested."}
 
     except Exception as e:
-        order.conversation.append(
-            {
-                "role": "system",
-                "text": f"\t❌ [call_back] error {e}\n",
-            }
-        )
-        order.save()
+        add_entry(ctx, "call_back", f"\t❌ [call_back] error {e}\n", "error")
         log.exception(f"[call_back] error {e}")
         return {"status": "error", "message": f"Could not request callback: {e}"}
 
@@ -0,0 +1,298 @@
+import time
+import zlib
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import F
+
+from pydantic_ai import ModelRequest, ModelResponse, TextPart, UserPromptPart
+from pydantic_ai.messages import ModelMessage, ModelMessagesTypeAdapter
+from pydantic_ai.usage import RunUsage
+
+from . import response_cache
+from .history import apply_history_policy, user_request
+from .intents import FAST_INTENTS, record_llm_turn, try_fast_path
+from .logger import get_logger
+from .metrics import Spend, current_spend, llm_cost, record_usage, span
+from .models import ConversationRole, ConversationTurn, Order, Restaurant, SpanKind
+from .response_cache import RESPONSE_CACHE
+from .sessions import CallSession, aget_session
+from .tools import agent, OrderDeps
+
+log = get_logger()
+
+
+# ------------------ 🤝 Helpers ------------------
+def dump_messages(messages: list[ModelMessage]) -> bytes:
+    return zlib.compress(ModelMessagesTypeAdapter.dump_json(messages))
+
+
+def load_messages(data: bytes) -> list[ModelMessage]:
+    return ModelMessagesTypeAdapter.validate_json(zlib.decompress(data))
+
+
+def get_message_history(order: Order) -> list[ModelMessage]:
+    """
+    The message history to replay for the order's next turn.
+
+    Orders saved before ``Order.message_history`` existed only have the
+    user/agent text in ``Order.conversation``, so fall back to rebuilding it.
+    """
+    if order.message_history:
+        return load_messages(order.message_history)
+    return build_message_history(order.conversation)
+
+
+def build_message_history(conversation: list[dict]) -> list[ModelMessage]:
+    """Convert ``Order.conversation`` entries into pydantic-ai messages."""
+    pydantic_messages = []
+    for msg in conversation:
+        if msg["role"] == "user":
+            pydantic_messages.append(
+                ModelRequest(parts=[UserPromptPart(content=msg["text"])])
+            )
+        elif msg["role"] == "agent":
+            pydantic_messages.append(
+                ModelResponse(parts=[TextPart(content=msg["text"])])
+            )
+    return pydantic_messages
+
+
+# ------------------ 🔁 Turn ------------------
+@dataclass
+class Turn:
+    session: CallSession
+    user_speech: str
+    # New conversation entries: the caller's speech, tool outcomes, the reply.
+    entries: list[ConversationTurn]
+    messages: list[ModelMessage]
+    history_summary: str
+    ai_reply: str
+    usage: RunUsage
+    # Estimated LLM cost of the turn in USD (see metrics.llm_cost).
+    cost: Decimal = Decimal(0)
+    # Updating the history summary, if the turn did (core.history).
+    summary_spend: Spend = field(default_factory=Spend)
+
+
+async def agent_turn(
+    call_sid: str,
+    phone_number: str,
+    customer_phone: str,
+    user_speech: str,
+    event_stream_handler=None,
+    speculative: bool = False,
+    spend: Spend | None = None,
+) -> Turn:
+    """
+    Runs one caller turn through the agent without saving the conversation.
+
+    ``event_stream_handler`` is passed to ``agent.run`` so callers can consume
+    the reply while it is generated. With ``speculative=True`` any tool that
+    would change the order raises ``SpeculativeRunAborted`` instead. ``spend``
+    is added to as the turn goes (summary, model responses), so a run that
+    is cancelled or aborted can still be accounted for.
+    """
+    if spend is not None:
+        current_spend.set(spend)
+    with span(SpanKind.DB, "load_session"):
+        session = await aget_session(
+            call_sid=call_sid, phone_number=phone_number, customer_phone=customer_phone
+        )
+    order = session.order
+    pydantic_messages, history_summary, summary_spend = await apply_history_policy(
+        get_message_history(order), order.history_summary
+    )
+    if spend is not None:
+        spend.add(summary_spend)
+    # Per run, so a speculative run leaves the shared session untouched.
+    entries = [ConversationTurn(role=ConversationRole.USER, text=user_speech)]
+
+    # Main ==================================================================
+    deps = OrderDeps(
+        session_id=call_sid,
+        phone_number=phone_number,
+        session=session,
+        speculative=speculative,
+        entries=entries,
+    )
+    # Speculative runs must not touch the order, so they always use the LLM.
+    if FAST_INTENTS and not speculative:
+        fast_reply = await try_fast_path(deps, pydantic_messages, user_speech)
+        if fast_reply:
+            entries.append(
+                ConversationTurn(role=ConversationRole.AGENT, text=fast_reply.reply)
+            )
+            return Turn(
+                session=session,
+                user_speech=user_speech,
+                entries=entries,
+                messages=[*pydantic_messages, *fast_reply.messages],
+                history_summary=history_summary,
+                ai_reply=fast_reply.reply,
+                usage=RunUsage(),
+                summary_spend=summary_spend,
+            )
+
+    cache_key = None
+    if RESPONSE_CACHE:
+        cache_key = await response_cache.cache_key(session, user_speech)
+        if cached := response_cache.lookup(cache_key):
+            entries.append(
+                ConversationTurn(role=ConversationRole.AGENT, text=cached.reply)
+            )
+            return Turn(
+                session=session,
+                user_speech=user_speech,
+                entries=entries,
+                messages=[
+                    *pydantic_messages,
+                    user_request(user_speech, pydantic_messages),
+                    *cached.messages,
+                ],
+                history_summary=history_summary,
+                ai_reply=cached.reply,
+                usage=RunUsage(),
+                summary_spend=summary_spend,
+            )
+
+    started = time.perf_counter()
+    agent_response = await agent.run(
+        user_speech,
+        message_history=pydantic_messages,
+        deps=deps,
+        event_stream_handler=event_stream_handler,
+    )
+    record_llm_turn(time.perf_counter() - started)
+    ai_reply = agent_response.output.strip()
+    response_cache.store(cache_key, ai_reply, agent_response.new_messages())
+    entries.append(ConversationTurn(role=ConversationRole.AGENT, text=ai_reply))
+    log.info(f"success {ai_reply}")
+    return Turn(
+        session=session,
+        user_speech=user_speech,
+        entries=entries,
+        messages=agent_response.all_messages(),
+        history_summary=history_summary,
+        ai_reply=ai_reply,
+        usage=agent_response.usage,
+        cost=llm_cost(agent_response.new_messages()),
+        summary_spend=summary_spend,
+    )
+
+
+async def save_turn(turn: Turn) -> Order:
+    """
+    Stores the turn's conversation entries and usage, and returns the order
+    as left by the tools.
+    """
+    # The tools changed the session's order in place, so it is already current.
+    order = turn.session.order
+    entries = turn.entries
+    order.message_history = dump_messages(turn.messages)
+    order.history_summary = turn.history_summary
+    update_fields = ["conversation_length", "message_history", "history_summary"]
+
+    usage = turn.usage + turn.summary_spend.usage
+    cost = turn.cost + turn.summary_spend.cost
+    rollup = {}
+    if usage.requests:
+        rollup = usage_rollup(Spend(usage, cost), summary_cost=turn.summary_spend.cost)
+        for name, value in rollup.items():
+            setattr(order, name, getattr(order, name) + value)
+    record_usage(usage, cost)
+
+    with span(SpanKind.DB, "save_turn"):
+        await sync_to_async(_store_turn)(order, entries, update_fields, rollup)
+    return order
+
+
+def usage_rollup(spend: Spend, **parts: Decimal) -> dict:
+    """
+    What ``spend`` adds to the ``UsageRollup`` fields; ``parts`` name the
+    cost fields it also counts towards (``summary_cost``, ``speculative_cost``).
+    """
+    usage = spend.usage
+    return {
+        "input_tokens": usage.input_tokens,
+        "cache_read_tokens": usage.cache_read_tokens,
+        "output_tokens": usage.output_tokens,
+        "llm_requests": usage.requests,
+        "tool_calls": usage.tool_calls,
+        "llm_cost": spend.cost,
+        **parts,
+    }
+
+
+@transaction.atomic
+def _add_rollup(order_id: int, restaurant_id: int | None, rollup: dict):
+    # Many calls update their restaurant at once, and speculative runs add to
+    # the order outside its turns, so add in the database.
+    increments = {name: F(name) + value for name, value in rollup.items()}
+    Order.objects.filter(pk=order_id).update(**increments)
+    Restaurant.objects.filter(pk=restaurant_id).update(**increments)
+
+
+@transaction.atomic
+def _store_turn(order: Order, entries: list[ConversationTurn], update_fields, rollup):
+    # Numbered from the stored length, read under the order's lock: the
+    # backfill (manage.py backfill_conversation) may have moved rows since
+    # the order was loaded for this turn.
+    length = (
+        Order.objects.select_for_update()
+        .values_list("conversation_length", flat=True)
+        .get(pk=order.pk)
+    )
+    for seq, entry in enumerate(entries, start=length):
+        entry.order = order
+        entry.seq = seq
+    order.conversation_length = length + len(entries)
+    ConversationTurn.objects.bulk_create(entries)
+    order.save(update_fields=update_fields)
+    if rollup:
+        _add_rollup(order.pk, order.restaurant_id, rollup)
+
+
+async def save_spend(call_sid: str, spend: Spend, part: str):
+    """
+    Adds LLM spend that no saved turn accounts for (e.g. a speculative run
+    that was thrown away) to the call's order and restaurant, counting it
+    towards their ``part`` cost field too.
+    """
+    if not spend.usage.requests:
+        return
+    rollup = usage_rollup(spend, **{part: spend.cost})
+    order = await Order.objects.filter(call_sid=call_sid).values("pk", "restaurant_id").afirst()
+    if order is None:
+        return
+    with span(SpanKind.DB, "save_spend"):
+        await sync_to_async(_add_rollup)(order["pk"], order["restaurant_id"], rollup)
+
+
+async def run_turn(
+    call_sid: str,
+    phone_number: str,
+    customer_phone: str,
+    user_speech: str,
+    event_stream_handler=None,
+) -> tuple[Order, str]:
+    """
+    Runs one caller turn through the agent and saves it to the order.
+
+    Shared by the Gather webhooks (``views.process_speech``) and the streaming
+    ConversationRelay socket (``relay``).
+
+    Returns:
+        tuple[Order, str]: The order as left by the tools, and the agent's reply.
+    """
+    turn = await agent_turn(
+        call_sid=call_sid,
+        phone_number=phone_number,
+        customer_phone=customer_phone,
+        user_speech=user_speech,
+        event_stream_handler=event_stream_handler,
+    )
+    order = await save_turn(turn)
+    return order, turn.ai_reply
@@ -0,0 +1,160 @@
+"""
+The process's Twilio REST client.
+
+One ``Client`` per process, built on first use, on a pooled aiohttp
+transport: at most ``TWILIO_MAX_CONNECTIONS`` connections to Twilio, kept
+alive ``TWILIO_KEEPALIVE_SECONDS`` between requests, and a
+``TWILIO_TIMEOUT_SECONDS`` limit per request. Requests run on the client's
+own event loop thread, so threads (the dialer's workers) and event loops
+(async views) share the same connections; ``run`` waits for a request and
+``arun`` awaits it without blocking the caller's loop.
+
+``TWILIO_API_URL`` points the client at another REST endpoint, e.g. the
+local stand-in from ``manage.py fake_twilio`` (``core.utils.fake_twilio``).
+"""
+
+import asyncio
+import atexit
+import os
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, TypeVar
+
+import aiohttp
+from dotenv import load_dotenv
+from twilio.http import AsyncHttpClient
+from twilio.http.response import Response
+from twilio.rest import Client
+
+from .logger import get_logger
+
+log = get_logger()
+
+load_dotenv()
+
+TWILIO_API_URL = os.getenv("TWILIO_API_URL", "")
+TWILIO_MAX_CONNECTIONS = int(os.getenv("TWILIO_MAX_CONNECTIONS", "20"))
+TWILIO_KEEPALIVE_SECONDS = float(os.getenv("TWILIO_KEEPALIVE_SECONDS", "60"))
+TWILIO_TIMEOUT_SECONDS = float(os.getenv("TWILIO_TIMEOUT_SECONDS", "10"))
+
+T = TypeVar("T")
+
+
+class PooledHttpClient(AsyncHttpClient):
+    """Twilio's async HTTP client interface over one pooled aiohttp session."""
+
+    def __init__(
+        self,
+        max_connections: int = TWILIO_MAX_CONNECTIONS,
+        keepalive: float = TWILIO_KEEPALIVE_SECONDS,
+        timeout: float = TWILIO_TIMEOUT_SECONDS,
+    ):
+        super().__init__(log, True, timeout)
+        self.max_connections = max_connections
+        self.keepalive = keepalive
+        self.session: aiohttp.ClientSession | None = None
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        params: dict[str, object] | None = None,
+        data: dict[str, object] | None = None,
+        headers: dict[str, str] | None = None,
+        auth: tuple[str, str] | None = None,
+        timeout: float | None = None,
+        allow_redirects: bool = False,
+    ) -> Response:
+        # Created here, on the loop that will use it.
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.max_connections, keepalive_timeout=self.keepalive
+                ),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        async with self.session.request(
+            method.upper(),
+            url,
+            params=params,
+            data=data,
+            headers=headers,
+            auth=aiohttp.BasicAuth(*auth) if auth else None,
+            # Twilio's Client passes timeout=None; aiohttp would take that as
+            # no limit at all rather than the session's.
+            timeout=aiohttp.ClientTimeout(total=timeout or self.timeout),
+            allow_redirects=allow_redirects,
+        ) as response:
+            return Response(response.status, await response.text(), response.headers)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+
+class TwilioRest:
+    def __init__(
+        self,
+        account_sid: str | None = None,
+        auth_token: str | None = None,
+        api_url: str = TWILIO_API_URL,
+        max_connections: int = TWILIO_MAX_CONNECTIONS,
+        timeout: float = TWILIO_TIMEOUT_SECONDS,
+    ):
+        self.account_sid = account_sid
+        self.auth_token = auth_token
+        self.api_url = api_url
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._client: Client | None = None
+
+    def _started(self) -> tuple[asyncio.AbstractEventLoop, Client]:
+        with self._lock:
+            if self._loop is None:
+                client = Client(
+                    self.account_sid or os.getenv("ACCOUNT_SID"),
+                    self.auth_token or os.getenv("AUTH_TOKEN"),
+                    http_client=PooledHttpClient(self.max_connections, timeout=self.timeout),
+                )
+                if self.api_url:
+                    client.api.base_url = self.api_url
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="twilio", daemon=True).start()
+                self._loop, self._client = loop, client
+                atexit.register(self.close)
+            return self._loop, self._client
+
+    def submit(self, request: Callable[[Client], Awaitable[T]]) -> Future:
+        """
+        Starts ``request(client)``, e.g. ``lambda c: c.calls.create_async(...)``,
+        on the client's loop. Returns a future of its result.
+        """
+        loop, client = self._started()
+        return asyncio.run_coroutine_threadsafe(request(client), loop)
+
+    def run(self, request: Callable[[Client], Awaitable[T]]) -> T:
+        return self.submit(request).result()
+
+    async def arun(self, request: Callable[[Client], Awaitable[T]]) -> T:
+        return await asyncio.wrap_future(self.submit(request))
+
+    def create_call(self, **kwargs: Any) -> str:
+        """Places a call (``calls.create`` arguments). Returns its SID."""
+        return self.run(lambda client: client.calls.create_async(**kwargs)).sid
+
+    def close(self):
+        with self._lock:
+            loop, client = self._loop, self._client
+            self._loop = self._client = None
+        if loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(client.http_client.close(), loop).result(5)
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+
+
+twilio_rest = TwilioRest()
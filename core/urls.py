@@ -7,4 +7,7 @@ from . import views
 urlpatterns = [
     path('voice/', views.voice, name='voice'),
     path('process_speech/', views.process_speech, name='process_speech'),
+    path('partial_speech/', views.partial_speech, name='partial_speech'),
+    path('call_status/', views.call_status, name='call_status'),
+    path('turn_result/', views.turn_result, name='turn_result'),
 ]
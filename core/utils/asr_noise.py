@@ -0,0 +1,175 @@
+"""
+Generated menus and speech-recognition-style queries for benchmarking name
+matching (``manage.py bench_matching``).
+
+Queries are lowercase like ASR transcripts and come in five kinds:
+
+- ``exact``: the name as is
+- ``misspelling``: one or two dropped, doubled, swapped or replaced letters
+- ``homophone``: a word heard as a sound-alike ("fries" -> "freeze",
+  "naan" -> "non") or spelt the way it sounds ("ph" -> "f", "ck" -> "k")
+- ``dropped_word``: one word of a multi-word name left out, when what is
+  left isn't another name
+- ``filler``: the name wrapped in what callers say around it
+- ``absent``: a dish that isn't on the menu, which should match nothing
+"""
+
+import random
+import re
+
+ADJECTIVES = [
+    "spicy", "crispy", "grilled", "smoky", "classic", "garlic", "honey", "lemon",
+    "pepper", "cheesy", "tandoori", "teriyaki", "buffalo", "sweet", "sour", "hot",
+    "mild", "double", "mini", "jumbo", "roasted", "fried", "steamed", "baked",
+    "creamy", "tangy", "zesty", "herb", "mango", "chilli", "korean", "cajun",
+    "butter", "masala", "peri peri", "bbq", "truffle", "sesame", "coconut", "black bean",
+]
+BASES = [
+    "chicken", "beef", "lamb", "paneer", "tofu", "prawn", "fish", "veggie", "mushroom",
+    "pork", "duck", "egg", "halloumi", "falafel", "salmon", "tuna", "turkey", "bean",
+    "potato", "cauliflower", "aubergine", "spinach", "corn", "cheese", "bacon",
+    "sausage", "shrimp", "crab", "squid", "chickpea",
+]
+DISHES = [
+    "burger", "wrap", "pizza", "salad", "curry", "biryani", "noodles", "fried rice",
+    "sandwich", "taco", "burrito", "bowl", "soup", "wings", "skewers", "kebab",
+    "pasta", "risotto", "pie", "roll", "bao", "dumplings", "spring rolls", "naan",
+    "tikka", "korma", "stir fry", "fries", "nuggets", "quesadilla", "samosa", "platter",
+    "sub", "melt", "slider", "ramen", "pho", "katsu", "gyoza", "lasagne",
+    "omelette", "hot pot", "satay", "tempura", "shawarma", "pakora", "bhaji", "toastie",
+    "calzone", "flatbread",
+]
+STREETS = [
+    "main", "high", "station", "church", "park", "mill", "market", "king", "queen",
+    "victoria", "london", "bridge", "oak", "elm", "maple", "cedar", "river", "lake",
+    "hill", "north", "south", "east", "west", "green", "castle", "harbour", "canal",
+]
+STREET_TYPES = ["street", "road", "avenue", "lane", "square", "way"]
+
+# Words ASR commonly hears as something else.
+HOMOPHONES = {
+    "fries": "freeze", "naan": "non", "roll": "role", "wings": "wins", "pie": "pi",
+    "sub": "sob", "tikka": "tika", "korma": "corma", "pho": "fo", "bao": "bow",
+    "mein": "main", "sweet": "suite", "sour": "sower", "hot": "hut", "mild": "milde",
+    "pepper": "peper", "beef": "beefs", "lamb": "lam", "prawn": "pran", "fish": "fishes",
+    "duck": "duc", "chilli": "chilly", "curry": "curie", "soup": "soap", "bowl": "bowel",
+    "main": "mane", "high": "hi", "king": "kin", "queen": "quin", "hill": "hil",
+    "road": "rode", "lane": "lain", "way": "weigh", "square": "squair", "mill": "mil",
+    "satay": "sate", "gyoza": "gioza", "ramen": "rahmen", "naan bread": "non bread",
+}
+# Spellings that sound the same.
+SOUND_ALIKE = [
+    ("ph", "f"), ("ck", "k"), ("ee", "ea"), ("ai", "ay"), ("c", "k"), ("qu", "kw"),
+    ("x", "ks"), ("oo", "u"), ("ie", "y"), ("s", "z"), ("gh", "g"), ("wh", "w"),
+]
+FILLERS = [
+    "can i get the {}", "i'd like a {}", "{} please", "one {}", "the {} one",
+    "uh the {}", "give me {}", "a {} thanks",
+]
+
+KINDS = ["exact", "misspelling", "homophone", "dropped_word", "filler", "absent"]
+
+
+def generate_menu(size: int, seed: int = 0) -> list[str]:
+    """``size`` unique title-cased dish names (up to 60,000)."""
+    rng = random.Random(seed)
+    combos = [(a, b, d) for a in ADJECTIVES for b in BASES for d in DISHES]
+    if size > len(combos):
+        raise ValueError(f"At most {len(combos)} names can be generated")
+    return [
+        " ".join((a, b, d)).title() for a, b, d in rng.sample(combos, size)
+    ]
+
+
+def generate_branches(size: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    combos = [(s, t) for s in STREETS for t in STREET_TYPES]
+    size = min(size, len(combos))
+    return [" ".join(combo).title() for combo in rng.sample(combos, size)]
+
+
+def misspell(text: str, rng: random.Random) -> str:
+    chars = list(text)
+    for _ in range(rng.choice((1, 1, 2))):
+        letters = [i for i, c in enumerate(chars) if c.isalpha()]
+        i = rng.choice(letters)
+        edit = rng.choice(("drop", "double", "swap", "replace"))
+        if edit == "drop" and len(letters) > 3:
+            del chars[i]
+        elif edit == "double":
+            chars.insert(i, chars[i])
+        elif edit == "swap" and i + 1 < len(chars) and chars[i + 1].isalpha():
+            chars[i], chars[i + 1] = chars[i + 1], chars[i]
+        else:
+            chars[i] = rng.choice("abcdefghijklmnopqrstuvwxyz")
+    return "".join(chars)
+
+
+def homophone(text: str, rng: random.Random) -> str:
+    words = text.split()
+    heard = [i for i, word in enumerate(words) if word in HOMOPHONES]
+    if heard:
+        i = rng.choice(heard)
+        words[i] = HOMOPHONES[words[i]]
+        return " ".join(words)
+    spellings = [(a, b) for a, b in SOUND_ALIKE if a in text]
+    if spellings:
+        a, b = rng.choice(spellings)
+        return text.replace(a, b, 1)
+    return misspell(text, rng)
+
+
+def drop_word(text: str, names: set[str], rng: random.Random) -> str | None:
+    words = text.split()
+    if len(words) < 2:
+        return None
+    for i in rng.sample(range(len(words)), len(words)):
+        shorter = " ".join(words[:i] + words[i + 1 :])
+        if shorter not in names:
+            return shorter
+    return None
+
+
+def absent_name(names: set[str], rng: random.Random) -> str | None:
+    for _ in range(100):
+        name = " ".join((rng.choice(ADJECTIVES), rng.choice(BASES), rng.choice(DISHES)))
+        if name not in names:
+            return name
+    return None
+
+
+def noisy_queries(
+    names: list[str], count: int, seed: int = 0
+) -> list[tuple[str, str, str | None]]:
+    """
+    ``count`` (kind, query, expected name) triples, kinds in equal shares.
+    The expected name of ``absent`` queries is None.
+    """
+    rng = random.Random(seed)
+    lowered = {name.lower() for name in names}
+    queries = []
+    # Bounded, in case a kind can't be generated for these names.
+    for attempt in range(count * 10):
+        if len(queries) == count:
+            break
+        kind = KINDS[attempt % len(KINDS)]
+        name = rng.choice(names)
+        text = name.lower()
+        if kind == "misspelling":
+            query = misspell(text, rng)
+        elif kind == "homophone":
+            query = homophone(text, rng)
+        elif kind == "dropped_word":
+            query = drop_word(text, lowered, rng)
+            if query is None:
+                continue
+        elif kind == "filler":
+            query = rng.choice(FILLERS).format(text)
+        elif kind == "absent":
+            query, name = absent_name(lowered, rng), None
+            if query is None:
+                continue
+        else:
+            query = text
+        queries.append((kind, re.sub(r"\s+", " ", query).strip(), name))
+    return queries
@@ -0,0 +1,109 @@
+import asyncio
+import random
+import re
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from pydantic_ai import ModelResponse, TextPart, ToolCallPart
+from pydantic_ai.models.function import FunctionModel
+
+
+def fake_model(latency: float = 1.0, reply: str = "Sure, anything else?") -> FunctionModel:
+    """
+    Stand-in for the OpenAI model used by benchmarks.
+
+    Waits ``latency`` seconds without blocking the event loop (like a real
+    LLM round trip) and then answers with a fixed reply. Streamed requests
+    spread the same latency over the words of the reply.
+
+    Usage:
+        with agent.override(model=fake_model(latency=2)):
+            ...
+    """
+
+    async def respond(messages, info):
+        await asyncio.sleep(latency)
+        return ModelResponse(parts=[TextPart(content=reply)])
+
+    async def stream(messages, info):
+        words = reply.split(" ")
+        for i, word in enumerate(words):
+            await asyncio.sleep(latency / len(words))
+            yield word if i == 0 else " " + word
+
+    return FunctionModel(respond, stream_function=stream)
+
+
+def latency_distribution(spec: str, seed: int | None = None) -> Callable[[], float]:
+    """
+    Parses a latency spec into a sampler returning seconds:
+
+    - ``"1.5"``: always 1.5 s
+    - ``"uniform:0.5:2"``: between 0.5 and 2 s
+    - ``"normal:1:0.3"``: mean 1 s, standard deviation 0.3 s (never below 0)
+    - ``"lognormal:0.8:0.5"``: median 0.8 s, sigma 0.5; the long tail real
+      LLM round trips have
+    """
+    rng = random.Random(seed)
+    kind, _, args = spec.partition(":")
+    if not args:
+        seconds = float(kind)
+        return lambda: seconds
+    a, b = (float(x) for x in args.split(":"))
+    if kind == "uniform":
+        return lambda: rng.uniform(a, b)
+    if kind == "normal":
+        return lambda: max(0.0, rng.gauss(a, b))
+    if kind == "lognormal":
+        return lambda: a * rng.lognormvariate(0, b)
+    raise ValueError(f"Unknown latency distribution {kind!r}")
+
+
+@dataclass
+class Rule:
+    """
+    When the caller's last utterance matches ``pattern``, the model makes
+    ``tool_calls`` (tool name, args) in one request and answers with
+    ``reply`` once their results are back.
+    """
+
+    pattern: str
+    reply: str
+    tool_calls: list[tuple[str, dict[str, Any]]] = field(default_factory=list)
+
+
+def scripted_model(
+    rules: list[Rule],
+    latency: Callable[[], float] = lambda: 1.0,
+    default_reply: str = "Sure, anything else?",
+) -> FunctionModel:
+    """
+    Fake agent model that follows a script: tool calls and replies chosen by
+    the first rule matching the caller's last utterance. Every model request
+    waits ``latency()`` seconds, so a turn with tool calls costs two round
+    trips like it does with the real model.
+    """
+    compiled = [(re.compile(rule.pattern, re.IGNORECASE), rule) for rule in rules]
+
+    def match(utterance: str) -> Rule | None:
+        return next((rule for pattern, rule in compiled if pattern.search(utterance)), None)
+
+    async def respond(messages, info):
+        await asyncio.sleep(latency())
+        utterance = next(
+            (
+                str(part.content)
+                for message in reversed(messages)
+                for part in message.parts
+                if part.part_kind == "user-prompt"
+            ),
+            "",
+        )
+        rule = match(utterance)
+        if rule and rule.tool_calls and messages[-1].parts[-1].part_kind == "user-prompt":
+            return ModelResponse(
+                parts=[ToolCallPart(name, args) for name, args in rule.tool_calls]
+            )
+        return ModelResponse(parts=[TextPart(content=rule.reply if rule else default_reply)])
+
+    return FunctionModel(respond)
@@ -0,0 +1,133 @@
+"""
+A local stand-in for Twilio's REST API, for exercising the dialer
+(``core.dialer``) offline.
+
+Only ``POST /2010-04-01/Accounts/<sid>/Calls.json`` is served, over
+keep-alive HTTP/1.1. A new connection costs ``connect_latency`` seconds (the
+TLS handshake with the real API). It answers after ``latency`` (a
+``fake_llm.latency_distribution`` spec) like Twilio does,
+refuses a caller ID's calls beyond ``cps`` per second with a 429, and fails
+``error_rate`` of the rest with a 503. Every request is kept in ``calls``.
+"""
+
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+from .fake_llm import latency_distribution
+
+CALLS_PATH = re.compile(r"^/2010-04-01/Accounts/(\w+)/Calls\.json$")
+
+
+@dataclass
+class FakeCall:
+    at: float
+    to: str
+    from_: str
+    status: int
+
+
+class FakeTwilio:
+    def __init__(
+        self,
+        latency: str = "0.1",
+        connect_latency: float = 0.0,
+        cps: float = 1.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+        port: int = 0,
+    ):
+        self.latency = latency_distribution(latency, seed)
+        self.connect_latency = connect_latency
+        self.connections = 0
+        self.cps = cps
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.calls: list[FakeCall] = []
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self.handler())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def answer(self, account_sid: str, form: dict[str, str], at: float) -> tuple[int, dict]:
+        """Status and JSON body for a create-call request received ``at``."""
+        with self.lock:
+            # The last second, less a little slack for jitter between the
+            # dialer and us.
+            recent = sum(
+                1
+                for call in self.calls
+                if call.from_ == form.get("From") and call.status == 201 and at - call.at < 0.95
+            )
+            if recent >= self.cps:
+                status = 429
+            elif self.rng.random() < self.error_rate:
+                status = 503
+            else:
+                status = 201
+            self.calls.append(FakeCall(at, form.get("To", ""), form.get("From", ""), status))
+        if status == 429:
+            return status, {"code": 20429, "message": "Too Many Requests", "status": 429}
+        if status == 503:
+            return status, {"code": 20503, "message": "Service Unavailable", "status": 503}
+        sid = f"CA{uuid.uuid4().hex}"
+        return status, {
+            "sid": sid,
+            "account_sid": account_sid,
+            "to": form.get("To"),
+            "from": form.get("From"),
+            "status": "queued",
+            "uri": f"/2010-04-01/Accounts/{account_sid}/Calls/{sid}.json",
+        }
+
+    def handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with fake.lock:
+                    fake.connections += 1
+                time.sleep(fake.connect_latency)
+
+            def do_POST(self):
+                received = time.monotonic()
+                match = CALLS_PATH.match(self.path)
+                length = int(self.headers.get("Content-Length", 0))
+                form = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode()).items()}
+                time.sleep(fake.latency())
+                if match:
+                    status, body = fake.answer(match.group(1), form, received)
+                else:
+                    status, body = 404, {"code": 20404, "message": "Not found", "status": 404}
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
@@ -1,8 +1,10 @@
 import os
+from urllib.parse import urlsplit
+
+from django.core.exceptions import ImproperlyConfigured
 from django.http import HttpResponse
 from django.views.decorators.csrf import csrf_exempt
-from pydantic_ai import ModelRequest, ModelResponse, TextPart, UserPromptPart
-from twilio.twiml.voice_response import VoiceResponse, Gather
+from twilio.twiml.voice_response import VoiceResponse, Gather, Connect
 from dotenv import load_dotenv
 # import google.generativeai as genai
 
@@ -13,128 +15,252 @@ log = get_logger()
 load_dotenv()
 
 DEVELOPMENT = os.getenv("DEVELOPMENT", "false").lower() == "true"
+# "gather": one <Gather> webhook round trip per turn.
+# "relay": stream turns over a ConversationRelay WebSocket (see core.relay).
+VOICE_MODE = os.getenv("VOICE_MODE", "gather").lower()
+# Our public URL, e.g. https://orders.example.com; the relay socket is on its host.
+SITE_URL = os.getenv("SITE_URL", "")
 
 # model = genai.GenerativeModel("gemini-2.0-flash")
 
-from .models import Order, Restaurant, AdminSetting, StatusEnum  # update import path
+from .models import SpanKind, StatusEnum  # update import path
 
 # from .agent import get_or_create_agent_session, ask_agent  # same here
-from .tools import agent, OrderDeps, format_menu_for_instructions  # and here
+from .turns import run_turn
+from .filler import FILLER_AFTER_SECONDS, drop_pending, get_pending, run_or_defer, wait_for_turn
+from .metrics import current_timer, finish_turn, span, start_turn
+from .sessions import evict_session
+from .settings_store import settings_store
+from .tenants import resolver
+from .speculation import SPECULATIVE_TURNS, speculate, resolve
 
 # USER_ID = "CUSTOMER"
 # APP_NAME = "voice_agent"
 
 
 # ------------------ 🤝 Helpers ------------------
-def get_or_create_order(call_sid: str, phone_number: str, customer_phone) -> Order:
-    restaurant = Restaurant.objects.get(phone_number=phone_number)
-    order, created = Order.objects.get_or_create(
-        call_sid=call_sid,
-        restaurant=restaurant,
-        customer_phone=customer_phone,
-    )
-    return order
+def get_call_numbers(request) -> tuple[str, str]:
+    """Returns (restaurant number, caller number) for a Twilio webhook."""
+    if DEVELOPMENT:
+        to_number = request.POST.get("From")
+        from_number = request.POST.get("To")
+    else:
+        to_number = request.POST.get("To")
+        from_number = request.POST.get("From")
+    return to_number, from_number
 
 
-# ------------------ Twilio voice ------------------
-@csrf_exempt
-def voice(request):
-    log.info("Start")
-    response = VoiceResponse()
-    gather = Gather(
+def speech_gather(timeout: int) -> Gather:
+    partial_result_callback = "/partial_speech/" if SPECULATIVE_TURNS else None
+    return Gather(
         input="speech",
         action="/process_speech/",
         method="POST",
-        timeout=15,
+        timeout=timeout,
         speech_timeout="auto",
+        partial_result_callback=partial_result_callback,
+        partial_result_callback_method="POST" if SPECULATIVE_TURNS else None,
     )
-    # Fetch greeting
-    greeting = AdminSetting.objects.get(key="GREETING")
-    # response_text = "Hi! What would you like to order today?"
-    response_text = greeting.value
 
-    gather.say(response_text, voice="man", language="en-US")
-    log.info(f"[AI] {response_text}")
+
+def relay_url() -> str:
+    # From settings, not the request's Host header, which the caller controls.
+    host = urlsplit(SITE_URL).netloc
+    if not host:
+        raise ImproperlyConfigured("VOICE_MODE=relay needs SITE_URL, e.g. https://example.com")
+    return f"wss://{host}/relay/"
+
+
+# ------------------ Twilio voice ------------------
+def greeting_twiml(greeting: str) -> str:
+    response = VoiceResponse()
+
+    if VOICE_MODE == "relay":
+        connect = Connect()
+        connect.conversation_relay(
+            url=relay_url(),
+            welcome_greeting=greeting,
+        )
+        response.append(connect)
+        return str(response)
+
+    gather = speech_gather(timeout=15)
+    gather.say(greeting, voice="man", language="en-US")
 
     response.append(gather)
     response.say("Sorry, I didn't catch that. Please try again.")
-    return HttpResponse(str(response), content_type="text/xml")
+    return str(response)
+
+
+@csrf_exempt
+async def voice(request):
+    """
+    Answers the call. The restaurant and its greeting come from in-memory
+    caches (core.tenants, core.settings_store) and the TwiML is built once per
+    restaurant, so a burst of calls doesn't touch the database.
+    """
+    log.info("Start")
+    to_number, _ = get_call_numbers(request)
+    restaurant = await resolver.aresolve(to_number)
+    restaurant_id = restaurant.pk if restaurant else None
+
+    # Fetch greeting (the restaurant's own, or the global one)
+    response_text = await settings_store.aget(
+        "GREETING", restaurant_id, default="Hi! What would you like to order today?"
+    )
+    body = settings_store.rendered(
+        ("voice", restaurant_id, response_text),
+        lambda: greeting_twiml(response_text),
+    )
+    log.info(f"[AI] {response_text}")
+    return HttpResponse(body, content_type="text/xml")
 
 
 # ------------------ Process user input ------------------
 @csrf_exempt
-def process_speech(request):
+async def process_speech(request):
     """
     Runs in a loop
+
+    Async so that, under ASGI (``project.asgi``), a single worker can keep many
+    calls in flight while each one waits on the LLM.
     """
-    call_id = request.POST.get("CallSid")
-    log.info(f"Processing speech...{call_id = }")
-    user_speech = request.POST.get("SpeechResult", "")
+    timer = start_turn("gather")
+    with span(SpanKind.PARSE):
+        call_id = request.POST.get("CallSid")
+        log.info(f"Processing speech...{call_id = }")
+        user_speech = request.POST.get("SpeechResult", "")
 
-    if DEVELOPMENT:
-        to_number = request.POST.get("From")
-        from_number = request.POST.get("To")
-    else:
-        to_number = request.POST.get("To")
-        from_number = request.POST.get("From")
-    print(f"{from_number = }\n{to_number = }")
-    log.info(f"{from_number = }\n{to_number = }")
+        to_number, from_number = get_call_numbers(request)
+        log.info(f"{from_number = } {to_number = }")
 
-    # order, _ = Order.objects.get_or_create(call_sid=call_id)
-    order = get_or_create_order(
-        call_sid=call_id, phone_number=to_number, customer_phone=from_number
+    run = resolve if SPECULATIVE_TURNS else run_turn
+    turn = run(
+        call_sid=call_id,
+        phone_number=to_number,
+        customer_phone=from_number,
+        user_speech=user_speech,
     )
-    conversation = order.conversation
-    conversation.append({"role": "user", "text": user_speech})
-
-    pydantic_messages = []
-    for msg in conversation[:-1]:
-        if msg["role"] == "user":
-            pydantic_messages.append(
-                ModelRequest(parts=[UserPromptPart(content=msg["text"])])
-            )
-        elif msg["role"] == "agent":
-            pydantic_messages.append(
-                ModelResponse(parts=[TextPart(content=msg["text"])])
+    if FILLER_AFTER_SECONDS:
+        result = await run_or_defer(call_id, turn, timer)
+        if result is None:
+            restaurant = await resolver.aresolve(to_number)
+            filler = await settings_store.aget(
+                "FILLER",
+                restaurant.pk if restaurant else None,
+                default="One moment please.",
             )
+            return HttpResponse(hold_twiml(filler), content_type="text/xml")
+        order, ai_reply = result
+    else:
+        order, ai_reply = await turn
 
-    # Main ==================================================================
-    deps = OrderDeps(session_id=call_id, phone_number=to_number)
-    agent_response = agent.run_sync(
-        user_speech,
-        message_history=pydantic_messages,
-        deps=deps,
-    )
-    ai_reply = agent_response.output.strip()
-    conversation.append({"role": "agent", "text": ai_reply})
-    log.info(f"success {ai_reply}")
-
-    # Re-fetch to get the latest order state in case it was modified by a tool.
-    # order, _ = Order.objects.get_or_create(call_sid=call_id)
-    order = get_or_create_order(
-        call_sid=call_id, phone_number=to_number, customer_phone=from_number
-    )
+    return await reply_response(call_id, order, ai_reply, timer)
+
+
+def hold_twiml(filler: str = "") -> str:
+    """Keeps the caller waiting and polls /turn_result/ again."""
     response = VoiceResponse()
+    if filler:
+        response.say(filler, voice="man", language="en-US")
+    response.pause(length=1)
+    response.redirect("/turn_result/", method="POST")
+    return str(response)
 
-    if order.status == StatusEnum.CONFIRMED:
-        response.say(ai_reply, voice="man", language="en-US")
-        response.hangup()
-    elif order.status == StatusEnum.CALL_BACK_REQUESTED:
-        response.say(ai_reply, voice="man", language="en-US")
-        response.hangup()
-    else:
-        gather = Gather(
-            input="speech",
-            action="/process_speech/",
-            method="POST",
-            timeout=20,
-            speech_timeout="auto",
+
+async def reply_response(call_id, order, ai_reply, timer) -> HttpResponse:
+    with span(SpanKind.RENDER):
+        response = VoiceResponse()
+
+        if order.status == StatusEnum.CONFIRMED:
+            response.say(ai_reply, voice="man", language="en-US")
+            response.hangup()
+            evict_session(call_id)
+        elif order.status == StatusEnum.CALL_BACK_REQUESTED:
+            response.say(ai_reply, voice="man", language="en-US")
+            response.hangup()
+            evict_session(call_id)
+        else:
+            gather = speech_gather(timeout=20)
+            gather.say(ai_reply, voice="man", language="en-US")
+            response.append(gather)
+            response.say("I can't hear you, goodbye.")
+        body = str(response)
+
+    finish_turn(timer, order)
+    return HttpResponse(body, content_type="text/xml")
+
+
+# ------------------ Deferred turn result ------------------
+@csrf_exempt
+async def turn_result(request):
+    """
+    Polled through ``<Redirect>`` after a filler reply (see core.filler) until
+    the call's turn is done.
+    """
+    call_id = request.POST.get("CallSid")
+    pending = get_pending(call_id)
+    if pending:
+        try:
+            result = await wait_for_turn(pending, call_id)
+        except Exception as e:
+            log.exception(f"[filler] {call_id} turn failed {e}")
+            pending = None
+
+    if pending is None:
+        # Failed, timed out, or started on another worker.
+        response = VoiceResponse()
+        gather = speech_gather(timeout=20)
+        gather.say(
+            "Sorry, I lost track of that. Could you say it again?",
+            voice="man",
+            language="en-US",
         )
-        gather.say(ai_reply, voice="man", language="en-US")
         response.append(gather)
         response.say("I can't hear you, goodbye.")
+        return HttpResponse(str(response), content_type="text/xml")
+
+    if result is None:
+        return HttpResponse(hold_twiml(), content_type="text/xml")
+
+    order, ai_reply = result
+    current_timer.set(pending.timer)
+    return await reply_response(call_id, order, ai_reply, pending.timer)
+
+
+# ------------------ Call status ------------------
+@csrf_exempt
+async def call_status(request):
+    """
+    Twilio status callback (set on the phone number). Frees the call's
+    session as soon as the call is over instead of waiting for its TTL.
+    """
+    if request.POST.get("CallStatus") in (
+        "completed",
+        "busy",
+        "failed",
+        "no-answer",
+        "canceled",
+    ):
+        evict_session(request.POST.get("CallSid"))
+        drop_pending(request.POST.get("CallSid"))
+    return HttpResponse(status=204)
 
-    order.conversation = conversation
-    order.save()
 
-    return HttpResponse(str(response), content_type="text/xml")
+# ------------------ Partial speech results ------------------
+@csrf_exempt
+async def partial_speech(request):
+    """
+    Twilio ``partialResultCallback``: starts a speculative agent run on the
+    stable part of the transcript while the caller is still speaking.
+    """
+    transcript = request.POST.get("StableSpeechResult", "")
+    if SPECULATIVE_TURNS and transcript:
+        to_number, from_number = get_call_numbers(request)
+        speculate(
+            call_sid=request.POST.get("CallSid"),
+            phone_number=to_number,
+            customer_phone=from_number,
+            transcript=transcript,
+        )
+    return HttpResponse(status=204)
@@ -3,6 +3,9 @@ ASGI config for project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+HTTP goes to Django; WebSocket connections on ``/relay/`` go to the
+ConversationRelay streaming voice mode in ``core.relay``.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 """
@@ -13,4 +16,15 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from core.relay import RELAY_PATH, conversation_relay  # noqa: E402  (needs Django set up)
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "websocket":
+        if scope["path"] == RELAY_PATH:
+            return await conversation_relay(scope, receive, send)
+        await receive()  # websocket.connect
+        return await send({"type": "websocket.close"})
+    return await django_application(scope, receive, send)